@@ -1,14 +1,42 @@
 # Oscar Saharoy 2019
 
-import pygame, random, numpy, sys, tkinter, gooey, os
+import random, numpy, sys, tkinter, gooey, os, re, tracemalloc, time
 from tkinter.font import Font
+from store import Store
+from grid  import Levels, morton, nearest
+import forces, potentials, walls, species, placement, spatial, events, stats, metrics, tkrender
+from barneshut import BarnesHut
 
+# without pygame the simulation can still be drawn in a tkinter window - see tkrender.TkRenderer
+try:
+    import pygame
+except ImportError:
+    pygame = None
 
-pygame.init()
 
-info  = pygame.display.Info()
+SP = 16 # measurement unit - a fiftieth of the height of the screen, or this on machines without a display
 
-SP    = info.current_h // 50  # measurement unit
+if pygame:
+    pygame.init()
+    height = pygame.display.Info().current_h
+
+    if height > 0:
+        SP = height // 50
+
+else:
+    # without a display headless worlds still work, eg. for export.py, so tkinter failing to open one isn't an error
+    try:
+        root = tkinter.Tk()
+    except tkinter.TclError:
+        pass
+    else:
+        SP = root.winfo_screenheight() // 50
+        root.destroy()
+
+PERFORMANCE = ['FPS', 'Step Time', 'Collisions'] # metrics recorded by the simulation itself - see Balls.metrics
+
+# plots of several metrics at once on the same axes, with the colour of each
+OVERLAYS = {'Energy, Temperature & Collisions': [('Energy', 'tomato'), ('Temperature', 'DeepSkyBlue2'), ('Collisions', 'chartreuse3')]}
 
 # Palette
 
@@ -22,39 +50,125 @@ lgray = (200, 200, 200)
 
 class Balls(object):
 
-    def __init__(self):
+    def __init__(self, headless=False, resolution=None, renderer='pygame'):
 
         data       = Data() # data storage object for communication between pygame and tkinter windows
+        self.data  = data
 
-        data.n     = 70     # number of balls
         data.rest  = 1      # restitution of system
         data.g     = 0.005  # acceleration due to gravity in pixels per frame
-        data.v0    = 1      # maximum initial velocity of balls
-        data.r = r = SP//2  # radius of balls
-        data.d     = 2*r    # diameter of balls
+        data.temperature = 1/12 # temperature new balls' velocities are drawn at - see placement.maxwell_boltzmann
+        data.r = r = SP//2  # average radius of balls
+        data.d     = 2*r    # average diameter of balls
+        data.spread  = 1    # ratio of the biggest radius to the smallest - 1 for balls which are all the same size
+        data.density = 1 / (numpy.pi * r**2) # mass per unit area, so that balls of the average size have a mass of 1
         data.fps   = 60     # framerate
+        data.plot_every = 500 # milliseconds between redraws of the statistics graph in the panel
+        data.plot_window = 30 # seconds of history the graph shows, with at most data.plot_points points
+        data.plot_points = 2000
+        data.n_limit = 10000 # most balls the Ball Count scale goes up to - the store grows to hold them
         data.f_len = 100    # length of fade for ball impact colour
         data.x_res = SP*25  # Width of display
         data.y_res = SP*25  # Height of display
-        data.max_n = 200    # maximum number of balls
- 
-        data.pos   = numpy.random.rand(data.max_n,2) * numpy.array([[data.x_res-data.d, data.y_res-data.d]]) + data.r # position of balls - randomised at start
-        data.vel   = numpy.random.rand(data.max_n,2) * data.v0 - data.v0/2 # velocity of balls
-        data.mass  = numpy.ones(data.max_n) # masses of balls
-        data.val   = numpy.zeros(data.max_n) # stores colour value data - colours brightest after collision and then fades
+
+        # a headless world can be given an arbitrary resolution eg. for high resolution offline renders
+        if resolution:
+            data.x_res, data.y_res = resolution
+
+        # kinds of ball with their own restitution, friction and colour - there is one kind to start with
+        self.species = species.Species()
+        self.species.add('Ball')
+
+        # container walls and obstacles - see walls.PRESETS
+        data.container  = 'Box'
+        self.walls      = walls.PRESETS[data.container]()
+        self.wall_image = None # surface the walls are drawn on, made again when they change - see Balls.draw
+        self.wall_key   = None
+
+        self.levels  = Levels() # broad-phase for finding colliding balls
+        self.indexed = None   # store.version when the levels were last built
+        self.buffers = {}     # scratch buffers used by the step loop - see Balls.scratch
+        self.query   = spatial.Query(self) # lookups of the balls near points, using the levels
+        self.events  = events.Events()     # collisions and wall hits of each step, for subscribers
+        self.stats   = stats.Stats(self)   # running thermodynamic statistics, on while they are plotted
+        self.metrics = metrics.Metrics()   # history of the step time, collision rate, statistics and so on
+        self.collisions = 0 # number of pairs of balls which collided in the last step
+
+        data.layout  = 'Poisson Disk' # how new balls are laid out - see placement.LAYOUTS
+        data.passes  = 2   # times the colliding pairs are gone over in each step - see Balls.compute
+
+        # the store holds the per-ball arrays, growing them as balls are added - sets data.n and data.max_n
+        self.store = store = Store(data, capacity=200)
+
+        # arrays are filled in the order they are registered, so radius, mass and position can be worked out from
+        # the entries new balls have already been given, in the slots from data.n up
+        store.register('size',        init=lambda k: numpy.random.rand(k)) # place of each ball in the size distribution from 0 to 1
+        store.register('radius',      init=lambda k: self.radii(data.size[data.n:data.n+k]))   # radii of balls
+        store.register('mass',        init=lambda k: self.masses(data.radius[data.n:data.n+k])) # masses of balls
+        store.register('pos',   (2,), init=lambda k: self.place(k)) # position of balls - laid out clear of each other
+        store.register('vel',   (2,), init=lambda k: placement.maxwell_boltzmann(data.mass[data.n:data.n+k], data.temperature)) # velocity of balls
+        store.register('species', (), int, init=lambda k: self.species.pick(k)) # kind of each ball - see species.Species
+        store.register('val',         init=0.0) # stores colour value data - colours brightest after collision and then fades
+        store.register('rhue',  (3,), init=lambda k: numpy.random.rand(k,3)) # random colours with different hues
+        store.register('rgrey', (3,), init=lambda k: numpy.random.rand(k,1).repeat(3,axis=1)) # random grays
+
+        store.register('pair_acc',     (2,)) # acceleration from the soft potential at the end of the last step
 
         data.hex   = '#22eeff' # hex of base colour - cyan default
-        data.rhue  = numpy.random.rand(data.max_n,3) # random colours with different hues
-        data.rgrey = numpy.random.rand(data.max_n,1).repeat(3,axis=1) # random grays
         data.hue_v = 0.5 # amount of hue variation
         data.val_v = 1.0 # amount of value variation
         data.fade  = True # controls whether balls get colour on impact and then fade or have constant colour
 
         data.closed= False # True if settings panel is closed
 
-        data.last_outside = numpy.zeros([data.max_n,2]) == 1 # stores balls which were outside screen last timestep - starts all False
+        store.add(70) # initial number of balls
 
-        self.data  = data
+        # force fields acting on the balls - only gravity is on to start with
+        self.forces  = forces.Forces(self)
+
+        self.forces.register('Gravity',   forces.Gravity())
+        self.forces.register('Drag',      forces.Drag(),      enabled=False)
+        self.forces.register('Attractor', forces.Attractor(), enabled=False)
+        self.forces.register('Vortex',    forces.Vortex(),    enabled=False)
+        self.forces.register('Wind',      forces.Wind(),      enabled=False)
+        self.forces.register('Mutual',    BarnesHut(),        enabled=False)
+
+        # soft potentials which can be used instead of hard sphere collisions - see Balls.interact
+        self.potentials = {'Lennard-Jones':  potentials.LennardJones(),
+                           'Spring-Dashpot': potentials.SpringDashpot()}
+
+        data.potential  = None # name of the potential in use, or None for hard spheres
+
+        # balls are sorted in memory when they get too jumbled - see Balls.tidy
+        data.sort_every  = 60    # steps between checks of how jumbled the balls are
+        data.sort_factor = 2     # how many times worse the locality can get before sorting again
+        data.sort_min    = 2000  # fewer balls than this fit in cache anyway and aren't sorted
+
+        self.steps    = 0 # steps taken so far
+        self.locality = 0 # locality just after the last sort, None until it's measured or 0 before any sort
+
+        data.check_alloc = False # when True each step fails if it allocates temporaries - see Balls.step
+        data.alloc_limit = 16384 # bytes of temporaries allowed per step when checking, for python objects
+        data.step_alloc  = 0     # bytes of temporaries allocated by the last checked step
+
+        # the world is drawn in a pygame window, or in a tkinter window with renderer='tk' - see tkrender.TkRenderer
+        self.renderer = renderer
+
+        # headless worlds are stepped and drawn by an external driver such as export.Exporter
+        if not headless:
+            self.open_window()
+            self.mainloop()
+
+
+    def open_window(self):
+
+        data = self.data
+
+        # the tkinter renderer draws into a window belonging to the settings panel
+        if self.renderer == 'tk':
+            self.panel = Panel(self, self.data)
+            self.view  = tkrender.TkRenderer(self, self.panel)
+            return
 
         # initialise window for drawing
         self.surface = pygame.display.set_mode((data.x_res, data.y_res), pygame.RESIZABLE)
@@ -71,174 +185,730 @@ class Balls(object):
         # initialising tkinter settings panel
         self.panel = Panel(self, self.data)
 
-        # call main loop
-        self.mainloop()
-
 
-    def draw(self):
+    def draw(self, surface):
 
         data = self.data
+        n    = data.n
 
-        self.surface.fill(white) # clear screen
+        surface.fill(white) # clear screen
 
-        # new ball position is previous position + velocity
-        data.pos += data.vel
+        # draw the walls from an image of them, made again if the walls or window size change
+        key = (self.walls, data.x_res, data.y_res)
+
+        if key != self.wall_key:
+
+            self.wall_image = pygame.surfarray.make_surface(self.wall_pixels())
+            self.wall_image.set_colorkey(white)
+            self.wall_key   = key
+
+        surface.blit(self.wall_image, (0, 0))
 
-        # calculate random colours according to variables set
+        tone    = self.colours()
+        circles = zip(data.pos[:n], data.radius[:n], tone)
 
-        hue         = ((data.hue_v*data.rhue + (1-data.hue_v)*data.rgrey) * 0.5 + 0.5)
-        base_colour = (int('0x'+data.hex[1:3], 0), int('0x'+data.hex[3:5], 0), int('0x'+data.hex[5:7], 0))
-        data.tone   = (data.val_v*hue + (1-data.val_v)) * numpy.array([base_colour]) # randomise colours
+        # in a periodic world balls crossing an edge are drawn again across the opposite edge
+        if self.walls.periodic:
+            circles = list(circles) + self.images(tone)
 
         # draw blue filling and black outline for each ball at its coords
-        for i, point in enumerate(data.pos[:data.n]):
+        for point, radius, colour in circles:
+
+            pygame.draw.circle(surface, colour, [int(point[0]),int(point[1])], int(radius), 0)
+            pygame.draw.circle(surface, black,  [int(point[0]),int(point[1])], int(radius), 1)
+
+
+    def wall_pixels(self):
+
+        # Returns the colours of the pixels of the window, indexed [x, y] - gray where there are walls and white elsewhere.
+
+        data  = self.data
+        solid = self.walls.solid(data.x_res, data.y_res)
 
-            # calculate effect of colour fade on colour of ball
-            tone = data.tone[i]*data.val[i] if data.fade else data.tone[i]
+        return numpy.where(solid[:,:,None], gray, white).astype(numpy.uint8)
 
-            pygame.draw.circle(self.surface, tone,  [int(point[0]),int(point[1])], data.r, 0)
-            pygame.draw.circle(self.surface, black, [int(point[0]),int(point[1])], data.r, 1)
 
+    def colours(self):
 
-    def gravity(self):
+        # Returns the colour of each ball from 0 to 255, in the tone scratch buffer.
 
         data = self.data
+        n    = data.n
 
-        # gravity array is data.g in each of the y components for each ball
-        grav = numpy.ones([data.max_n,2]) * numpy.array([[0, data.g]])
-        grav[data.n:] *= 0
+        # calculate random colours according to variables set, in place in the tone buffer
 
-        # add the velocity from gravity to the current velocity
-        data.vel += grav
+        tone        = self.scratch('tone',  n, (3,))
+        shade       = self.scratch('shade', n, (3,))
 
+        numpy.multiply(data.rhue[:n],  data.hue_v,   out=tone)
+        numpy.multiply(data.rgrey[:n], 1-data.hue_v, out=shade)
+        numpy.add(tone, shade, out=tone)
 
-    def bounce(self):
+        # base colour of each ball's species - data.hex unless the species has its own
+        numpy.take(self.species.base_colours(data.hex), data.species[:n], axis=0, out=shade, mode='clip')
+
+        # hue * 0.5 + 0.5 then scaled by the value variance and base colour to randomise colours
+        numpy.multiply(tone, 0.5*data.val_v, out=tone)
+        numpy.add(tone, 0.5*data.val_v + 1-data.val_v, out=tone)
+        numpy.multiply(tone, shade, out=tone)
+
+        # calculate effect of colour fade on colour of balls
+        if data.fade:
+            numpy.multiply(tone, data.val[:n,None], out=tone)
+
+        return tone
+
+
+    def images(self, tone):
+
+        # Returns (position, radius, colour) for each image of a ball crossing the edges of a periodic world,
+        # where it comes back in across the opposite edges. TONE holds the colours of the balls.
+
+        data   = self.data
+        n      = data.n
+        pos    = data.pos[:n]
+        radius = data.radius[:n,None]
+        size   = numpy.array([data.x_res, data.y_res])
+
+        # 1 for balls crossing the top or left edge, -1 for the bottom or right, for the direction of their images
+        side   = (pos < radius).astype(int) - (pos > size - radius)
+        images = []
+
+        for i in numpy.flatnonzero(side.any(axis=1)):
+
+            sx, sy = side[i]
+
+            for shift in {(sx, 0), (0, sy), (sx, sy)} - {(0, 0)}:
+                images.append((pos[i] + size*shift, radius[i,0], tone[i]))
+
+        return images
+
+
+    def scratch(self, name, length, shape=(), dtype=float, keep=False):
+
+        # Returns the first LENGTH rows of the world's scratch buffer called NAME. Buffers are kept between
+        # steps and grow by doubling, so temporaries in the step loop don't allocate once they are big enough.
+        # If KEEP the rows already in the buffer are copied over when it grows.
+
+        buffer = self.buffers.get(name)
+
+        if buffer is None or len(buffer) < length:
+
+            grown = numpy.zeros((max(length, 0 if buffer is None else 2*len(buffer)),) + shape, dtype)
+
+            if keep and buffer is not None:
+                grown[:len(buffer)] = buffer
+
+            buffer = self.buffers[name] = grown
+
+        return buffer[:length]
+
+
+    def indices(self, length):
+
+        # Returns the integers 0 .. LENGTH-1, from a buffer kept like the scratch buffers.
+
+        index = self.buffers.get('index')
+
+        if index is None or len(index) < length:
+
+            index = numpy.arange(max(length, 0 if index is None else 2*len(index)))
+            self.buffers['index'] = index
+
+        return index[:length]
+
+
+    def move(self):
 
         data = self.data
+        n    = data.n
 
-        # finds which balls are outside the screen and puts true in these slots
-        outside_greater = data.pos > numpy.array([[ data.x_res-data.r, data.y_res-data.r ]])
-        outside_lesser  = data.pos < numpy.array([[            data.r,            data.r ]])
+        # new ball position is previous position + velocity
+        numpy.add(data.pos[:n], data.vel[:n], out=data.pos[:n])
 
-        # OR together last 2 arrays to get all balls outside screen in 1 array
-        outside   = outside_greater | outside_lesser
 
-        # return balls which are currently outside AND not outside in the last timestep - balls shouldnt bounce twice or they get stuck
-        outside   = outside & ~data.last_outside
+    def accelerate(self):
 
-        # store which balls are currently outside to compare to next timestep
-        data.last_outside = outside
+        # add the velocity from all the enabled forces to the current velocity
+        self.forces.apply()
 
-        # convert boolean values to 1 for balls which are inside and -1 for outside, adjusted by the restitution
-        to_bounce = outside * (-1-data.rest) + 1
 
-        # multiply velocities by to_bounce to flip those which need to be
-        data.vel *= to_bounce
+    def bounce(self):
+
+        data    = self.data
+        n       = data.n
+        pos     = data.pos[:n]
+        vel     = data.vel[:n]
+        radius  = data.radius[:n]
+        walls   = self.walls
+
+        # the walls are sampled onto a grid once for each size of window - set_container and resize do this
+        # outside the step, so this only catches sizes set straight on data
+        if walls.size != (data.x_res, data.y_res):
+            walls.compile(data.x_res, data.y_res)
+
+        near    = self.scratch('near',  n, (3,))
+        depth   = self.scratch('depth', n)
+        length  = self.scratch('length', n)
+        push    = self.scratch('push',  n, (2,))
+        hit     = self.scratch('hit',   n, (), bool)
+        into    = self.scratch('into',  n, (), bool)
+
+        # distance from each ball to the walls, and the direction away from them
+        walls.sample(self, pos, near)
+
+        normal  = near[:,1:]
+        numpy.hypot(normal[:,0], normal[:,1], out=length)
+        numpy.maximum(length, 1e-9, out=length)
+        numpy.divide(normal, length[:,None], out=normal)
+
+        # balls closer to the walls than their radius are touching them
+        numpy.subtract(radius, near[:,0], out=depth)
+        numpy.greater(depth, 0, out=hit)
+
+        # speed each ball is moving away from the walls - balls moving into them bounce, which leaves balls
+        # which have already bounced alone while they are pushed out so they don't get stuck
+        numpy.multiply(vel, normal, out=push)
+        numpy.add(push[:,0], push[:,1], out=length)
+        numpy.less(length, 0, out=into)
+        numpy.logical_and(hit, into, out=into)
+
+        # reflect the velocity in the wall, adjusted by the restitution
+        numpy.multiply(length, 1+data.rest, out=length)
+        numpy.multiply(normal, length[:,None], out=push)
+        numpy.subtract(vel, push, out=vel, where=into[:,None])
+
+        if self.events.subscribers:
+            self.log_hits(into, normal, near[:,0], length)
+
+        # move balls out of the walls
+        numpy.multiply(normal, depth[:,None], out=push)
+        numpy.add(pos, push, out=pos, where=hit[:,None])
+
+        # in a periodic world balls which leave one side come back in the other
+        if walls.periodic:
+            numpy.remainder(pos[:,0], data.x_res, out=pos[:,0])
+            numpy.remainder(pos[:,1], data.y_res, out=pos[:,1])
+            return
 
         # make sure all balls are inside screen
-        data.pos[:,0] = numpy.clip(data.pos[:,0], data.r, data.x_res-data.r)
-        data.pos[:,1] = numpy.clip(data.pos[:,1], data.r, data.y_res-data.r)
+        numpy.subtract(data.x_res, radius, out=depth)
+        numpy.clip(pos[:,0], radius, depth, out=pos[:,0])
+        numpy.subtract(data.y_res, radius, out=depth)
+        numpy.clip(pos[:,1], radius, depth, out=pos[:,1])
 
 
     def collide(self):
 
+        data   = self.data
+        levels = self.levels
+
+        # bin the balls into grids for each size of ball and find pairs which might be touching
+        levels.build(data.pos, data.radius, data.n, data.x_res, data.y_res, 1, self.walls.periodic)
+        self.indexed = self.store.version
+
+        i1, i2 = levels.pairs()
+
+        if len(i1):
+
+            # compute resultant velocities from collisions
+            self.compute(i1, i2)
+
+
+    def separation(self, i1, i2, out, work):
+
+        # Fills OUT with the offsets from the balls I1 to the balls I2 - in a periodic world to the nearest image
+        # of each. WORK is a buffer the same shape as OUT.
+
         data = self.data
 
-        eligable   = data.pos[:data.n]
+        numpy.take(data.pos, i2, axis=0, out=out, mode='clip')
+        numpy.take(data.pos, i1, axis=0, out=work, mode='clip')
+        numpy.subtract(out, work, out=out)
 
-        # collisions keeps track of which collisions have already been computed
-        collisions = [[] for _ in range(data.n)]
+        if self.walls.periodic:
+            nearest(out[:,0], data.x_res, work[:,0])
+            nearest(out[:,1], data.y_res, work[:,1])
 
-        for i1, ball_pos in enumerate(eligable):
 
-            # calculate distance from current ball to all other balls
-            pos_translate = (eligable - ball_pos)**2
-            dist  = numpy.sum(pos_translate, axis=1)**0.5
+    def compute(self, i1, i2):
 
-            # they collide if the distance is less than 2 times the radius but not 0 - corresponds to current ball
-            hits  = (dist <= data.r*2) & (dist != 0.0)
+        # resolves the collisions between balls I1 and I2, which are arrays of pairs of ball indices - pairs
+        # which aren't touching are left alone
+        #
+        # The pairs are resolved a batch at a time, each batch starting from the velocities and positions left
+        # by the ones before, like resolving them one pair at a time. No ball is in two pairs of the same batch,
+        # as a ball in several contacts resolved at once gets all of their impulses and push-aparts added up,
+        # which pumps energy into packed balls without limit. The pairs are gone over data.passes times to
+        # settle contacts which later batches disturb.
 
-            # get indexes of balls which are colliding with current
-            index = numpy.nonzero(hits)[0]
+        data   = self.data
+        k      = len(i1)
 
-            for i2 in index:
+        offset = self.scratch('norm',  k, (2,))
+        work   = self.scratch('rel',   k, (2,))
+        dist   = self.scratch('dist',  k)
+        reach  = self.scratch('over',  k)
+        other  = self.scratch('vn',    k)
+        touch  = self.scratch('touch', k, (), bool)
+        apart  = self.scratch('apart', k, (), bool)
 
-                # record that i1 has collided with i2
-                collisions[i1].append(i2)
+        # only the pairs which are touching at the start are resolved
+        self.separation(i1, i2, offset, work)
+        numpy.hypot(offset[:,0], offset[:,1], out=dist)
 
-                # if this collision has already been computed from other ball then skip it
-                if i1 in collisions[i2]:
-                    continue
+        numpy.take(data.radius, i1, out=reach, mode='clip')
+        numpy.take(data.radius, i2, out=other, mode='clip')
+        numpy.add(reach, other, out=reach)
+        numpy.less(dist, reach, out=touch)
 
-                # compute resultant velocities from collision
-                self.compute(i1, i2)
+        numpy.logical_not(touch, out=apart)
 
-                # set 1 in data.val to make colour bright
-                data.val[i1] = data.val[i2] = 1.0
+        m      = numpy.count_nonzero(touch)
+        pairs  = self.compact(touch, apart, (i1, i2), self.scratch('pair1', m+1, (), numpy.intp),
+                                                       self.scratch('pair2', m+1, (), numpy.intp))
 
+        batch  = self.scratch('batch1', m+1, (), numpy.intp), self.scratch('batch2', m+1, (), numpy.intp)
 
-    def rotation_matrix(self, th):
+        # the pairs still to be resolved in a pass are kept in two sets of buffers - each time a batch is taken
+        # out of them the rest are copied from one set into the other
+        spares = [(self.scratch('left1', m+1, (), numpy.intp), self.scratch('left2', m+1, (), numpy.intp)),
+                  (self.scratch('rest1', m+1, (), numpy.intp), self.scratch('rest2', m+1, (), numpy.intp))]
 
-        # returns matrix which rotates vector around origin anticlockwise by theta
+        # smallest priority of the pairs each ball is in - see Balls.batch
+        first  = self.scratch('first', data.n, (), numpy.int64)
+        first.fill(1 << 32)
 
-        sin, cos = numpy.sin, numpy.cos
+        self.collisions = 0
 
-        return numpy.matrix([[cos(th), -sin(th)],
-                             [sin(th),  cos(th)]])
+        for step in range(data.passes):
 
+            left = pairs
 
-    def compute(self, i1, i2):
+            while len(left[0]):
+
+                chosen, others = self.batch(left[0], left[1], first)
+
+                hits   = self.resolve(*self.compact(chosen, others, left, *batch))
+                left   = self.compact(others, chosen, left, *spares[0])
+                spares = spares[::-1]
+
+                if step == 0:
+                    self.collisions += hits
+
+
+    def compact(self, keep, drop, arrays, *out):
+
+        # Copies the entries of each of ARRAYS where KEEP is true to the start of the matching buffer of OUT,
+        # returning the filled parts. DROP is the opposite of KEEP. Each buffer needs a spare slot at the end,
+        # which the dropped entries are all sent to - numpy.compress would do the same but allocates.
+
+        place = self.scratch('place', len(keep), (), numpy.intp)
+
+        numpy.copyto(place, keep)
+        numpy.add.accumulate(place, out=place)
+        size  = place[-1] if len(place) else 0
+
+        numpy.subtract(place, 1, out=place)
+        numpy.copyto(place, len(out[0]) - 1, where=drop)
+
+        for array, buffer in zip(arrays, out):
+            buffer.put(place, array)
+
+        return [buffer[:size] for buffer in out]
+
+
+    def batch(self, i1, i2, first):
+
+        # Picks out a batch of the pairs of balls I1, I2 in which no ball is in two pairs. Returns boolean arrays
+        # (chosen, others) of the pairs in the batch and those left out of it. FIRST has a slot for each ball,
+        # which holds 2**32 before and after.
+        #
+        # Each pair is given a priority by scrambling its place in the arrays, and goes in the batch if it has
+        # the smallest priority of all the pairs of both its balls. The pair with the smallest priority of all
+        # always goes in, and as the priorities are in no particular order many others do too - even along
+        # chains of touching balls, where going in order would let in only every other pair at best.
+
+        k        = len(i1)
+
+        priority = self.scratch('priority', k, (), numpy.int64)
+        mine     = self.scratch('mine',     k, (), numpy.int64)
+        chosen   = self.scratch('chosen',   k, (), bool)
+        others   = self.scratch('others',   k, (), bool)
+
+        # Knuth's multiplicative hash, which takes 0 .. k-1 to distinct priorities below 2**32
+        numpy.multiply(self.indices(k), 2654435761, out=priority)
+        numpy.bitwise_and(priority, 0xffffffff, out=priority)
+
+        numpy.minimum.at(first, i1, priority)
+        numpy.minimum.at(first, i2, priority)
+
+        numpy.take(first, i1, out=mine, mode='clip')
+        numpy.equal(mine, priority, out=chosen)
+        numpy.take(first, i2, out=mine, mode='clip')
+        numpy.equal(mine, priority, out=others)
+        numpy.logical_and(chosen, others, out=chosen)
+        numpy.logical_not(chosen, out=others)
+
+        first.put(i1, 1 << 32)
+        first.put(i2, 1 << 32)
+
+        return chosen, others
+
+
+    def resolve(self, i1, i2):
+
+        # Resolves the collisions between balls I1 and I2, which are arrays of pairs of ball indices in which no
+        # ball appears twice - pairs which aren't touching are left alone. Returns how many pairs collided.
+
+        data = self.data
+        k    = len(i1)
+
+        norm = self.scratch('norm', k, (2,))
+        rel  = self.scratch('rel',  k, (2,))
+        v2   = self.scratch('v2',   k, (2,))
+        dist = self.scratch('dist', k)
+        over = self.scratch('over', k)
+        lit  = self.scratch('lit',  k)
+        vn   = self.scratch('vn',   k)
+        m1   = self.scratch('m1',   k)
+        m2   = self.scratch('m2',   k)
+        imp  = self.scratch('imp',  k)
+        vt   = self.scratch('vt',   k)
+        jt   = self.scratch('jt',   k)
+        kind = self.scratch('kind', k, (), numpy.intp)
+        ref  = self.scratch('ref',  k, (), numpy.intp)
+        e    = self.scratch('e',    k)
+        mu   = self.scratch('mu',   k)
+
+        # gathers use mode='clip' as numpy.take buffers its whole output in the default mode
+
+        # de is the postion delta of the 2 balls - normalise it to get the line of centres
+        self.separation(i1, i2, norm, rel)
+
+        numpy.hypot(norm[:,0], norm[:,1], out=dist)
+        numpy.maximum(dist, 1e-9, out=dist) # coincident balls get a zero normal and don't interact
+        numpy.divide(norm, dist[:,None], out=norm)
+
+        # overlap of the balls - they touch when they are closer than the sum of their radii
+        numpy.take(data.radius, i1, out=over, mode='clip')
+        numpy.take(data.radius, i2, out=vn, mode='clip')
+        numpy.add(over, vn, out=over)
+        numpy.subtract(over, dist, out=over)
+        numpy.maximum(over, 0, out=over)
+        numpy.greater(over, 0, out=lit, casting='unsafe')
+
+        # relative velocity of the balls, split into the speed at which they approach along the line of
+        # centres and the speed at which they slide past each other - separating balls are left alone
+        numpy.take(data.vel, i1, axis=0, out=rel, mode='clip')
+        numpy.take(data.vel, i2, axis=0, out=v2, mode='clip')
+        numpy.subtract(rel, v2, out=rel)
+
+        numpy.multiply(rel, norm, out=v2)
+        numpy.add(v2[:,0], v2[:,1], out=vn)
+        numpy.maximum(vn, 0, out=vn)
+        numpy.multiply(vn, lit, out=vn)
+
+        numpy.multiply(rel[:,1], norm[:,0], out=vt)
+        numpy.multiply(rel[:,0], norm[:,1], out=jt)
+        numpy.subtract(vt, jt, out=vt)
+
+        # restitution and friction of each pair of species, from the flattened S x S tables
+        numpy.take(data.species, i1, out=kind, mode='clip')
+        numpy.take(data.species, i2, out=ref,  mode='clip')
+        numpy.multiply(kind, len(self.species.names), out=kind)
+        numpy.add(kind, ref, out=kind)
+        numpy.take(self.species.rest,     kind, out=e,  mode='clip')
+        numpy.take(self.species.friction, kind, out=mu, mode='clip')
+
+        # impulse along the line of centres from conservation of momentum and restitution e:
+        # J = (1+e) vn / (1/m1 + 1/m2)
+        numpy.take(data.mass, i1, out=m1, mode='clip')
+        numpy.take(data.mass, i2, out=m2, mode='clip')
+        numpy.reciprocal(m1, out=m1)
+        numpy.reciprocal(m2, out=m2)
+        numpy.add(m1, m2, out=imp)
+        numpy.divide(vn, imp, out=imp)
+        numpy.multiply(e, data.rest, out=e)
+        numpy.add(e, 1, out=e)
+        numpy.multiply(imp, e, out=imp)
+
+        # friction impulse across the line of centres, mu J by coulomb's law but no more than it takes to stop
+        # the balls sliding: vt / (1/m1 + 1/m2)
+        numpy.add(m1, m2, out=jt)
+        numpy.divide(vt, jt, out=jt)
+        numpy.multiply(mu, imp, out=mu)
+        numpy.minimum(jt, mu, out=jt)
+        numpy.negative(mu, out=mu)
+        numpy.maximum(jt, mu, out=jt)
+
+        # total impulse, along the line of centres and across it
+        numpy.multiply(norm[:,0], imp, out=rel[:,0])
+        numpy.multiply(norm[:,1], jt,  out=vt)
+        numpy.subtract(rel[:,0], vt, out=rel[:,0])
+        numpy.multiply(norm[:,1], imp, out=rel[:,1])
+        numpy.multiply(norm[:,0], jt,  out=vt)
+        numpy.add(rel[:,1], vt, out=rel[:,1])
+
+        # apply the impulse to both balls
+        numpy.multiply(rel, m1[:,None], out=v2)
+        numpy.subtract.at(data.vel, i1, v2)
+        numpy.multiply(rel, m2[:,None], out=v2)
+        numpy.add.at(data.vel, i2, v2)
+
+        if self.events.subscribers:
+            self.log_collisions(i1, i2, norm, imp, jt)
+
+        # need to move balls apart so they are no longer colliding - each ball moves half of the overlap
+        numpy.multiply(over, 0.5, out=over)
+        numpy.multiply(norm, over[:,None], out=norm)
+        numpy.subtract.at(data.pos, i1, norm)
+        numpy.add.at(data.pos, i2, norm)
+
+        # balls which hit something light up
+        numpy.maximum.at(data.val, i1, lit)
+        numpy.maximum.at(data.val, i2, lit)
+
+        return numpy.count_nonzero(vn)
+
+
+    def log_collisions(self, i1, i2, norm, imp, jt):
+
+        # Records the pairs I1, I2 with an impulse between them as collision events. NORM holds the unit vectors
+        # between the balls and IMP and JT the impulses along and across them.
+
+        data  = self.data
+        k     = len(i1)
+
+        mask  = self.scratch('event_mask',  k, (), bool)
+        id1   = self.scratch('event_id1',   k, (), numpy.intp)
+        id2   = self.scratch('event_id2',   k, (), numpy.intp)
+        size  = self.scratch('event_size',  k)
+        point = self.scratch('event_point', k, (2,))
+        step  = self.scratch('event_step',  k, (2,))
+        reach = self.scratch('event_reach', k)
+
+        numpy.hypot(imp, jt, out=size)
+        numpy.greater(size, 0, out=mask)
+
+        numpy.take(data.ids, i1, out=id1, mode='clip')
+        numpy.take(data.ids, i2, out=id2, mode='clip')
+
+        # the balls touch on the line of centres, a radius from the first
+        numpy.take(data.pos, i1, axis=0, out=point, mode='clip')
+        numpy.take(data.radius, i1, out=reach, mode='clip')
+        numpy.multiply(norm, reach[:,None], out=step)
+        numpy.add(point, step, out=point)
+
+        self.events.collisions.record(self, mask, id1=id1, id2=id2, impulse=size, x=point[:,0], y=point[:,1])
+
+
+    def log_hits(self, into, normal, distance, change):
+
+        # Records the balls which bounced off the walls, INTO, as hit events. NORMAL points away from the walls,
+        # DISTANCE is how far each ball's centre is from them and CHANGE the speed each ball gained along the
+        # normal, which is negative.
+
+        data  = self.data
+        n     = data.n
+
+        size  = self.scratch('event_size',  n)
+        point = self.scratch('event_point', n, (2,))
+
+        # impulse is the change in momentum
+        numpy.multiply(change, data.mass[:n], out=size)
+        numpy.negative(size, out=size)
+
+        # the balls touch the walls a distance along the normal behind their centres
+        numpy.multiply(normal, distance[:,None], out=point)
+        numpy.subtract(data.pos[:n], point, out=point)
+
+        self.events.hits.record(self, into, id=data.ids[:n], impulse=size, x=point[:,0], y=point[:,1])
+
+
+    def radii(self, size):
+
+        # Radii of balls at places SIZE in the size distribution - spread evenly on a log scale around data.r,
+        # from data.r / sqrt(spread) to data.r * sqrt(spread).
+
+        return self.data.r * self.data.spread ** (size - 0.5)
+
+
+    def masses(self, radius):
+
+        # Masses of balls with radii RADIUS, from their area and data.density.
+
+        return self.data.density * numpy.pi * radius**2
+
+
+    def set_sizes(self, r, spread):
+
+        # Sets the average radius and spread of the size distribution and resizes all the balls to fit it.
+
+        data = self.data
+
+        if (r, spread) == (data.r, data.spread):
+            return
+
+        data.r, data.d, data.spread = r, 2*r, spread
+
+        n = data.n
+        data.radius[:n] = self.radii(data.size[:n])
+        data.mass[:n]   = self.masses(data.radius[:n])
+
+
+    def set_container(self, name):
+
+        # Swaps the walls for the container called NAME in walls.PRESETS.
+
+        data           = self.data
+        data.container = name
+        self.walls     = walls.PRESETS[name]()
+
+        # sampling the walls allocates, so it is done here rather than in the next step
+        self.walls.compile(data.x_res, data.y_res)
+
+
+    def resize(self, width, height):
+
+        # Changes the size of the world to fit a window WIDTH by HEIGHT, sampling the walls for the new size.
+
+        data       = self.data
+        data.x_res = width
+        data.y_res = height
+
+        self.walls.compile(width, height)
+
+
+    def place(self, count, others=True):
+
+        # Returns positions for COUNT new balls, whose radii are in the slots from data.n up, laid out by
+        # data.layout clear of the walls and, if OTHERS, of the balls already there. Balls which don't fit are
+        # put anywhere in the window, as they would be without a layout.
+
+        data   = self.data
+        n      = data.n
+        r      = data.radius[n:n+count].max() if count else data.r
+        space  = r # half the spacing between new balls
+
+        walls  = self.walls
+
+        if walls.size != (data.x_res, data.y_res):
+            walls.compile(data.x_res, data.y_res)
+
+        clear  = placement.Clear(data.pos[:n*others], data.radius[:n*others], space)
+
+        def free(points):
+
+            field = numpy.empty([len(points), 3])
+            walls.sample(self, points, field)
+
+            return (field[:,0] >= r) & clear(points)
+
+        pos    = placement.LAYOUTS[data.layout](count, 2*space, data.x_res, data.y_res, free)
+        extra  = numpy.random.rand(count - len(pos), 2) * numpy.array([[data.x_res-data.d, data.y_res-data.d]]) + data.r
+
+        return numpy.concatenate([pos, extra])
+
+
+    def set_layout(self, name):
+
+        # Lays all the balls out again with the layout called NAME in placement.LAYOUTS.
+
+        data        = self.data
+        data.layout = name
+
+        # place assumes the balls being placed start at data.n, so it is pointed at the start of the arrays
+        n, data.n   = data.n, 0
+        pos         = self.place(n, others=False)
+        data.n      = n
+
+        data.pos[:n] = pos
+
+
+    def set_potential(self, name):
+
+        # Switches between hard sphere collisions (NAME None) and one of the soft potentials.
+
+        self.data.potential = name
+
+        # the accelerations left from another potential don't belong to this one
+        self.data.pair_acc.fill(0)
+
+
+    def kick(self):
 
         data = self.data
+        n    = data.n
 
-        # find velocities, positions and masses of balls
-        x1, x2 = data.pos[i1],  data.pos[i2]
-        v1, v2 = data.vel[i1],  data.vel[i2]
-        m1, m2 = data.mass[i1], data.mass[i2]
+        half = self.scratch('half', n, (2,))
 
-        # e is the restitution of the system and de is the postion delta of the 2 balls
-        e      = data.rest
-        de     = x2 - x1
+        # half of the velocity verlet velocity update, using the potential's latest accelerations
+        numpy.multiply(data.pair_acc[:n], 0.5, out=half)
+        numpy.add(data.vel[:n], half, out=data.vel[:n])
 
-        # translate velocities to frame of reference of ball 2 and find angle of line of centres
-        v1r    = v1 - v2
-        th     = numpy.arctan2(de[1], de[0])
 
-        # make rotation matrices for + and - line of centres and then rotate relative velocity of balls
-        rot    = self.rotation_matrix(-th)
-        m_rot  = self.rotation_matrix(th)
-        v1rr   = numpy.matmul(rot, v1r)
+    def interact(self):
 
-        # calculate new rotated relative velocities by conservation of momentum and restitution
-        v1rrr  = numpy.repeat(v1rr, 2, axis=0)
-        coeffs = numpy.array([[ (m1-e*m1)/(m1+m2), 1 ],
-                              [ (m1+e*m2)/(m1+m2), 0 ]])
-        vrrn   = coeffs * numpy.array(v1rrr)
+        # Soft potential counterpart of collide - finds the pairs of balls within the reach of the potential
+        # with the grid, sums the potential's forces on each ball into data.pair_acc and applies the second
+        # half of the velocity verlet velocity update.
 
-        # rotate velocities back to normal coordinate system
-        vrn    = numpy.matmul(m_rot, vrrn.T)
+        data      = self.data
+        n         = data.n
+        potential = self.potentials[data.potential]
 
-        # translate velocities to absolute velocity
-        vn     = vrn.T + v2
+        self.levels.build(data.pos, data.radius, n, data.x_res, data.y_res, potential.scale, self.walls.periodic)
+        self.indexed = self.store.version
 
-        # overwrite velocities with new values
-        data.vel[i1]  = vn[0]
-        data.vel[i2]  = vn[1]
+        i1, i2    = self.levels.pairs()
+        k         = len(i1)
+        acc       = data.pair_acc[:n]
 
-        # ~~~ todo improve next part ~~~
+        acc.fill(0)
 
-        # calculate distance between balls - need to move balls apart so they are no longer colliding
-        mde    = (de[0]**2 + de[1]**2)**0.5
+        if k:
 
-        # find fraction of radius to move - divided by 2 as each ball moves half of this distance
-        fr     = (data.r*2 - mde) / data.r / 2
+            norm = self.scratch('norm', k, (2,))
+            rel  = self.scratch('rel',  k, (2,))
+            dist = self.scratch('dist', k)
+            over = self.scratch('over', k)
+            mag  = self.scratch('mag',  k)
+            m    = self.scratch('m1',   k)
+            lit  = self.scratch('lit',  k)
 
-        # calculate move in x and y
-        m      = [fr * de[0], fr * de[1]]
+            # unit vectors along the line of centres and distances between the balls
+            self.separation(i1, i2, norm, rel)
 
-        # move balls by this amount
-        data.pos[i1] -= m
-        data.pos[i2] += m
+            numpy.hypot(norm[:,0], norm[:,1], out=dist)
+            numpy.maximum(dist, 1e-9, out=dist)
+            numpy.divide(norm, dist[:,None], out=norm)
+
+            # distance at which each pair touch
+            numpy.take(data.radius, i1, out=over, mode='clip')
+            numpy.take(data.radius, i2, out=mag, mode='clip')
+            numpy.add(over, mag, out=over)
+
+            potential(self, i1, i2, norm, dist, over, mag)
+            numpy.clip(mag, -potential.limit, potential.limit, out=mag)
+
+            # push each ball of a pair away from the other, by the force over its own mass
+            numpy.multiply(norm, mag[:,None], out=norm)
+
+            numpy.take(data.mass, i1, out=m, mode='clip')
+            numpy.divide(norm, m[:,None], out=rel)
+            numpy.subtract.at(acc, i1, rel)
+
+            numpy.take(data.mass, i2, out=m, mode='clip')
+            numpy.divide(norm, m[:,None], out=rel)
+            numpy.add.at(acc, i2, rel)
+
+            # balls which are touching light up
+            numpy.less(dist, over, out=lit, casting='unsafe')
+            numpy.maximum.at(data.val, i1, lit)
+            numpy.maximum.at(data.val, i2, lit)
+
+        self.kick()
 
 
     def evolve_fade(self):
@@ -252,12 +922,140 @@ class Balls(object):
             # reduce self.val in an exponential decay making ball colour fade over time
     
             decay_const = 1-1/data.f_len
+            val         = data.val[:data.n]
     
-            data.val    = data.val*decay_const + 0.2*(1-decay_const)
+            numpy.multiply(val, decay_const, out=val)
+            numpy.add(val, 0.2*(1-decay_const), out=val)
+
+
+    def advance(self):
+
+        soft = self.data.potential is not None
+
+        # soft potentials are integrated with velocity verlet - half a kick before moving and half after
+        if soft:
+            self.kick()
+
+        self.events.clear()
+        self.collisions = 0
+
+        self.move()
+        self.accelerate()
+        self.bounce()
+
+        if soft:
+            self.interact()
+        else:
+            self.collide()
+
+        self.evolve_fade()
+
+
+    def step(self):
+
+        # advance the simulation by one frame
+
+        # sorting the balls is occasional upkeep rather than part of the step, so it's left out of the check -
+        # it goes first so the broad-phase built by the step still matches the balls' slots afterwards
+        self.tidy()
+
+        start = time.perf_counter()
+
+        if self.data.check_alloc:
+            self.checked_advance()
+        else:
+            self.advance()
+
+        self.metrics.record('Step Time', (time.perf_counter() - start) * 1000)
+        self.metrics.record('Collisions', self.collisions)
+
+        self.events.publish()
+
+        if self.stats.enabled:
+            self.stats.update()
+
+
+    def checked_advance(self):
+
+        data = self.data
+
+        # When checking allocations the step runs under tracemalloc. Memory still held at the end of the step
+        # (eg. scratch buffers growing) is fine, but anything above that at the peak was a temporary.
+        # numpy's ufunc buffers are shrunk for the step so they don't hide small temporaries. Tracing slows
+        # everything else down several times over, so it is stopped again afterwards unless it was already on.
+
+        tracing = tracemalloc.is_tracing()
+
+        if not tracing:
+            tracemalloc.start()
+
+        bufsize = numpy.setbufsize(16)
+        tracemalloc.reset_peak()
+
+        try:
+            self.advance()
+
+        finally:
+            current, peak   = tracemalloc.get_traced_memory()
+            numpy.setbufsize(bufsize)
+
+            if not tracing:
+                tracemalloc.stop()
+
+        data.step_alloc = peak - current
+
+        assert data.step_alloc <= data.alloc_limit, 'step allocated %d bytes of temporaries' % data.step_alloc
+
+
+    def tidy(self):
+
+        # Balls which are close together in space drift apart in memory as they move, which makes the gathers in
+        # the step loop jump around memory and miss the cache at large n. Every data.sort_every steps this
+        # measures the locality of the balls as how far apart in memory the two balls of each of the last step's
+        # pairs are on average. Once that is data.sort_factor times worse than just after the last sort the
+        # balls are sorted again.
+
+        data        = self.data
+        self.steps += 1
+
+        if self.steps % data.sort_every or data.n < data.sort_min:
+            return
+
+        npairs = self.levels.npairs
+
+        if npairs == 0:
+            return
+
+        gap = numpy.abs(self.levels.i1[:npairs] - self.levels.i2[:npairs]).mean()
+
+        if self.locality is None:
+            self.locality = gap
+
+        elif gap > data.sort_factor * self.locality:
+            self.reorder()
+            self.locality = None
+
+
+    def reorder(self):
+
+        # Sorts the balls in memory by the Morton code of the cell of a grid with cells a ball wide that each is
+        # in, which puts balls which are close together in space close together in memory. Ids stay the same.
+
+        data  = self.data
+        n     = data.n
+
+        cells = numpy.clip(data.pos[:n] // data.d, 0, 65535).astype(numpy.uint64)
+        order = numpy.argsort(morton(cells[:,0], cells[:,1]), kind='stable')
+
+        self.store.permute(order)
 
 
     def mainloop(self):
 
+        # the tkinter renderer runs the simulation from tkinter's own event loop
+        if self.renderer == 'tk':
+            return self.view.mainloop()
+
         # set up pygame clock
         clock = pygame.time.Clock()
 
@@ -265,6 +1063,7 @@ class Balls(object):
 
             # limit clock rate to framerate
             clock.tick(self.data.fps)
+            self.metrics.record('FPS', clock.get_fps())
 
             # test for exit request
             for event in pygame.event.get():
@@ -272,17 +1071,13 @@ class Balls(object):
                     sys.exit()
 
                 if event.type == pygame.VIDEORESIZE:
-                    self.data.x_res = event.w
-                    self.data.y_res = event.h
+                    self.resize(event.w, event.h)
                     self.surface    = pygame.display.set_mode((event.w, event.h), pygame.RESIZABLE)
 
     
-            # render scene
-            self.draw()
-            self.gravity()
-            self.bounce()
-            self.collide()
-            self.evolve_fade()
+            # advance and render scene
+            self.step()
+            self.draw(self.surface)
 
             # update screen
             pygame.display.flip()
@@ -400,87 +1195,198 @@ class Panel(gooey.Tk):
         gooey.Spacer(s_frame,height=SP).grid(row=7)
         gooey.Spacer(s_frame,width=SP).grid(row=8, column=0)
 
-        self.number_title = gooey.Label(s_frame, text='Ball Count', font=verdana_med, fg='grey34')
-        self.number_title.grid(row=8, column=1, sticky='w')
+        # ratio of the biggest ball's radius to the smallest's, for mixtures of sizes
+        self.spread_title = gooey.Label(s_frame, text='Size Spread', font=verdana_med, fg='grey34')
+        self.spread_title.grid(row=8, column=1, sticky='w')
 
         gooey.Spacer(s_frame,width=SP).grid(row=8, column=2)
 
-        self.number_scale = gooey.Scale(s_frame, height=SP*1.5, length=SP*12, width=SP*100, from_=1, to=data.max_n, value_type='int')
-        self.number_scale.grid(row=8, column=3)
-        self.number_scale.set(70)
+        self.spread_scale = gooey.Scale(s_frame, height=SP*1.5, length=SP*12, width=SP*100, from_=1, to=10)
+        self.spread_scale.grid(row=8, column=3)
+        self.spread_scale.set(1)
 
         gooey.Spacer(s_frame,width=SP).grid(row=8, column=4)
 
-        self.number_label = gooey.Label(s_frame, text='70', font=verdana_sml, fg='grey34')
-        self.number_label.grid(row=8, column=5)
+        self.spread_label = gooey.Label(s_frame, text='1.0', font=verdana_sml, fg='grey34')
+        self.spread_label.grid(row=8, column=5)
 
 
         gooey.Spacer(s_frame,height=SP).grid(row=9)
+        gooey.Spacer(s_frame,width=SP).grid(row=10, column=0)
 
-        self.colour_options_title = gooey.Label(s_frame, text='Colour Options', font=arial_med, fg='black')
-        self.colour_options_title.grid(row=10, column=0, columnspan=4, sticky='w')
+        self.number_title = gooey.Label(s_frame, text='Ball Count', font=verdana_med, fg='grey34')
+        self.number_title.grid(row=10, column=1, sticky='w')
+
+        gooey.Spacer(s_frame,width=SP).grid(row=10, column=2)
+
+        self.number_scale = gooey.Scale(s_frame, height=SP*1.5, length=SP*12, width=SP*100, from_=1, to=data.n_limit, value_type='int')
+        self.number_scale.grid(row=10, column=3)
+        self.number_scale.set(70)
+
+        gooey.Spacer(s_frame,width=SP).grid(row=10, column=4)
+
+        self.number_label = gooey.Label(s_frame, text='70', font=verdana_sml, fg='grey34')
+        self.number_label.grid(row=10, column=5)
 
 
         gooey.Spacer(s_frame,height=SP).grid(row=11)
-        gooey.Spacer(s_frame,width=SP).grid(row=12, column=0)
+
+        self.colour_options_title = gooey.Label(s_frame, text='Colour Options', font=arial_med, fg='black')
+        self.colour_options_title.grid(row=12, column=0, columnspan=4, sticky='w')
+
+
+        gooey.Spacer(s_frame,height=SP).grid(row=13)
+        gooey.Spacer(s_frame,width=SP).grid(row=14, column=0)
 
         self.hex_title = gooey.Label(s_frame, text='Base Colour (hex)', font=verdana_sml, fg='grey34')
-        self.hex_title.grid(row=12, column=1, sticky='w')
+        self.hex_title.grid(row=14, column=1, sticky='w')
 
-        gooey.Spacer(s_frame,width=SP).grid(row=12, column=2)
+        gooey.Spacer(s_frame,width=SP).grid(row=14, column=2)
 
         self.hex_entry = gooey.Entry(s_frame)
-        self.hex_entry.grid(row=12, column=3, sticky='nsw',ipady=4)
+        self.hex_entry.grid(row=14, column=3, sticky='nsw',ipady=4)
         self.hex_entry.insert(0,'#22eeff')
 
         self.fade_title = gooey.Label(s_frame, text='Fade:', font=verdana_sml, fg='grey34')
-        self.fade_title.grid(row=12, column=3, sticky='e')
+        self.fade_title.grid(row=14, column=3, sticky='e')
 
         self.fade_button = gooey.EdgeButton(s_frame, text='On', font=verdana_sml, fg='grey34', command= self.toggle_fade)
-        self.fade_button.grid(row=12, column=5, sticky='nswe')
+        self.fade_button.grid(row=14, column=5, sticky='nswe')
 
 
-        gooey.Spacer(s_frame,height=SP*0.7).grid(row=13)
-        gooey.Spacer(s_frame,width=SP).grid(row=14, column=0)
+        gooey.Spacer(s_frame,height=SP*0.7).grid(row=15)
+        gooey.Spacer(s_frame,width=SP).grid(row=16, column=0)
 
         self.val_v_title = gooey.Label(s_frame, text='Value Variance', font=verdana_sml, fg='grey34')
-        self.val_v_title.grid(row=14, column=1, sticky='w')
+        self.val_v_title.grid(row=16, column=1, sticky='w')
 
-        gooey.Spacer(s_frame,width=SP).grid(row=14, column=2)
+        gooey.Spacer(s_frame,width=SP).grid(row=16, column=2)
 
         self.val_v_scale = gooey.Scale(s_frame, height=SP*1.25, length=SP*12, width=SP*100, from_=0, to=1)
-        self.val_v_scale.grid(row=14, column=3)
+        self.val_v_scale.grid(row=16, column=3)
         self.val_v_scale.set(1.0)
 
-        gooey.Spacer(s_frame,width=SP).grid(row=14, column=4)
+        gooey.Spacer(s_frame,width=SP).grid(row=16, column=4)
 
         self.val_v_label = gooey.Label(s_frame, text='1.0', font=verdana_min, fg='grey34')
-        self.val_v_label.grid(row=14, column=5)
+        self.val_v_label.grid(row=16, column=5)
 
 
-        gooey.Spacer(s_frame,height=SP).grid(row=15)
-        gooey.Spacer(s_frame,width=SP).grid(row=16, column=0)
+        gooey.Spacer(s_frame,height=SP).grid(row=17)
+        gooey.Spacer(s_frame,width=SP).grid(row=18, column=0)
 
         self.hue_v_title = gooey.Label(s_frame, text='Hue Variance', font=verdana_sml, fg='grey34')
-        self.hue_v_title.grid(row=16, column=1, sticky='w')
+        self.hue_v_title.grid(row=18, column=1, sticky='w')
 
-        gooey.Spacer(s_frame,width=SP).grid(row=16, column=2)
+        gooey.Spacer(s_frame,width=SP).grid(row=18, column=2)
 
         self.hue_v_scale = gooey.Scale(s_frame, height=SP*1.25, length=SP*12, width=SP*100, from_=0, to=1)
-        self.hue_v_scale.grid(row=16, column=3)
+        self.hue_v_scale.grid(row=18, column=3)
         self.hue_v_scale.set(0.5)
 
-        gooey.Spacer(s_frame,width=SP).grid(row=16, column=4)
+        gooey.Spacer(s_frame,width=SP).grid(row=18, column=4)
 
         self.hue_v_label = gooey.Label(s_frame, text='0.5', font=verdana_min, fg='grey34')
-        self.hue_v_label.grid(row=16, column=5)
+        self.hue_v_label.grid(row=18, column=5)
 
-        gooey.Spacer(s_frame,height=SP).grid(row=17)
+        gooey.Spacer(s_frame,height=SP).grid(row=19)
+
+        self.forces_title = gooey.Label(s_frame, text='Forces', font=arial_med, fg='black')
+        self.forces_title.grid(row=20, column=0, columnspan=4, sticky='w')
+
+        gooey.Spacer(s_frame,height=SP*0.7).grid(row=21)
+        gooey.Spacer(s_frame,width=SP).grid(row=22, column=0)
+
+        # choice between hard sphere collisions and the soft potentials
+        self.potential_title = gooey.Label(s_frame, text='Interaction', font=verdana_sml, fg='grey34')
+        self.potential_title.grid(row=22, column=1, sticky='w')
+
+        self.potential_menu = gooey.Dropdown(s_frame, values=['Hard Spheres'] + list(parent.potentials),
+                                             font=verdana_sml, fg='grey34', command=self.set_potential)
+        self.potential_menu.grid(row=22, column=3, columnspan=3, sticky='nswe')
+
+        gooey.Spacer(s_frame,height=SP*0.7).grid(row=23)
+        gooey.Spacer(s_frame,width=SP).grid(row=24, column=0)
+
+        # shape of the container the balls are in
+        self.container_title = gooey.Label(s_frame, text='Container', font=verdana_sml, fg='grey34')
+        self.container_title.grid(row=24, column=1, sticky='w')
+
+        self.container_menu = gooey.Dropdown(s_frame, values=list(walls.PRESETS), font=verdana_sml, fg='grey34',
+                                             command=self.set_container)
+        self.container_menu.grid(row=24, column=3, columnspan=3, sticky='nswe')
+
+        gooey.Spacer(s_frame,height=SP*0.7).grid(row=25)
+        gooey.Spacer(s_frame,width=SP).grid(row=26, column=0)
+
+        # how the balls are laid out - picking a layout lays them all out again
+        self.layout_title = gooey.Label(s_frame, text='Layout', font=verdana_sml, fg='grey34')
+        self.layout_title.grid(row=26, column=1, sticky='w')
+
+        self.layout_menu = gooey.Dropdown(s_frame, values=list(placement.LAYOUTS), font=verdana_sml, fg='grey34',
+                                          command=self.set_layout)
+        self.layout_menu.grid(row=26, column=3, columnspan=3, sticky='nswe')
+
+        gooey.Spacer(s_frame,height=SP*0.7).grid(row=27)
+
+        # a row with an on/off button for each force, in the order the forces are applied
+        self.force_buttons = {}
+
+        for i, (name, force) in enumerate(parent.forces.fields.items()):
+
+            row = 28 + i*2
+
+            gooey.Spacer(s_frame,width=SP).grid(row=row, column=0)
+
+            title = gooey.Label(s_frame, text=name, font=verdana_sml, fg='grey34')
+            title.grid(row=row, column=1, sticky='w')
+
+            button = gooey.EdgeButton(s_frame, text='On' if force.enabled else 'Off', font=verdana_sml, fg='grey34',
+                                      command=lambda name=name: self.toggle_force(name))
+            button.grid(row=row, column=5, sticky='nswe')
+
+            self.force_buttons[name] = button
+
+            gooey.Spacer(s_frame,height=SP*0.3).grid(row=row+1)
+
+        gooey.Spacer(s_frame,height=SP*0.7).grid(row=28 + len(parent.forces.fields)*2)
+
+        row = 29 + len(parent.forces.fields)*2
+
+        self.stats_title = gooey.Label(s_frame, text='Statistics', font=arial_med, fg='black')
+        self.stats_title.grid(row=row, column=0, columnspan=4, sticky='w')
+
+        gooey.Spacer(s_frame,height=SP*0.7).grid(row=row+1)
+        gooey.Spacer(s_frame,width=SP).grid(row=row+2, column=0)
+
+        # which statistic is plotted - the statistics are only worked out while one is
+        self.plot_title = gooey.Label(s_frame, text='Plot', font=verdana_sml, fg='grey34')
+        self.plot_title.grid(row=row+2, column=1, sticky='w')
+
+        self.plot_menu = gooey.Dropdown(s_frame, values=['Off'] + stats.SERIES + PERFORMANCE + stats.DISTRIBUTIONS + list(OVERLAYS),
+                                        font=verdana_sml, fg='grey34', command=self.set_plot)
+        self.plot_menu.grid(row=row+2, column=3, columnspan=3, sticky='nswe')
+
+        gooey.Spacer(s_frame,height=SP*0.7).grid(row=row+3)
+
+        self.graph = gooey.Graph(s_frame, dragable=False, width=SP*22, height=SP*16, highlightthickness=0)
+        self.graph.grid(row=row+4, column=0, columnspan=6)
+        self.overlay = [] # names of the metrics plotted as series of their own - see Panel.set_plot
+
+        gooey.Spacer(s_frame,height=SP*0.7).grid(row=row+5)
+
+        self.after(data.plot_every, self.plot)
+
+        # each control tells the panel when its value changes, rather than the panel reading every control on every event
+        self.labels  = {'g': self.grav_label, 'rest': self.rest_label, 'r': self.radius_label, 'spread': self.spread_label,
+                        'n': self.number_label, 'hue_v': self.hue_v_label, 'val_v': self.val_v_label}
+        self.changes = {} # parameter -> new value, for each parameter changed since the changes were last pushed
 
-        # binding certain events in the settings panel to get the values of the variables in it 
-        self.bind('<B1-Motion>',       self.get_vars)
-        self.bind('<ButtonRelease-1>', self.get_vars)
-        self.bind('<Return>',          self.get_vars)
+        controls = {'g': self.grav_scale, 'rest': self.rest_scale, 'r': self.radius_scale, 'spread': self.spread_scale,
+                    'n': self.number_scale, 'hex': self.hex_entry, 'hue_v': self.hue_v_scale, 'val_v': self.val_v_scale}
+
+        for name, control in controls.items():
+            control['command'] = lambda value, name=name: self.changed(name, value)
 
 
     def close(self):
@@ -492,24 +1398,39 @@ class Panel(gooey.Tk):
         self.destroy()
 
 
-    def get_vars(self,_):
+    def changed(self, name, value):
+
+        # Called by a control when its value changes. Changes made together, eg. by dragging two scales in one
+        # burst of events, are pushed into the simulation together the next time Tk is idle.
+
+        self.changes[name] = value
+        gooey.scheduler.request(self, self.push)
 
-        # for each variable, set the value in data to the right value and update the value label
 
-        self.data.g     = self.grav_scale.get()
-        self.data.rest  = self.rest_scale.get()
-        self.data.r     = self.radius_scale.get()
-        self.data.n     = self.number_scale.get()
-        self.data.hex   = self.hex_entry.get()
-        self.data.hue_v = self.hue_v_scale.get()
-        self.data.val_v = self.val_v_scale.get()
+    def push(self):
+
+        # sets only the parameters which have changed in data and updates only their value labels
+
+        changes, self.changes = self.changes, {}
+        data = self.data
 
-        self.grav_label['text']   = str(round(self.data.g, 4))
-        self.rest_label['text']   = str(round(self.data.rest, 4))
-        self.radius_label['text'] = str(round(self.data.r, 4))
-        self.number_label['text'] = str(round(self.data.n, 4))
-        self.hue_v_label['text']  = str(round(self.data.hue_v, 4))
-        self.val_v_label['text']  = str(round(self.data.val_v, 4))
+        for name in ('g', 'rest', 'hue_v', 'val_v'):
+            if name in changes:
+                setattr(data, name, changes[name])
+
+        if 'r' in changes or 'spread' in changes:
+            self.parent.set_sizes(changes.get('r', data.r), changes.get('spread', data.spread))
+
+        if 'n' in changes:
+            self.parent.store.resize(changes['n'])
+
+        # the colour is only taken once a whole colour has been typed in
+        if 'hex' in changes and re.fullmatch('#[0-9a-fA-F]{6}', changes['hex']):
+            data.hex = changes['hex']
+
+        for name in changes:
+            if name in self.labels:
+                self.labels[name]['text'] = str(round(getattr(data, name), 4))
 
 
     def toggle_fade(self):
@@ -522,4 +1443,79 @@ class Panel(gooey.Tk):
         # sets text on button to represent value of self.fade
         self.fade_button['text'] = 'On' if data.fade else 'Off'
 
-Balls()
+
+    def set_container(self):
+
+        # called when a container is picked from the dropdown
+        self.parent.set_container(self.container_menu.get())
+
+
+    def set_layout(self):
+
+        # called when a layout is picked from the dropdown
+        self.parent.set_layout(self.layout_menu.get())
+
+
+    def set_plot(self):
+
+        # called when a statistic is picked from the dropdown
+        name    = self.plot_menu.get()
+        metrics = [metric for metric, _ in OVERLAYS.get(name, [])]
+
+        self.parent.stats.enable(name in stats.SERIES + stats.DISTRIBUTIONS or bool(set(metrics) & set(stats.SERIES)))
+        self.graph.configure(title=None if name == 'Off' else name, data=[])
+
+        # an overlay plots each of its metrics as a series of its own on the graph, instead of the graph's own data
+        for metric in self.overlay:
+            self.graph.remove_series(metric)
+
+        for metric, colour in OVERLAYS.get(name, []):
+            self.graph.add_series(metric, colour=colour, outline=colour, spline=False)
+
+        self.overlay = metrics
+
+
+    def plot(self):
+
+        # redraws the graph with the latest statistics - a few times a second, as redrawing it is slow
+        data = self.data
+        name = self.plot_menu.get()
+
+        if name in stats.DISTRIBUTIONS:
+            self.graph.configure(data=self.parent.stats.plot(name))
+
+        elif name in OVERLAYS:
+            now = time.time()
+            for metric in self.overlay:
+                rows = self.parent.metrics.query(metric, now - data.plot_window, now, data.plot_points)
+                self.graph.seriesconfigure(metric, data=numpy.column_stack([rows[:,0] - now, rows[:,1]]))
+
+        elif name != 'Off':
+            # the last data.plot_window seconds of the metric, against seconds ago
+            now  = time.time()
+            rows = self.parent.metrics.query(name, now - data.plot_window, now, data.plot_points)
+            self.graph.configure(data=numpy.column_stack([rows[:,0] - now, rows[:,1]]))
+
+        self.after(self.data.plot_every, self.plot)
+
+
+    def set_potential(self):
+
+        # called when an interaction is picked from the dropdown
+        name = self.potential_menu.get()
+
+        self.parent.set_potential(name if name in self.parent.potentials else None)
+
+
+    def toggle_force(self, name):
+
+        # switches a force on or off and sets the text on its button to match
+        enabled = self.parent.forces.toggle(name)
+
+        self.force_buttons[name]['text'] = 'On' if enabled else 'Off'
+
+
+if __name__ == '__main__':
+
+    # python balls.py --tk draws the balls with tkinter instead of pygame, which is also used if pygame isn't installed
+    Balls(renderer='tk' if pygame is None or '--tk' in sys.argv[1:] else 'pygame')
@@ -0,0 +1,612 @@
+# Oscar Saharoy 2019
+
+import numpy
+
+
+LEVELS = 16 # depth of the quadtree - positions are quantised to 2^16 steps across the root square
+
+
+def interleave(v, work):
+
+    # Spreads the bits of the 16 bit integers in V out in place so there is a zero between each of them - the
+    # Morton code of (x, y) is then x | y << 1. WORK is a buffer like V.
+
+    for shift, mask in ((8, 0x00ff00ff), (4, 0x0f0f0f0f), (2, 0x33333333), (1, 0x55555555)):
+        numpy.left_shift(v, shift, out=work)
+        numpy.bitwise_or(v, work, out=v)
+        numpy.bitwise_and(v, mask, out=v)
+
+
+class BarnesHut(object):
+
+    # Mutual gravitation between all balls, using their masses in data.mass, computed with a Barnes-Hut quadtree
+    # in O(n log n) rather than O(n^2) for every pair. Used as a force in the forces.Forces registry.
+    #
+    # The tree is rebuilt every step as a linear quadtree stored in flat arrays: the balls are sorted by Morton
+    # code, and the nodes at each level are the runs of balls sharing the top bits of their codes. Nodes holding
+    # no more than BUCKET balls are leaves and aren't divided further. For each node the arrays hold its total
+    # mass, centre of mass, side length, its run of the sorted balls and the range of its children, which are
+    # contiguous in the next level. The masses and centres of mass of all the nodes at a level come from running
+    # sums over the sorted balls.
+    #
+    # The tree is walked for a block of leaves at a time, on a frontier of (leaf, node) pairs, so the balls in a
+    # leaf share one walk. Each round, pairs where the node is far enough from every ball in the leaf (side /
+    # distance < theta) pull the leaf's balls towards the node's centre of mass, pairs where the node is a leaf
+    # too are summed directly ball by ball, and the rest are replaced by pairs with the node's children. A node
+    # which holds the leaf is never far, however far its centre of mass is from the leaf's balls.
+    #
+    # Like the rest of the step loop everything is worked out in the world's scratch buffers (see
+    # Balls.scratch), which only grow when there are more balls, nodes or pairs than before, so the force
+    # doesn't allocate once it has warmed up. Working on blocks of leaves keeps the frontier small enough to stay
+    # in cache. Even so numpy does the work one pass at a time over a frontier of ~150 pairs per leaf, and a step
+    # costs roughly 7-9ms per thousand balls at the default theta on one core - it keeps up with the frame rate
+    # up to about 3,000 balls, 20,000 balls take about 0.16s a step and 100,000 about 0.85s. The cost grows as
+    # n log n, so 100,000 balls at interactive rates would need compiled code rather than a better tree.
+
+    def __init__(self, G=1.0, theta=0.7, soft=None, bucket=8, block=1024):
+
+        self.G      = G      # gravitational constant, in pixels^3 per mass per frame^2
+        self.theta  = theta  # opening angle - smaller is more accurate and slower, 0 is direct summation
+        self.soft   = soft   # softening length, defaults to the ball radius
+        self.bucket = bucket # most balls in a leaf
+        self.block  = block  # leaves walked together
+        self.chunk  = 1 << 16 # most pairs of balls summed directly at once
+
+
+    def __call__(self, world, acc):
+
+        data = world.data
+        n    = len(acc)
+
+        if n < 2:
+            return
+
+        soft = self.soft if self.soft is not None else data.r
+
+        self.build(world, n)
+
+        for first in range(0, len(self.ls), self.block):
+            self.walk(world, first, min(first + self.block, len(self.ls)), soft)
+
+        self.spread(world, acc)
+
+
+    def build(self, world, n):
+
+        data    = world.data
+        pos     = data.pos[:n]
+        index   = world.indices(n)
+
+        # root square covering all the balls
+        lo      = pos.min(axis=0)
+        side    = float((pos.max(axis=0) - lo).max()) * (1 + 1e-9) or 1.0
+
+        # quantise positions onto the deepest level, and sort the balls by Morton code with their slots in the
+        # low bits of the keys
+        q       = world.scratch('bh_q',    n, (2,))
+        key     = world.scratch('bh_key',  n, (), numpy.uint64)
+        code    = world.scratch('bh_code', n, (), numpy.uint64)
+        work    = world.scratch('bh_work', n, (), numpy.uint64)
+
+        numpy.subtract(pos, lo, out=q)
+        numpy.multiply(q, (1 << LEVELS) / side, out=q)
+
+        numpy.copyto(key,  q[:,0], casting='unsafe')
+        numpy.copyto(code, q[:,1], casting='unsafe')
+        interleave(key,  work)
+        interleave(code, work)
+        numpy.left_shift(code, 1, out=code)
+        numpy.bitwise_or(key, code, out=key)
+        numpy.left_shift(key, 32, out=key)
+        numpy.copyto(work, index, casting='unsafe')
+        numpy.bitwise_or(key, work, out=key)
+
+        key.sort()
+
+        numpy.right_shift(key, 32, out=code)
+        numpy.bitwise_and(key, 0xffffffff, out=key)
+
+        self.order = order = world.scratch('bh_order', n, (), numpy.intp)
+        numpy.copyto(order, key, casting='unsafe')
+
+        self.x = x = world.scratch('bh_x', n)
+        self.y = y = world.scratch('bh_y', n)
+        self.m = m = world.scratch('bh_m', n)
+
+        # take copies a strided source, so the positions are taken whole and then split into columns
+        ranked  = world.scratch('bh_pos', n, (2,))
+
+        numpy.take(pos, order, axis=0, out=ranked, mode='clip')
+        numpy.copyto(x, ranked[:,0])
+        numpy.copyto(y, ranked[:,1])
+        numpy.take(data.mass, order, out=m, mode='clip')
+
+        # running sums of the masses and moments of the sorted balls, from which the nodes' are differences
+        sums    = [world.scratch('bh_sum' + name, n+1) for name in 'mxy']
+        moment  = world.scratch('bh_moment', n)
+
+        for total, weight in zip(sums, (None, x, y)):
+            total[0] = 0
+            if weight is None:
+                numpy.add.accumulate(m, out=total[1:])
+            else:
+                numpy.multiply(m, weight, out=moment)
+                numpy.add.accumulate(moment, out=total[1:])
+
+        crowd   = world.scratch('bh_crowd', n, (), bool)      # balls in nodes which are divided at the next level
+        divided = world.scratch('bh_divided', n, (), bool)
+        edge    = world.scratch('bh_edge',  n, (), bool)
+        other   = world.scratch('bh_other', n, (), bool)
+        owner   = world.scratch('bh_owner', n, (), numpy.intp) # node of each ball at the level
+        leaf    = world.scratch('bh_leaf',  n, (), numpy.intp) # leaf of each ball
+        run     = world.scratch('bh_run',   n, (), numpy.intp) # run of equal keys each ball is in
+
+        crowd.fill(True)
+        offset  = 0 # number of nodes at the levels above
+
+        for level in range(LEVELS+1):
+
+            # runs of equal keys at this level - the nodes are the runs among the balls which are being divided
+            numpy.right_shift(code, 2*(LEVELS-level), out=work)
+            edge[0] = True
+            numpy.not_equal(work[1:], work[:-1], out=edge[1:])
+            numpy.logical_not(edge, out=other)
+
+            k       = numpy.count_nonzero(edge)
+            bounds  = world.scratch('bh_bounds', k+1, (), numpy.intp)
+            counts  = world.scratch('bh_counts', k,   (), numpy.intp)
+
+            world.compact(edge, other, (index,), bounds)
+            bounds[k] = n
+            numpy.subtract(bounds[1:], bounds[:-1], out=counts)
+
+            numpy.copyto(run, edge)
+            numpy.add.accumulate(run, out=run)
+            numpy.subtract(run, 1, out=run)
+
+            keep    = world.scratch('bh_keep', k, (), bool)
+            drop    = world.scratch('bh_drop', k, (), bool)
+
+            numpy.take(crowd, bounds[:k], out=keep, mode='clip')
+            numpy.logical_not(keep, out=drop)
+
+            made    = numpy.count_nonzero(keep)
+            top     = offset + made
+
+            self.reserve(world, top + 1)
+
+            runs    = world.scratch('bh_runs', made+1, (), numpy.intp)
+            start, count, runs = world.compact(keep, drop, (bounds[:k], counts, world.indices(k)),
+                                               self.start[offset:top+1], self.count[offset:top+1], runs)
+
+            # masses and moments of the nodes
+            end     = world.scratch('bh_end',   made, (), numpy.intp)
+            below   = world.scratch('bh_below', made)
+
+            numpy.add(start, count, out=end)
+
+            for total, column in zip(sums, (self.mass, self.cx, self.cy)):
+                numpy.take(total, end,   out=column[offset:top], mode='clip')
+                numpy.take(total, start, out=below, mode='clip')
+                numpy.subtract(column[offset:top], below, out=column[offset:top])
+
+            self.size[offset:top]   = side / (1 << level)
+            self.nchild[offset:top] = 0
+            self.first[offset:top]  = numpy.iinfo(numpy.intp).max
+
+            nodes   = world.scratch('bh_nodes', made, (), numpy.intp)
+            numpy.add(world.indices(made), offset, out=nodes)
+
+            # each node is a child of the node its balls were in at the level above
+            if level:
+                parent = world.scratch('bh_parent', made, (), numpy.intp)
+                numpy.take(owner, start, out=parent, mode='clip')
+                numpy.add.at(self.nchild, parent, 1)
+                numpy.minimum.at(self.first, parent, nodes)
+
+            # the node of each ball, and whether it is divided again at the next level
+            table   = world.scratch('bh_table', k, (), numpy.intp)
+            split   = world.scratch('bh_split', k, (), bool)
+            big     = world.scratch('bh_big',   made, (), bool)
+
+            split.fill(False)
+            numpy.greater(count, self.bucket, out=big)
+
+            table.put(runs, nodes)
+            split.put(runs, big)
+
+            numpy.take(table, run, out=owner, mode='clip')
+            numpy.take(split, run, out=divided, mode='clip')
+
+            # balls in nodes which aren't divided are in leaves - at the deepest level they all are
+            if level == LEVELS:
+                divided.fill(False)
+
+            numpy.greater(crowd, divided, out=other)
+            numpy.copyto(leaf, owner, where=other)
+            numpy.copyto(crowd, divided)
+
+            offset  = top
+
+            if not crowd.any():
+                break
+
+        self.nodes = offset
+
+        numpy.divide(self.cx[:offset], self.mass[:offset], out=self.cx[:offset])
+        numpy.divide(self.cy[:offset], self.mass[:offset], out=self.cy[:offset])
+
+        # the leaves in order of their balls, with the centre and radius of a circle around each leaf's balls
+        edge[0] = True
+        numpy.not_equal(leaf[1:], leaf[:-1], out=edge[1:])
+        numpy.logical_not(edge, out=other)
+
+        k       = numpy.count_nonzero(edge)
+
+        self.leaves, self.ls = world.compact(edge, other, (leaf, index), world.scratch('bh_leaves', k+1, (), numpy.intp),
+                                                                          world.scratch('bh_ls',     k+1, (), numpy.intp))
+
+        self.which = world.scratch('bh_which', n, (), numpy.intp) # leaf of each sorted ball, by its place in the leaves
+        numpy.copyto(self.which, edge)
+        numpy.add.accumulate(self.which, out=self.which)
+        numpy.subtract(self.which, 1, out=self.which)
+
+        self.lc = world.scratch('bh_lc', k, (), numpy.intp)
+        numpy.take(self.count, self.leaves, out=self.lc, mode='clip')
+
+        x0, x1, y0, y1 = [world.scratch('bh_box' + name, k) for name in ('x0', 'x1', 'y0', 'y1')]
+
+        numpy.minimum.reduceat(x, self.ls, out=x0)
+        numpy.maximum.reduceat(x, self.ls, out=x1)
+        numpy.minimum.reduceat(y, self.ls, out=y0)
+        numpy.maximum.reduceat(y, self.ls, out=y1)
+
+        self.lx = world.scratch('bh_lx', k)
+        self.ly = world.scratch('bh_ly', k)
+        self.lr = world.scratch('bh_lr', k)
+
+        numpy.add(x0, x1, out=self.lx)
+        numpy.multiply(self.lx, 0.5, out=self.lx)
+        numpy.add(y0, y1, out=self.ly)
+        numpy.multiply(self.ly, 0.5, out=self.ly)
+
+        numpy.subtract(x1, x0, out=x0)
+        numpy.subtract(y1, y0, out=y0)
+        numpy.hypot(x0, y0, out=self.lr)
+        numpy.multiply(self.lr, 0.5, out=self.lr)
+
+        # far pull on each leaf's centre and its gradient xx, xy, yy, and the pull on each ball from nearby leaves
+        self.field = [world.scratch('bh_field%d' % i, k) for i in range(5)]
+        self.ax    = world.scratch('bh_ax', n)
+        self.ay    = world.scratch('bh_ay', n)
+
+        for array in self.field + [self.ax, self.ay]:
+            array.fill(0)
+
+
+    def reserve(self, world, length):
+
+        # Makes sure the node arrays hold at least LENGTH nodes, keeping the nodes already in them.
+
+        for name in ('mass', 'cx', 'cy', 'size'):
+            setattr(self, name, world.scratch('bh_node_' + name, length, keep=True))
+
+        for name in ('start', 'count', 'nchild', 'first'):
+            setattr(self, name, world.scratch('bh_node_' + name, length, (), numpy.intp, keep=True))
+
+
+    def walk(self, world, first, last, soft):
+
+        # Walks the tree for the leaves FIRST to LAST, adding their pulls to self.field and self.ax, self.ay.
+
+        k      = last - first
+
+        # each leaf starts paired with the root - the pairs are kept in two sets of buffers, and each round the
+        # pairs of the next are written from one set into the other
+        spares = [('bh_sinks0', 'bh_pairs0'), ('bh_sinks1', 'bh_pairs1')]
+
+        sinks  = world.scratch(spares[0][0], k, (), numpy.intp)
+        nodes  = world.scratch(spares[0][1], k, (), numpy.intp)
+
+        numpy.add(world.indices(k), first, out=sinks)
+        nodes.fill(0)
+
+        while k:
+
+            dx     = world.scratch('bh_dx',    k)
+            dy     = world.scratch('bh_dy',    k)
+            reach  = world.scratch('bh_reach', k)
+            size   = world.scratch('bh_size',  k)
+            start  = world.scratch('bh_start', k, (), numpy.intp)
+            end    = world.scratch('bh_stop',  k, (), numpy.intp)
+            child  = world.scratch('bh_child', k, (), numpy.intp)
+            ball   = world.scratch('bh_ball',  k, (), numpy.intp)
+            far    = world.scratch('bh_far',   k, (), bool)
+            near   = world.scratch('bh_near',  k, (), bool)
+            split  = world.scratch('bh_open',  k, (), bool)
+            work   = world.scratch('bh_test',  k, (), bool)
+
+            # distance from the node's centre of mass to the nearest ball of the leaf
+            numpy.take(self.cx, nodes, out=dx, mode='clip')
+            numpy.take(self.lx, sinks, out=reach, mode='clip')
+            numpy.subtract(dx, reach, out=dx)
+            numpy.take(self.cy, nodes, out=dy, mode='clip')
+            numpy.take(self.ly, sinks, out=reach, mode='clip')
+            numpy.subtract(dy, reach, out=dy)
+
+            numpy.hypot(dx, dy, out=reach)
+            numpy.take(self.lr, sinks, out=size, mode='clip')
+            numpy.subtract(reach, size, out=reach)
+
+            # nodes far enough away to treat as a point mass - a node holds the leaf if the leaf's first ball
+            # is in the node's run of balls
+            numpy.take(self.size, nodes, out=size, mode='clip')
+            numpy.multiply(reach, self.theta, out=reach)
+            numpy.less(size, reach, out=far)
+
+            numpy.take(self.start, nodes, out=start, mode='clip')
+            numpy.take(self.count, nodes, out=end, mode='clip')
+            numpy.add(end, start, out=end)
+            numpy.take(self.ls, sinks, out=ball, mode='clip')
+
+            numpy.less(ball, start, out=near)
+            numpy.greater_equal(ball, end, out=work)
+            numpy.logical_or(near, work, out=near)
+            numpy.logical_and(far, near, out=far)
+
+            # leaves which are too close are summed directly, and other nodes are opened up
+            numpy.take(self.nchild, nodes, out=child, mode='clip')
+            numpy.equal(child, 0, out=work)
+            numpy.greater(work, far, out=near)
+            numpy.logical_or(far, work, out=split)
+            numpy.logical_not(split, out=split)
+
+            self.pull(world, far, sinks, nodes, dx, dy, soft)
+            self.direct(world, near, sinks, nodes, soft)
+
+            # replace the opened pairs with one pair for each child of the node - up to 4 of them
+            numpy.logical_not(split, out=work)
+            m      = numpy.count_nonzero(split)
+
+            opened = self.pick(world, split, work, m, (sinks, nodes, child), ('bh_osinks', 'bh_onodes', 'bh_ochild'))
+
+            sinks4 = world.scratch('bh_sinks4', m, (4,), numpy.intp)
+            nodes4 = world.scratch('bh_nodes4', m, (4,), numpy.intp)
+            valid  = world.scratch('bh_valid',  m, (4,), bool)
+            empty  = world.scratch('bh_empty',  m, (4,), bool)
+            eldest = world.scratch('bh_eldest', m, (), numpy.intp)
+            quad   = world.indices(4)
+
+            numpy.copyto(sinks4, opened[0][:,None])
+            numpy.take(self.first, opened[1], out=eldest, mode='clip')
+            numpy.add(eldest[:,None], quad, out=nodes4)
+            numpy.less(quad, opened[2][:,None], out=valid)
+            numpy.logical_not(valid, out=empty)
+
+            spares = spares[::-1]
+            k      = numpy.count_nonzero(valid)
+
+            sinks, nodes = world.compact(valid.ravel(), empty.ravel(), (sinks4.ravel(), nodes4.ravel()),
+                                         world.scratch(spares[0][0], k+1, (), numpy.intp),
+                                         world.scratch(spares[0][1], k+1, (), numpy.intp))
+
+
+    def pick(self, world, keep, drop, m, arrays, names):
+
+        # Returns the entries of ARRAYS where KEEP is true, M of them, copied into the scratch buffers NAMES.
+
+        return world.compact(keep, drop, arrays, *[world.scratch(name, m+1, (), array.dtype) for name, array in zip(names, arrays)])
+
+
+    def pull(self, world, far, sinks, nodes, dx, dy, soft):
+
+        # Adds the pull of each far node, as a point mass at its centre of mass, to the paired leaf. Rather than
+        # summing it for every ball of the leaf, the pull and its gradient are found at the centre of the leaf
+        # and the pull on each ball is extrapolated from them once the walk is done - which is as accurate as
+        # treating the node as a point mass in the first place.
+
+        k  = numpy.count_nonzero(far)
+
+        if k == 0:
+            return
+
+        drop = world.scratch('bh_pdrop', len(far), (), bool)
+        numpy.logical_not(far, out=drop)
+
+        sinks, nodes, rx, ry = self.pick(world, far, drop, k, (sinks, nodes, dx, dy),
+                                         ('bh_psinks', 'bh_pnodes', 'bh_prx', 'bh_pry'))
+
+        q  = world.scratch('bh_pq', k)
+        f  = world.scratch('bh_pf', k)
+        g  = world.scratch('bh_pg', k)
+        t  = world.scratch('bh_pt', k)
+
+        numpy.multiply(rx, rx, out=q)
+        numpy.multiply(ry, ry, out=t)
+        numpy.add(q, t, out=q)
+        numpy.add(q, soft*soft, out=q)
+        numpy.reciprocal(q, out=q)
+
+        # pull is f * r and its gradient is g * r r - f * identity
+        numpy.sqrt(q, out=f)
+        numpy.multiply(f, q, out=f)
+        numpy.take(self.mass, nodes, out=t, mode='clip')
+        numpy.multiply(f, t, out=f)
+        numpy.multiply(f, self.G, out=f)
+
+        numpy.multiply(f, q, out=g)
+        numpy.multiply(g, 3, out=g)
+
+        numpy.multiply(f, rx, out=t)
+        numpy.add.at(self.field[0], sinks, t)
+        numpy.multiply(f, ry, out=t)
+        numpy.add.at(self.field[1], sinks, t)
+
+        numpy.multiply(g, rx, out=q)
+        numpy.multiply(q, rx, out=t)
+        numpy.subtract(t, f, out=t)
+        numpy.add.at(self.field[2], sinks, t)
+        numpy.multiply(q, ry, out=t)
+        numpy.add.at(self.field[3], sinks, t)
+        numpy.multiply(g, ry, out=q)
+        numpy.multiply(q, ry, out=t)
+        numpy.subtract(t, f, out=t)
+        numpy.add.at(self.field[4], sinks, t)
+
+
+    def direct(self, world, near, sinks, nodes, soft):
+
+        # Adds the pull of every ball in each near node to every ball of the paired leaf - a ball's pull on
+        # itself is zero as it is along a zero offset. The pairs of balls are laid out end to end and summed a
+        # chunk at a time.
+
+        k = numpy.count_nonzero(near)
+
+        if k == 0:
+            return
+
+        drop = world.scratch('bh_ddrop', len(near), (), bool)
+        numpy.logical_not(near, out=drop)
+
+        sinks, nodes = self.pick(world, near, drop, k, (sinks, nodes), ('bh_dsinks', 'bh_dnodes'))
+
+        first  = world.scratch('bh_dfirst', k, (), numpy.intp) # first ball of the leaf
+        start  = world.scratch('bh_dstart', k, (), numpy.intp) # first ball of the node
+        inner  = world.scratch('bh_dinner', k, (), numpy.intp) # balls in the node
+        size   = world.scratch('bh_dsize',  k, (), numpy.intp) # pairs of balls between the leaf and the node
+        ends   = world.scratch('bh_dends',  k, (), numpy.intp) # end of each pair's run of pairs of balls
+
+        numpy.take(self.ls,    sinks, out=first, mode='clip')
+        numpy.take(self.lc,    sinks, out=size, mode='clip')
+        numpy.take(self.start, nodes, out=start, mode='clip')
+        numpy.take(self.count, nodes, out=inner, mode='clip')
+
+        numpy.multiply(size, inner, out=size)
+        numpy.add.accumulate(size, out=ends)
+
+        done = 0
+
+        while done < k:
+
+            # as many pairs as fit in a chunk, and at least one
+            base = int(ends[done-1]) if done else 0
+            stop = max(int(numpy.searchsorted(ends, base + self.chunk, 'right')), done + 1)
+
+            self.sum(world, first[done:stop], start[done:stop], inner[done:stop], size[done:stop], ends[done:stop], base, soft)
+
+            done = stop
+
+
+    def sum(self, world, first, start, inner, size, ends, base, soft):
+
+        # Adds the pulls between the balls of the pairs of runs of balls starting at FIRST and START, the second
+        # INNER balls long. There are SIZE pairs of balls between each pair of runs, which end at ENDS counting
+        # from BASE.
+
+        t      = int(ends[-1]) - base
+        p      = len(ends)
+
+        which  = world.scratch('bh_swhich', t, (), numpy.intp)
+        place  = world.scratch('bh_splace', t, (), numpy.intp)
+        row    = world.scratch('bh_srow',   t, (), numpy.intp)
+        ball   = world.scratch('bh_sball',  t, (), numpy.intp)
+        other  = world.scratch('bh_sother', t, (), numpy.intp)
+
+        # the pair of runs each pair of balls comes from, found by marking where each run of pairs of balls
+        # starts and counting the marks
+        which.fill(0)
+        numpy.subtract(ends[:p-1], base, out=place[:p-1])
+        which.put(place[:p-1], 1)
+        numpy.add.accumulate(which, out=which)
+
+        # place of each pair of balls in its run - the runs are laid out with the balls of the node innermost
+        numpy.take(ends, which, out=place, mode='clip')
+        numpy.take(size, which, out=row, mode='clip')
+        numpy.subtract(place, row, out=place)
+        numpy.subtract(place, base, out=place)
+        numpy.subtract(world.indices(t), place, out=place)
+
+        numpy.take(inner, which, out=row, mode='clip')
+        numpy.floor_divide(place, row, out=ball)
+        numpy.multiply(ball, row, out=other)
+        numpy.subtract(place, other, out=other)
+
+        numpy.take(first, which, out=row, mode='clip')
+        numpy.add(ball, row, out=ball)
+        numpy.take(start, which, out=row, mode='clip')
+        numpy.add(other, row, out=other)
+
+        # softened inverse square pull of the balls OTHER on the balls BALL
+        dx     = world.scratch('bh_sdx', t)
+        dy     = world.scratch('bh_sdy', t)
+        q      = world.scratch('bh_sq',  t)
+        f      = world.scratch('bh_sf',  t)
+
+        numpy.take(self.x, other, out=dx, mode='clip')
+        numpy.take(self.x, ball,  out=q, mode='clip')
+        numpy.subtract(dx, q, out=dx)
+        numpy.take(self.y, other, out=dy, mode='clip')
+        numpy.take(self.y, ball,  out=q, mode='clip')
+        numpy.subtract(dy, q, out=dy)
+
+        numpy.multiply(dx, dx, out=q)
+        numpy.multiply(dy, dy, out=f)
+        numpy.add(q, f, out=q)
+        numpy.add(q, soft*soft, out=q)
+        numpy.reciprocal(q, out=q)
+
+        numpy.sqrt(q, out=f) # sqrt is much quicker than a power of -1.5
+        numpy.multiply(f, q, out=f)
+        numpy.take(self.m, other, out=q, mode='clip')
+        numpy.multiply(f, q, out=f)
+        numpy.multiply(f, self.G, out=f)
+
+        numpy.multiply(f, dx, out=dx)
+        numpy.add.at(self.ax, ball, dx)
+        numpy.multiply(f, dy, out=dy)
+        numpy.add.at(self.ay, ball, dy)
+
+
+    def spread(self, world, acc):
+
+        # Extrapolates the far pull from the centre of each leaf to its balls, and adds the pulls on the sorted
+        # balls to ACC in the order of the world's balls.
+
+        n     = len(self.x)
+        which = self.which
+
+        o     = world.scratch('bh_ox', n)
+        t     = world.scratch('bh_ot', n)
+        f     = world.scratch('bh_of', n)
+
+        for axis, (total, along, first, second) in enumerate(((self.ax, self.field[0], self.field[2], self.field[3]),
+                                                              (self.ay, self.field[1], self.field[3], self.field[4]))):
+
+            numpy.take(along, which, out=f, mode='clip')
+            numpy.add(total, f, out=total)
+
+            for gradient, pos, centre in ((first, self.x, self.lx), (second, self.y, self.ly)):
+                numpy.take(centre, which, out=o, mode='clip')
+                numpy.subtract(pos, o, out=o)
+                numpy.take(gradient, which, out=t, mode='clip')
+                numpy.multiply(t, o, out=t)
+                numpy.add(total, t, out=total)
+
+        # back into the order of the world's balls
+        inverse = world.scratch('bh_inverse', n, (), numpy.intp)
+        inverse.put(self.order, world.indices(n))
+
+        numpy.take(self.ax, inverse, out=f, mode='clip')
+        numpy.add(acc[:,0], f, out=acc[:,0])
+        numpy.take(self.ay, inverse, out=f, mode='clip')
+        numpy.add(acc[:,1], f, out=acc[:,1])
+
+
+def runs(counts):
+
+    # Returns 0, 1, ... counts[0]-1, 0, 1, ... counts[1]-1, ... - the position of each entry within its run when
+    # runs of the given lengths are laid end to end.
+
+    ends = numpy.cumsum(counts)
+
+    return numpy.arange(ends[-1] if len(ends) else 0) - numpy.repeat(ends - counts, counts)
@@ -0,0 +1,145 @@
+# Oscar Saharoy 2019
+
+import numpy
+
+
+class Stream(object):
+
+    # Growable struct-of-arrays buffer for the events of one kind in a step - one array for each field, with a
+    # row for each event. Events are appended in batches by record, which works on whole arrays with numpy
+    # writing into the buffers, so recording doesn't allocate once the buffers are big enough.
+    #
+    # When the step is done the fields can be read as attributes holding just that step's events, eg.
+    # collisions.impulse, and len gives the number of events.
+
+    def __init__(self, **fields):
+
+        self.fields  = fields # name -> dtype of each field
+        self.buffers = {}     # name -> buffer of each field, with a spare last entry for misses
+        self.n       = 0      # number of events recorded
+        self.cap     = 0      # number of events the buffers can hold
+
+        self.reserve(64)
+        self.publish()
+
+
+    def reserve(self, count):
+
+        # Makes sure the buffers can hold COUNT events, at least doubling their size if they need to grow.
+
+        if count <= self.cap:
+            return
+
+        cap = max(count, self.cap*2)
+
+        for name, dtype in self.fields.items():
+
+            buffer          = numpy.zeros(cap, dtype)
+            buffer[:self.n] = self.buffers[name][:self.n] if name in self.buffers else 0
+            self.buffers[name] = buffer
+
+        self.cap = cap
+
+
+    def clear(self):
+
+        self.n = 0
+
+
+    def record(self, world, mask, **values):
+
+        # Appends an event for each True entry of MASK, with its fields taken from the matching entries of
+        # VALUES, arrays the same length as MASK. A running count of the events gives each one its place and
+        # the rest are written to the spare last entry, as Grid._search compacts its pairs.
+
+        k     = len(mask)
+
+        if k == 0:
+            return
+
+        dest  = world.scratch('event_dest', k, (), numpy.intp)
+        miss  = world.scratch('event_miss', k, (), bool)
+
+        numpy.cumsum(mask, out=dest)
+        count = int(dest[-1])
+
+        self.reserve(self.n + count + 1)
+
+        numpy.add(dest, self.n - 1, out=dest)
+        numpy.logical_not(mask, out=miss)
+        numpy.copyto(dest, self.cap - 1, where=miss)
+
+        for name, value in values.items():
+            self.buffers[name][dest] = value
+
+        self.n += count
+
+
+    def publish(self):
+
+        # Sets the field attributes to views of the events recorded.
+
+        for name, buffer in self.buffers.items():
+            setattr(self, name, buffer[:self.n])
+
+
+    def __len__(self):
+
+        return self.n
+
+
+class Events(object):
+
+    # Collisions between balls and hits on the walls in the last step, for sound, statistics and so on.
+    #
+    # The step records events only while something is subscribed. Each subscriber is a function which is called
+    # once at the end of every step with this object, and reads whole arrays of that step's events:
+    #
+    #     collisions.id1, collisions.id2  ids of the two balls (see store.Store)
+    #     collisions.impulse              size of the impulse between them
+    #     collisions.x, collisions.y      point where they touch
+    #
+    #     hits.id                         id of the ball
+    #     hits.impulse                    size of the impulse from the wall
+    #     hits.x, hits.y                  point where it touches the wall
+    #
+    # A pair of balls in a crowd can be given an impulse in more than one of the passes of Balls.compute, and then
+    # has an event for each of them. The arrays are views of buffers which are reused by the next step, so
+    # subscribers should copy anything they want to keep.
+
+    def __init__(self):
+
+        self.collisions  = Stream(id1=int, id2=int, impulse=float, x=float, y=float)
+        self.hits        = Stream(id=int, impulse=float, x=float, y=float)
+
+        self.subscribers = []
+
+
+    def subscribe(self, callback):
+
+        self.subscribers.append(callback)
+
+
+    def unsubscribe(self, callback):
+
+        self.subscribers.remove(callback)
+
+
+    def clear(self):
+
+        self.collisions.clear()
+        self.hits.clear()
+
+
+    def publish(self):
+
+        # Hands the events of the step to the subscribers.
+
+        if not self.subscribers:
+            return
+
+        self.collisions.publish()
+        self.hits.publish()
+
+        for callback in self.subscribers:
+            callback(self)
@@ -0,0 +1,278 @@
+# Oscar Saharoy 2019
+
+# Offline export of the simulation - runs a headless Balls world as fast as possible, drawing each frame
+# offscreen and handing the pixels to a pool of worker processes which encode them, so the simulation
+# never waits on compression. Frames can be written as a PNG sequence, an animated GIF or a raw RGB
+# stream (to a file, a named pipe or stdout) which can be piped into eg. ffmpeg:
+#
+#     python export.py raw - --size 1920 1080 --frames 3600 | ffmpeg -f rawvideo -pix_fmt rgb24 -s 1920x1080 -r 60 -i - out.mp4
+
+import os
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')       # no window is ever opened so pygame needs no display
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1') # keeps stdout clean for raw frame streams
+
+import pygame, numpy, sys, struct, zlib, threading, queue, argparse, multiprocessing, balls
+
+
+def encode_png(pixels, w, h, level=6):
+
+    # adds filter type 0 (none) to the start of each row and deflates the image
+    rows      = numpy.frombuffer(pixels, numpy.uint8).reshape(h, w*3)
+    raw       = numpy.zeros([h, w*3+1], numpy.uint8)
+    raw[:,1:] = rows
+
+    def chunk(tag, body):
+
+        # a png chunk is its length, tag, body and the crc of tag and body
+        return struct.pack('>I', len(body)) + tag + body + struct.pack('>I', zlib.crc32(tag+body) & 0xffffffff)
+
+    header = struct.pack('>IIBBBBB', w, h, 8, 2, 0, 0, 0) # 8 bit truecolour, no interlacing
+
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(raw.tobytes(), level)) + chunk(b'IEND', b'')
+
+
+# gif frames use a fixed 6x7x6 colour cube so that every frame shares the global palette and no
+# per-frame quantisation pass is needed
+
+GIF_LEVELS  = numpy.array([6, 7, 6])
+GIF_PALETTE = bytes(int(round(c*255/(l-1))) for r in range(6) for g in range(7) for b in range(6)
+                                             for c, l in zip((r, g, b), GIF_LEVELS))
+
+
+def encode_gif(pixels, w, h, delay):
+
+    # quantise each pixel to the nearest colour in the cube and lzw compress the resulting indices
+    rgb     = numpy.frombuffer(pixels, numpy.uint8).reshape(-1, 3).astype(numpy.uint16)
+    levels  = (rgb * (GIF_LEVELS-1) + 127) // 255
+    indices = (levels[:,0]*42 + levels[:,1]*6 + levels[:,2]).astype(numpy.uint8)
+
+    # graphic control extension holding the frame delay in hundredths of a second, then image descriptor
+    control    = b'\x21\xf9\x04\x00' + struct.pack('<H', delay) + b'\x00\x00'
+    descriptor = b'\x2c' + struct.pack('<HHHHB', 0, 0, w, h, 0)
+
+    data   = lzw_encode(indices.tobytes())
+    blocks = b''.join(bytes([len(data[i:i+255])]) + data[i:i+255] for i in range(0, len(data), 255))
+
+    return control + descriptor + b'\x08' + blocks + b'\x00'
+
+
+def lzw_encode(indices, min_size=8):
+
+    # variable code width lzw as specified for gif - codes are packed least significant bit first and
+    # the table is cleared once it is full
+
+    clear, end = 1 << min_size, (1 << min_size) + 1
+
+    out        = bytearray()
+    size       = min_size + 1
+    table      = {}
+    nxt        = end + 1
+
+    acc, bits  = clear, size # bit accumulator starts holding the initial clear code
+    prefix     = indices[0]
+
+    for index in indices[1:]:
+
+        key  = prefix << 8 | index
+        code = table.get(key)
+
+        # extend the current string if it is already in the table
+        if code is not None:
+            prefix = code
+            continue
+
+        # otherwise output the code for the current string
+        acc  |= prefix << bits
+        bits += size
+
+        while bits >= 8:
+            out.append(acc & 255)
+            acc  >>= 8
+            bits  -= 8
+
+        # codes which no longer fit in the current width make the width grow
+        if nxt >= 1 << size and size < 12:
+            size += 1
+
+        # add the new string to the table, or clear the table when it is full
+        if nxt < 4095:
+            table[key] = nxt
+            nxt       += 1
+
+        else:
+            acc  |= clear << bits
+            bits += size
+            table, nxt, size = {}, end + 1, min_size + 1
+
+        prefix = index
+
+    # output the last string and the end code
+    for code in (prefix, end):
+
+        acc  |= code << bits
+        bits += size
+
+        if code == prefix and nxt >= 1 << size and size < 12:
+            size += 1
+
+    while bits > 0:
+        out.append(acc & 255)
+        acc  >>= 8
+        bits  -= 8
+
+    return bytes(out)
+
+
+class Exporter(object):
+
+    def __init__(self, world, kind, path, frames=600, every=1, workers=None, backlog=None):
+
+        self.world   = world
+        self.kind    = kind   # 'png', 'gif' or 'raw'
+        self.path    = path   # directory for png, file for gif and raw - '-' writes raw frames to stdout
+        self.frames  = frames # number of frames to export
+        self.every   = every  # simulation steps per exported frame
+
+        self.workers = workers or multiprocessing.cpu_count()
+
+        # the queue of frames waiting to be written is bounded so memory use stays fixed if the encoders
+        # fall behind - the simulation only ever waits once this backlog is full
+        self.queue   = queue.Queue(backlog or self.workers*4)
+
+        self.error   = None # exception which stopped the writer, raised again by run
+
+
+    def run(self):
+
+        data    = self.world.data
+        surface = pygame.Surface((data.x_res, data.y_res)) # offscreen surface frames are drawn on
+
+        pool    = multiprocessing.Pool(self.workers) if self.kind != 'raw' else None
+        writer  = threading.Thread(target=self.write, args=(data.x_res, data.y_res))
+        writer.start()
+
+        try:
+
+            for frame in range(self.frames):
+
+                # a writer which has failed takes no more frames, so there's no point making them
+                if self.error is not None:
+                    break
+
+                # run the simulation with no frame pacing
+                for _ in range(self.every):
+                    self.world.step()
+
+                self.world.draw(surface)
+                pixels = pygame.image.tostring(surface, 'RGB')
+
+                # raw frames need no encoding so skip the pool and go straight to the writer
+                if pool is None:
+                    self.queue.put(pixels)
+
+                elif self.kind == 'png':
+                    self.queue.put(pool.apply_async(encode_png, (pixels, data.x_res, data.y_res)))
+
+                else:
+                    delay = int(round(100.0 * self.every / data.fps))
+                    self.queue.put(pool.apply_async(encode_gif, (pixels, data.x_res, data.y_res, delay)))
+
+        finally:
+
+            # tell the writer there are no more frames and wait for the encoders to finish
+            self.queue.put(None)
+            writer.join()
+
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        if self.error is not None:
+            raise self.error
+
+
+    def write(self, w, h):
+
+        # runs in its own thread, taking encoded frames off the queue in order and writing them out. If encoding
+        # or writing a frame fails the error is kept for run to raise, and the rest of the queue is emptied so
+        # that run never waits on it.
+
+        self.taken = False # True once the end of the frames has been taken off the queue
+
+        try:
+            self.output(w, h)
+
+        except Exception as error:
+            self.error = error
+
+            while not self.taken:
+                self.taken = self.queue.get() is None
+
+
+    def output(self, w, h):
+
+        if self.kind == 'png':
+            os.makedirs(self.path, exist_ok=True)
+
+        elif self.path == '-':
+            out = sys.stdout.buffer
+
+        else:
+            out = open(self.path, 'wb')
+
+        if self.kind == 'gif':
+
+            # header, logical screen descriptor with the global colour table and a netscape extension to loop forever
+            out.write(b'GIF89a' + struct.pack('<HHBBB', w, h, 0xf7, 0, 0) + GIF_PALETTE.ljust(768, b'\x00'))
+            out.write(b'\x21\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00')
+
+        frame = 0
+
+        while True:
+
+            job = self.queue.get()
+
+            if job is None:
+                self.taken = True
+                break
+
+            encoded = job if self.kind == 'raw' else job.get()
+
+            if self.kind == 'png':
+
+                with open(os.path.join(self.path, 'frame%06d.png' % frame), 'wb') as f:
+                    f.write(encoded)
+
+            else:
+                out.write(encoded)
+
+            frame += 1
+
+        if self.kind == 'gif':
+            out.write(b'\x3b') # trailer
+
+        if self.kind != 'png':
+            out.flush()
+
+            if out is not sys.stdout.buffer:
+                out.close()
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Export the balls simulation offscreen.')
+
+    parser.add_argument('kind',      choices=['png', 'gif', 'raw'], help='output format')
+    parser.add_argument('path',      help='directory for png frames, or file for gif and raw output (- for stdout)')
+    parser.add_argument('--frames',  type=int, default=600, help='number of frames to export')
+    parser.add_argument('--every',   type=int, default=1,   help='simulation steps per exported frame')
+    parser.add_argument('--size',    type=int, nargs=2, metavar=('W', 'H'), help='resolution of the export')
+    parser.add_argument('--workers', type=int, help='number of encoding processes')
+    parser.add_argument('--backlog', type=int, help='maximum number of frames waiting to be encoded')
+
+    args  = parser.parse_args()
+
+    world = balls.Balls(headless=True, resolution=args.size)
+
+    Exporter(world, args.kind, args.path, args.frames, args.every, args.workers, args.backlog).run()
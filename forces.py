@@ -0,0 +1,176 @@
+# Oscar Saharoy 2019
+
+import numpy, math, random
+
+
+class Forces(object):
+
+    # Registry of the force fields acting on the balls.
+    #
+    # Each force is a callable kernel force(world, acc) which adds the acceleration it causes on the live balls
+    # to acc, an (n, 2) buffer shared by every force. The buffer is owned by the world and reused each step,
+    # and kernels update it in place with out= ufuncs, so adding forces costs a pass over the balls each but
+    # no allocation. The summed acceleration is then added to the velocities in one go.
+    #
+    # Forces can be switched on and off by name, eg. from the settings panel.
+
+    def __init__(self, world):
+
+        self.world  = world
+        self.fields = {} # name -> force, in the order they are applied
+
+
+    def register(self, name, force, enabled=True):
+
+        force.enabled     = enabled
+        self.fields[name] = force
+
+        return force
+
+
+    def toggle(self, name):
+
+        # Switches the force called NAME on or off and returns whether it is now on.
+
+        force         = self.fields[name]
+        force.enabled = not force.enabled
+
+        return force.enabled
+
+
+    def apply(self):
+
+        world = self.world
+        data  = world.data
+        n     = data.n
+
+        acc   = world.scratch('acc', n, (2,))
+        acc.fill(0)
+
+        for force in self.fields.values():
+            if force.enabled:
+                force(world, acc)
+
+        numpy.add(data.vel[:n], acc, out=data.vel[:n])
+
+
+def offsets(world, x, y, n):
+
+    # Fills the world's 'offset' buffer with the displacement from each ball to the point (x, y), given as
+    # fractions of the width and height of the window, and the 'dist' buffer with its length.
+
+    data   = world.data
+    offset = world.scratch('offset', n, (2,))
+    dist   = world.scratch('dist2', n)
+
+    numpy.subtract(x*data.x_res, data.pos[:n,0], out=offset[:,0])
+    numpy.subtract(y*data.y_res, data.pos[:n,1], out=offset[:,1])
+    numpy.hypot(offset[:,0], offset[:,1], out=dist)
+
+    return offset, dist
+
+
+class Gravity(object):
+
+    # Uniform field of strength data.g pointing down the screen.
+
+    def __call__(self, world, acc):
+
+        numpy.add(acc[:,1], world.data.g, out=acc[:,1])
+
+
+class Drag(object):
+
+    # Linear drag opposing each ball's velocity - COEFF is the fraction of velocity lost per frame.
+
+    def __init__(self, coeff=0.01):
+
+        self.coeff = coeff
+
+
+    def __call__(self, world, acc):
+
+        n   = len(acc)
+        tmp = world.scratch('offset', n, (2,))
+
+        numpy.multiply(world.data.vel[:n], self.coeff, out=tmp)
+        numpy.subtract(acc, tmp, out=acc)
+
+
+class Attractor(object):
+
+    # Point at (x, y), as fractions of the window size, pulling balls towards it with an inverse square law -
+    # a negative strength makes it a repulsor. SOFT is a distance in pixels which softens the force close
+    # to the point so balls passing through it aren't flung off.
+
+    def __init__(self, x=0.5, y=0.5, strength=50.0, soft=20.0):
+
+        self.x, self.y = x, y
+        self.strength  = strength
+        self.soft      = soft
+
+
+    def __call__(self, world, acc):
+
+        offset, dist = offsets(world, self.x, self.y, len(acc))
+
+        # strength / (d^2 + soft^2)^(3/2) times the offset gives strength / d^2 along the offset
+        numpy.multiply(dist, dist, out=dist)
+        numpy.add(dist, self.soft**2, out=dist)
+        numpy.power(dist, -1.5, out=dist)
+        numpy.multiply(dist, self.strength, out=dist)
+
+        numpy.multiply(offset, dist[:,None], out=offset)
+        numpy.add(acc, offset, out=acc)
+
+
+class Vortex(object):
+
+    # Swirl around the point (x, y), as fractions of the window size, falling off with distance from it.
+    # Positive strengths turn clockwise on screen.
+
+    def __init__(self, x=0.5, y=0.5, strength=0.5, soft=20.0):
+
+        self.x, self.y = x, y
+        self.strength  = strength
+        self.soft      = soft
+
+
+    def __call__(self, world, acc):
+
+        offset, dist = offsets(world, self.x, self.y, len(acc))
+
+        # strength / (d^2 + soft^2) times the offset turned a quarter turn - the swirl falls off as 1/d
+        numpy.multiply(dist, dist, out=dist)
+        numpy.add(dist, self.soft**2, out=dist)
+        numpy.divide(self.strength*self.soft, dist, out=dist)
+
+        numpy.multiply(offset, dist[:,None], out=offset)
+        numpy.add(acc[:,0], offset[:,1], out=acc[:,0])
+        numpy.subtract(acc[:,1], offset[:,0], out=acc[:,1])
+
+
+class Wind(object):
+
+    # Horizontal wind which swings back and forth with a period of PERIOD frames, plus gusts which wander
+    # randomly - GUSTINESS is how far the gusts can move the wind each frame.
+
+    def __init__(self, strength=0.01, period=600, gustiness=0.001):
+
+        self.strength  = strength
+        self.period    = period
+        self.gustiness = gustiness
+        self.gust      = 0.0
+        self.t         = 0
+
+
+    def __call__(self, world, acc):
+
+        self.t    += 1
+
+        # gusts random walk but are pulled back towards zero so they stay around the strength of the wind
+        self.gust += random.uniform(-self.gustiness, self.gustiness) - self.gust*0.01
+
+        wind       = self.strength * math.sin(2*math.pi * self.t / self.period) + self.gust
+
+        numpy.add(acc[:,0], wind, out=acc[:,0])
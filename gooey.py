@@ -6,6 +6,12 @@
 
 import tkinter, time, random, math, sys
 
+# numpy is only needed by Graph, so the other widgets can be used without it.
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from tkinter.font import Font
 from tkinter import Message, Checkbutton, LabelFrame, Label, Toplevel, OptionMenu
 
@@ -22,6 +28,12 @@ class ReConfig(object):
 
         self.gooey_kw = {}
 
+        # Cache of the values of the widget's Tk options, filled in by cget and cleared whenever the widget is
+        # configured, so reading an option the widget already knows doesn't cross into Tcl. Options changed outside
+        # of configure, eg. by tk_setPalette or the option database after the widget is made, aren't seen.
+
+        self._option_cache = {}
+
         # Establishes bindings to change the value associated with KW when the mouse hovers
         # over the widget. This allows gooey widgets like buttons to be
         # highlighted on mouseover.
@@ -53,8 +65,10 @@ class ReConfig(object):
                 self.gooey_kw[key] = cnf.pop(key)
 
         # If cnf has any values left, call widget's _configure method with them.
+        # The whole option cache is cleared as Tk options have aliases, eg. bg and background.
 
         if cnf:
+            self._option_cache.clear()
             return self._configure('configure', cnf, {})
 
     config = configure # makes widget.config() equivalent to widget.configure() 
@@ -67,9 +81,13 @@ class ReConfig(object):
         if key in self.gooey_kw:
             return self.gooey_kw[key]
 
-        # Otherwise get value using tk.call method as usual.
+        # Otherwise get value using tk.call method as usual, the first time it is asked for since the widget was configured.
+        elif key in self._option_cache:
+            return self._option_cache[key]
+
         else:
-            return self.tk.call(self._w, 'cget', '-' + key)
+            value = self._option_cache[key] = self.tk.call(self._w, 'cget', '-' + key)
+            return value
 
     __getitem__ = cget # makes widget[key] equivalent to widget.cget(key)
 
@@ -99,6 +117,84 @@ class ReConfig(object):
         self._default_value = None
 
 
+class Scheduler(object):
+    # Coalesces the redraws of gooey widgets, so that a burst of events or new data is drawn once rather than once per event.
+    # A widget asks to be redrawn with request, and the redraws asked for are done together the next time Tk is idle,
+    # once for each widget however many times it asked. A widget can also be given a frame-rate cap, in which case
+    # its redraws are put off until 1/fps seconds after its last one. Widgets share the scheduler gooey.scheduler.
+
+    def __init__(self):
+
+        self._dirty  = {}    # widget -> redraw function, for each widget waiting to be redrawn
+        self._idle   = False # True when self._flush is waiting for Tk to be idle
+        self._timers = {}    # widget -> after id, for each capped widget waiting for its next frame
+        self._last   = {}    # widget -> time of its last redraw
+
+
+    def request(self, widget, redraw, fps=None):
+
+        # Asks for WIDGET to be redrawn by calling REDRAW, no more than FPS times a second if FPS is given.
+        # A widget which asks again before it has been redrawn is still only redrawn once, by its latest REDRAW.
+
+        self._dirty[widget] = redraw
+
+        if widget in self._timers:
+            return
+
+        wait = self._last.get(widget,0) + 1.0/fps - time.time() if fps else 0
+
+        if wait > 0:
+            self._timers[widget] = widget.after(int(wait*1000)+1, lambda: self._frame(widget))
+
+        # The idle callback is registered on the root window so that it runs even if WIDGET is destroyed first.
+        elif not self._idle:
+            self._idle = True
+            widget._root().after_idle(self._flush)
+
+
+    def cancel(self, widget):
+
+        # Forgets any redraw WIDGET has asked for, eg. when it is destroyed.
+
+        self._dirty.pop(widget, None)
+        self._last.pop(widget, None)
+
+        if widget in self._timers:
+            widget.after_cancel(self._timers.pop(widget))
+
+
+    def _flush(self):
+
+        # Redraws every widget waiting for Tk to be idle - capped widgets waiting for their next frame are left for self._frame.
+
+        self._idle = False
+        waiting    = [(widget, redraw) for widget, redraw in self._dirty.items() if widget not in self._timers]
+
+        for widget, redraw in waiting:
+            del self._dirty[widget]
+            self._redraw(widget, redraw)
+
+
+    def _frame(self, widget):
+
+        # Redraws a capped WIDGET when its next frame is due, if it has asked to be redrawn since its last one.
+
+        del self._timers[widget]
+
+        if widget in self._dirty:
+            self._redraw(widget, self._dirty.pop(widget))
+
+
+    def _redraw(self, widget, redraw):
+
+        if widget.winfo_exists():
+            self._last[widget] = time.time()
+            redraw()
+
+
+scheduler = Scheduler()
+
+
 '''
 
 Color Scheme Hexcodes
@@ -188,8 +284,9 @@ class Entry(ReConfig,tkinter.Entry):
     # Also has Entry.flash method which flashes the highlight border a certain colour.
     # 'allowed' keyword enabled filtering: if a string is passed through this keyword
     # then only characters in the string can be input to the entry.
+    # 'command' keyword is called with the new text when the text changes, once for a burst of keypresses.
 
-    def __init__(self, parent, allowed=None, hovercolor='grey80', bd=0,
+    def __init__(self, parent, allowed=None, hovercolor='grey80', command=None, bd=0,
                  bg='white', highlightthickness=4, highlightbackground='grey90',
                  highlightcolor='turquoise3', **kwargs):
         
@@ -202,7 +299,9 @@ class Entry(ReConfig,tkinter.Entry):
 
         ReConfig.__init__(self,kw='highlightbackground')
         
-        self.gooey_kw = {'allowed':allowed, 'hovercolor':hovercolor}
+        self.gooey_kw = {'allowed':allowed, 'hovercolor':hovercolor, 'command':command}
+
+        self._reported = '' # text last passed to the command
 
         # Adding the widget to _focusey_widgets as it should gain focus when clicked.
         self.winfo_toplevel()._focusey_widgets += [self]
@@ -227,10 +326,25 @@ class Entry(ReConfig,tkinter.Entry):
                     self.bell()
                     return False
 
+        # The text hasn't changed yet, so the command is called once Tk is idle - by then it has.
+        if self.gooey_kw['command'] is not None:
+            scheduler.request(self, self._changed)
+
         # In normal cases, return True to allow the character to be added
         return True
 
 
+    def _changed(self):
+
+        # Calls the command with the text, if it is different from the text it was last called with.
+
+        text = self.get()
+
+        if text != self._reported:
+            self._reported = text
+            self.gooey_kw['command'](text)
+
+
     def flash(self,color=None):
 
         # Causes highlight of widget to flash rapidly.
@@ -401,6 +515,72 @@ class CanvasText(CanvasLine):
         return int.__new__(cls, num)
 
 
+class CanvasItems(object):
+
+    # A group of canvas items of one kind, made together by Canvas.create_items. Where CanvasLine and the others cost
+    # a Tcl call and a Python object for each item, a CanvasItems moves, configures or deletes all of its items in one
+    # Tcl evaluation, from arrays with a row for each item. For example:
+    #
+    #     dots = canvas.create_items('oval', boxes, fill=colours, outline='black')
+    #     dots.coords = new_boxes
+    #
+    # where boxes and new_boxes are (n,4) arrays or lists of n rows, and colours is a list of n colours.
+    # Options are given as for Canvas.create_items.
+
+    def __init__(self, parent, kind, ids):
+
+        self._parent = parent
+        self.kind    = kind
+        self.ids     = ids # canvas ids of the items, in the order of the rows they were made from
+
+    def __len__(self):
+
+        return len(self.ids)
+
+    def __iter__(self):
+
+        return iter(self.ids)
+
+    @property
+    def coords(self):
+
+        # example use: rows = items.coords
+
+        rows = self._parent._batch('lmap i $ids {%s coords $i}', self.ids)
+
+        return [[float(c) for c in self._parent.tk.splitlist(row)] for row in rows]
+
+    @coords.setter
+    def coords(self, coords):
+
+        # example use: items.coords = rows
+
+        self._parent._batch('foreach i $ids c $rows {%s coords $i {*}$c}', self.ids, coords)
+
+    def itemconfigure(self, cnf=None, **kw):
+
+        # example use: items.itemconfig(fill=colours, width=2)
+
+        self._parent._batch('foreach i $ids o $options {%s itemconfigure $i {*}$shared {*}$o}', self.ids, (), tkinter._cnfmerge((cnf,kw)))
+
+    itemconfig = itemconfigure
+
+    def move(self, dx, dy):
+
+        # example use: items.move(dx,dy)
+
+        self._parent._batch('foreach i $ids {%%s move $i %s %s}' % (float(dx), float(dy)), self.ids)
+
+    def delete(self):
+
+        # example use: items.delete()
+
+        if self.ids:
+            self._parent.delete(*self.ids)
+
+        self.ids = []
+
+
 class Canvas(ReConfig,tkinter.Canvas):
 
     # The Canvas now has a grey highlight border, and a state keyword to dictate
@@ -417,6 +597,153 @@ class Canvas(ReConfig,tkinter.Canvas):
 
         self.gooey_kw = {'state':state,'hovercolor':hovercolor}
 
+        # Cache of the coords of each item by id, kept up to date as items are moved so that reading the coords of an
+        # item doesn't cross into Tcl. Changes to items by tag could apply to any number of items, so they clear it.
+        self._coords = {}
+
+        # Ids of rectangles, ovals and arcs, whose corners Tk puts in order when their coords are set.
+        self._boxes  = set()
+
+
+    def create_items(self, kind, coords, **options):
+
+        # Makes an item of KIND, eg. 'oval', for each row of COORDS in one Tcl evaluation and returns them as a
+        # CanvasItems. COORDS can be an (n,k) array or a list of n rows. Each option is either one value for all
+        # the items, or a list or array with a value for each item - so options whose value is itself a list of
+        # values, such as dash, should be given as tuples.
+
+        ids = self._batch('set made {}; foreach c $rows o $options {lappend made [%%s create %s {*}$c {*}$shared {*}$o]}; set made' % kind,
+                          (), coords, options)
+
+        ids = [int(item) for item in ids]
+
+        if kind in ('rectangle', 'oval', 'arc'):
+            self._boxes.update(ids)
+
+        return CanvasItems(self, kind, ids)
+
+
+    def _batch(self, script, ids, rows=(), options={}):
+
+        # Runs SCRIPT, with %s standing for the Canvas, in one Tcl evaluation with the variables ids, rows, shared and
+        # options set to the canvas ids IDS, the ROWS of an array, the options with a value for all the items and the
+        # options with a value for each item. Returns the elements of the list SCRIPT results in.
+
+        rows = rows.tolist() if hasattr(rows, 'tolist') else rows
+        rows = tuple(tkinter._flatten(row) for row in rows)
+
+        # Options with a list or array value have a value for each item, the rest are shared by all of them.
+        shared, each = (), []
+
+        for key, value in options.items():
+            value = value.tolist() if hasattr(value, 'tolist') else value
+
+            if isinstance(value, list):
+                each.append([('-'+key, item) for item in value])
+            else:
+                shared += '-'+key, value
+
+        # Only the option and value pairs are flattened, so a value which is itself a list, eg. a dash pattern
+        # or tags, goes to Tcl as one list.
+        each = tuple(sum(item, ()) for item in zip(*each))
+
+        # The items could have been moved, so they are dropped from the coords cache to be read from Tk again.
+        for item in ids:
+            self._coords.pop(item, None)
+
+        result = self.tk.call('apply', ('ids rows shared options', script % self._w), tuple(ids), rows, shared, each)
+
+        return self.tk.splitlist(result)
+
+
+    def _create(self, itemType, args, kw):
+
+        item = tkinter.Canvas._create(self, itemType, args, kw)
+
+        if itemType in ('rectangle', 'oval', 'arc'):
+            self._boxes.add(item)
+
+        return item
+
+
+    def coords(self, *args):
+
+        # Returns the coords of an item from the cache, or sets them in Tk and the cache.
+
+        item, co = args[0], tkinter._flatten(args[1:])
+
+        if not isinstance(item, int):
+            if co:
+                self._coords.clear()
+            return tkinter.Canvas.coords(self, *args)
+
+        if not co:
+            if item not in self._coords:
+                self._coords[item] = tkinter.Canvas.coords(self, item)
+            return list(self._coords[item])
+
+        tkinter.Canvas.coords(self, item, *co)
+
+        # Coords in screen units such as '2c' are left for Tk to convert the next time they are read.
+        try:
+            co = [float(c) for c in co]
+        except ValueError:
+            self._coords.pop(item, None)
+            return
+
+        if item in self._boxes and len(co) == 4:
+            co = [min(co[0], co[2]), min(co[1], co[3]), max(co[0], co[2]), max(co[1], co[3])]
+
+        self._coords[item] = co
+
+
+    def move(self, *args):
+
+        # Moves items in Tk, moving the cached coords of an item along with it.
+
+        tkinter.Canvas.move(self, *args)
+
+        item, dx, dy = args
+
+        if not isinstance(item, int):
+            self._coords.clear()
+            return
+
+        co = self._coords.get(item)
+
+        if co is None:
+            return
+
+        try:
+            co[0::2] = [x + float(dx) for x in co[0::2]]
+            co[1::2] = [y + float(dy) for y in co[1::2]]
+        except ValueError:
+            self._coords.pop(item)
+
+
+    def scale(self, *args):
+
+        tkinter.Canvas.scale(self, *args)
+        self._coords.clear()
+
+
+    def moveto(self, *args):
+
+        tkinter.Canvas.moveto(self, *args)
+        self._coords.clear()
+
+
+    def delete(self, *args):
+
+        tkinter.Canvas.delete(self, *args)
+
+        for item in args:
+            if isinstance(item, int):
+                self._coords.pop(item, None)
+                self._boxes.discard(item)
+            else:
+                self._coords.clear()
+
 
 class EdgeButton(ReConfig,tkinter.Frame):
 
@@ -932,9 +1259,12 @@ class Scale(Canvas):
     # Rebuilt scale widget is a canvas with a square which can be dragged across it.
     # Some functionality, such as vertical orientation and a built-in label, is lost from the original.
     # However, the look of the widget is modernised.
+    # 'command' keyword is called with the new value when the knob is dragged to a different value - a drag
+    # fires many motion events, but the command is only called once each time Tk is idle. Scale.set doesn't call it.
 
     def __init__(self, parent, height=40, length=200, from_=0, to=100, highlightthickness=0,
-                 hovercolor='grey70', fg='grey80', bg='grey50', fill='white', value_type='float', **kwargs):
+                 hovercolor='grey70', fg='grey80', bg='grey50', fill='white', value_type='float',
+                 command=None, **kwargs):
 
         Canvas.__init__(self, parent, height=height, width=length, highlightthickness=highlightthickness)
 
@@ -947,9 +1277,10 @@ class Scale(Canvas):
 
 
         self.gooey_kw = {**self.gooey_kw, 'hovercolor':hovercolor, 'fg':fg, 'bg':bg, 'fill':fill,
-                                          'from':from_, 'to':to, 'value_type':value_type}
+                                          'from':from_, 'to':to, 'value_type':value_type, 'command':command}
 
         self.value    = from_
+        self._reported = from_ # value last passed to the command
 
         self.on_knob  = False
 
@@ -1034,6 +1365,20 @@ class Scale(Canvas):
             elif pos > self.w-self.r-self.s:
                 self.knob.coords = (self.w-self.d-self.s, knob[1], self.w-self.s, knob[3])
 
+            if self['command'] is not None:
+                scheduler.request(self, self._changed)
+
+
+    def _changed(self):
+
+        # Calls the command with the value of the scale, if it is different from the value it was last called with.
+
+        value = self.get()
+
+        if value != self._reported:
+            self._reported = value
+            self['command'](value)
+
 
     def get(self):
 
@@ -1088,7 +1433,8 @@ class Scale(Canvas):
             raise ValueError('value must be inside scale range')
 
 
-        self.value = value
+        self.value     = value
+        self._reported = int(value) if self['value_type'] == 'int' else value
 
         from_ = self['from']
         to    = self['to']
@@ -1119,26 +1465,164 @@ class Scale(Canvas):
         return ReConfig.configure(self, cnf)
 
 
-class Graph(Canvas): # TODO
+class Series(object):
+
+    ''' One dataset plotted on a gooey.Graph, with its own colour and its own spline. The points are kept as numpy arrays sorted by x,
+        with spare rows so that points can be added to the end in amortised O(1) time, along with a min/max pyramid for downsampling.
+        The Graph only works out the Canvas coords of a series again when it is dirty or the view has changed since it was drawn.'''
+
+    def __init__(self,name,data=[],colour='#bbffff',outline=None,spline=True):
+        self.name    = name
+        self.colour  = colour            # colour of the line through the points
+        self.outline = outline or colour # colour of the boxes on the points
+        self.spline  = spline            # True for a Bezier spline through the points, False for straight lines between them
+        self.view    = None              # the Graph's view when the series was last drawn - see Graph._view
+        self.set(data)
+
+    @property
+    def points(self):
+        # The points of the series as an (n,2) array, sorted by x.
+        return self._data[:self.length]
+
+    def set(self,data):
+        # Replaces the points of the series with the points in DATA, sorted by x so the points in view can be found by binary search.
+        data = numpy.asarray(data,dtype=float).reshape(-1,2)
+
+        if len(data) > 1 and (data[1:,0] < data[:-1,0]).any():
+            data = data[numpy.argsort(data[:,0],kind='stable')]
+
+        # self._data holds the points with spare rows for extend, of which the first self.length are used.
+        self._data  = numpy.zeros([0,2])
+        self.length = 0
+        self.x      = self.y = self._data[:0,0]
+
+        # self.levels is the min/max pyramid. Row i of level k holds the indices of the lowest and highest points out of
+        # points i*2**(k+1) to (i+1)*2**(k+1), and the last row of each level can cover fewer points. See self._append.
+        self.levels = []
+        self.dirty  = True
+        self._append(data)
+
+    def extend(self,data):
+        # Adds the points in DATA to the end of the series. Points which carry on along the x axis from the existing
+        # points only extend the pyramid, otherwise all the points are sorted again and the pyramid is rebuilt.
+        points = numpy.asarray(data,dtype=float).reshape(-1,2)
+        x      = points[:,0]
+
+        if (self.length and len(x) and x.min() < self.x[-1]) or (x[1:] < x[:-1]).any():
+            self.set(numpy.concatenate([self.points,points]))
+        else:
+            self._append(points)
+            self.dirty = True
+
+    def _append(self,points):
+        # Adds POINTS, which carry on along the x axis from the existing data, to self._data and the pyramid. Only the rows of the
+        # pyramid from the one the old last point was in onwards are worked out again, so appends cost O(len(POINTS)) amortised.
+        old = self.length
+        new = old+len(points)
+
+        if new == old:
+            return
+
+        self._data          = self._reserve(self._data,new)
+        self._data[old:new] = points
+        self.length         = new
+        self.x,self.y       = self._data[:new,0],self._data[:new,1]
+
+        # Each level is worked out from the one below, pairing up its rows - level 0 pairs up the points themselves.
+        y,k,below = self.y,0,new
+        while below > 1:
+            first = old >> (k+1)
+            rows  = (below+1)//2
+
+            if k == 0:
+                child = numpy.arange(2*first,new).repeat(2).reshape(-1,2)
+            else:
+                child = self.levels[k-1][2*first:below]
+
+            # An odd row out at the end is paired with itself.
+            if len(child)%2:
+                child = numpy.concatenate([child,child[-1:]])
+
+            a,b  = child[0::2],child[1::2]
+            low  = numpy.where(y[b[:,0]] < y[a[:,0]],b[:,0],a[:,0])
+            high = numpy.where(y[b[:,1]] > y[a[:,1]],b[:,1],a[:,1])
+
+            if k == len(self.levels):
+                self.levels.append(numpy.zeros([0,2],int))
+
+            level = self.levels[k] = self._reserve(self.levels[k],rows)
+            level[first:rows,0] = low
+            level[first:rows,1] = high
+
+            below,k = rows,k+1
+
+    def _reserve(self,array,length):
+        # Returns ARRAY if it has at least LENGTH rows, otherwise a copy of it with at least twice as many rows.
+        if len(array) >= length:
+            return array
+
+        grown = numpy.zeros((max(length,2*len(array)),)+array.shape[1:],array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def level(self,count,width):
+        # Returns the lowest level of the pyramid which draws no more than 2 points per pixel of WIDTH for COUNT points in view.
+        # Level 0 is the points themselves, and level k above it draws the lowest and highest point of each of its rows.
+        k = 0
+        while k < len(self.levels) and (count if k == 0 else 2*((count-1 >> k)+1)) > 2*width:
+            k += 1
+        return k
+
+    def samples(self,k,first,last):
+        # Returns the indices of the points drawn for rows FIRST to LAST of level K, in order along the x axis.
+        if k == 0:
+            return numpy.arange(first,last)
+
+        # The lowest and highest point of each row in the order they come, once if they are the same point.
+        pair = numpy.sort(self.levels[k-1][first:last],axis=1).ravel()
+        keep = numpy.ones(len(pair),bool)
+        keep[1:] = pair[1:] != pair[:-1]
+        return pair[keep]
+
+
+class Graph(Canvas):
 
     ''' A graphing tool which allows data to be plotted on various scales, including a different scale on the x and y axes.
         Panning, zooming and centering of the graph is handled by internal methods, and data can be added and removed dynamically.
         A Bezier curve spline can be created to pass through all points on the graph smoothly.
-        TODO - support multiple datasets being plotted at once in different colours and with independant spline curves.'''
+        Data can be a list of (x,y) pairs or an (n,2) numpy array, and is kept as numpy arrays sorted by x so that only the points
+        in view need to be transformed and drawn. When there are more points in view than the Graph has pixels across, the lowest
+        and highest point of each pixel column are drawn instead, taken from a min/max pyramid which Graph.extend adds to as data arrives.
+        Several datasets can be plotted at once on the same axes as gooey.Series, each in its own colour and with its own spline.'''
 
-    def __init__(self,parent,labelx=None,labely=None,dragable=True,span='all',title=None,data=[],**kwargs):
+    def __init__(self,parent,labelx=None,labely=None,dragable=True,span='all',title=None,data=[],fps=None,**kwargs):
 
         # gooey.Graph inherits from gooey.Canvas follows its style. Gooey's CanvasLine, CanvasRectangle and CanvasText classes can also be used with it.
+        if numpy is None:
+            raise GooeyException('gooey.Graph needs numpy')
+
         Canvas.__init__(self,parent,**kwargs)
         self.parent  = parent
         self._inside = False
 
+        # Canvas items drawn by the Graph, by tag. They are kept between redraws and moved rather than deleted and
+        # created again, so a redraw only creates or deletes items when the number needed changes. See self._pool.
+        self._pools  = {}
+        self._shown  = {} # options last given to each pooled item, so unchanged ones aren't sent to Tk again
+
         self.gooey_kw['labelx']    = labelx
         self.gooey_kw['labely']    = labely
         self.gooey_kw['dragable']  = dragable
         self.gooey_kw['span']      = span
         self.gooey_kw['title']     = title
         self.gooey_kw['data']      = data
+        self.gooey_kw['fps']       = fps # most redraws a second, or None for no limit - see gooey.Scheduler
+
+        # True when the view has changed since the Graph was last drawn, rather than just the series. See self._update.
+        self._moved  = True
+
+        # The series plotted on the Graph by name, in the order they are drawn. The Graph's own data is the series called None.
+        self._series = {None: Series(None,data,outline='turquoise3')}
 
         self.bind('<Button-1>',       self._startpan)
         self.bind('<B1-Motion>',      self._pan)
@@ -1179,6 +1663,10 @@ class Graph(Canvas): # TODO
         self._y_axis          = CanvasLine(self, sq,sq,sq,self.h-sq+1,   width=3,fill='grey40',tag='fixed_axis')
         self._x_axis          = CanvasLine(self, sq-1,h-sq,w-sq,h-sq,    width=3,fill='grey40',tag='fixed_axis')
 
+        # Fonts of the title and units, made once as each Font is a Tcl command.
+        self._title_font      = Font(family='Segoe UI', size=14)
+        self._unit_font       = Font(family='Segoe UI', size=10)
+
         self._update_title()
         self._update()
 
@@ -1212,6 +1700,69 @@ class Graph(Canvas): # TODO
         
         return [self.graphx(point[0]), self.graphy(point[1])]
 
+    def add_series(self,name,data=[],colour='#bbffff',outline=None,spline=True):
+        # Adds a series of points called NAME, plotted on the same axes as the Graph's other series, and returns it.
+        # The Graph's own data is the series called None.
+        if name in self._series:
+            raise GooeyException('Graph already has a series called '+str(name))
+
+        series = self._series[name] = Series(name,data,colour,outline,spline)
+        self._update()
+        return series
+
+    def remove_series(self,name):
+        # Removes the series called NAME and its items from the Graph.
+        self._clearseries(self._series.pop(name))
+        self._update()
+
+    def seriesconfigure(self,name,cnf=None,**kw):
+        # Changes the data, colour, outline or spline options of the series called NAME, in the style of Canvas.itemconfigure.
+        cnf    = tkinter._cnfmerge((cnf,kw))
+        series = self._series[name]
+
+        for key in cnf:
+            if key not in ('data','colour','outline','spline'):
+                raise GooeyException('Unknown series option '+str(key))
+
+        if 'data' in cnf:
+            series.set(cnf['data'])
+        if name is None and 'data' in cnf:
+            self.gooey_kw['data'] = cnf['data']
+
+        # Items in the old colours are deleted so that they are made again in the new ones.
+        if 'colour' in cnf or 'outline' in cnf:
+            series.colour  = cnf.get('colour',series.colour)
+            series.outline = cnf.get('outline',series.outline)
+            self._clearseries(series)
+
+        if 'spline' in cnf:
+            series.spline = cnf['spline']
+            series.dirty  = True
+
+        self._update()
+
+    def extend(self,data,series=None):
+        # Adds the points in DATA to the end of the series called SERIES, by default the Graph's own data. When the
+        # Graph doesn't have to be centered again only that series is redrawn.
+        s = self._series[series]
+        s.extend(data)
+
+        if series is None:
+            self.gooey_kw['data'] = s.points
+
+        self._update(moved=False)
+
+    def _clearseries(self,series):
+        # Deletes the items of SERIES so that it is drawn from scratch next time.
+        for tag in ('point','spline','line'):
+            self._pool((series.name,tag),0,None)
+            del self._pools[(series.name,tag)]
+        series.view = None
+
+    def _view(self):
+        # Returns everything which decides where points are drawn on the Canvas, to tell when a series needs redrawing.
+        return (self._origin[0],self._origin[1],self._xpx,self._xst,self._ypx,self._yst,self.w,self.h)
+
     def shift(self,*args):
         # Shifts the position of the origin over by a given number of units.
         delta = tkinter._flatten(args)
@@ -1220,7 +1771,7 @@ class Graph(Canvas): # TODO
         self._origin[0] -= delta[0]
         self._origin[1] += delta[1]
 
-        self._drawlines()
+        self._update()
 
     def center(self):
         # Centers the Graph to show its entire contents if self['span'] is 'all'.
@@ -1230,29 +1781,43 @@ class Graph(Canvas): # TODO
         if (self.winfo_width(),self.winfo_height()) == (1,1):
             return self.after(5,self.center)
 
-        data = self.gooey_kw['data']
-        span = self.gooey_kw['span']
+        self._fit()
+        self._update()
+
+    def _fit(self):
+        # Sets the scales and origin for self.center without redrawing, so that self._update can call it for a Graph which isn't dragable.
+        span   = self.gooey_kw['span']
+        series = [s for s in self._series.values() if s.length]
 
-        # Creates an x_list of all x-values within the span as well as a y_list containing y-values within the span.
+        # There is nothing to center on with fewer than 2 points.
+        if sum(s.length for s in series) < 2:
+            return
+
+        # Finds the first point of each series within the span, all series sharing the same axes.
         if span and span != 'all':
-            x_list = [x[0] for x in data if x[0] >= data[-1][0]-span]
-            y_list = [x[1] for x in data if x[0] >= data[-1][0]-span]
-            dist   = span
+            end   = max(s.x[-1] for s in series)
+            first = [numpy.searchsorted(s.x,end-span) for s in series]
+            dist  = span
 
-            # If there are less than 2 elements in the lists, expand them to include the last 2 elements in self['data'].
-            if len(x_list) < 2:
-                x_list = [p[0] for p in data[-2:]]
-                y_list = [p[1] for p in data[-2:]]
-                dist   = None
+            # If there are less than 2 points within the span, expand it to include the last 2 points of each series.
+            if sum(s.length-f for s,f in zip(series,first)) < 2:
+                first = [max(s.length-2,0) for s in series]
+                dist  = None
 
         else:
-            x_list = [p[0] for p in data]
-            y_list = [p[1] for p in data]
-            dist   = None
+            first = [0]*len(series)
+            dist  = None
+
+        # The range of the x and y values within the span - x values are sorted so their range is at the ends.
+        tails  = [(s.x[f:],s.y[f:]) for s,f in zip(series,first) if f < s.length]
+        x_min  = min(x[0]  for x,y in tails)
+        x_max  = max(x[-1] for x,y in tails)
+        y_min  = min(y.min() for x,y in tails)
+        y_max  = max(y.max() for x,y in tails)
 
-        # Code to correctly center the Graph.
-        cx     = (max(x_list)-min(x_list))
-        cy     = (max(y_list)-min(y_list))
+        # Code to correctly center the Graph - flat data is given a range of 1 so it can still be scaled.
+        cx     = (x_max-x_min) or 1.0
+        cy     = (y_max-y_min) or 1.0
 
         dist   = dist if dist else cx
         pps    = (self.w-self.sq*3)*self._xst/dist
@@ -1265,8 +1830,8 @@ class Graph(Canvas): # TODO
 
         self._ypx /= ratio
 
-        zx     = max(x_list)-cx/2.0
-        zy     = max(y_list)-cy/2.0
+        zx     = x_max-cx/2.0
+        zy     = y_max-cy/2.0
         nx,ny  = self.graph_coords(zx,zy)
 
         dx     = self.w/2.0-nx
@@ -1275,8 +1840,6 @@ class Graph(Canvas): # TODO
         self._origin[0] += dx
         self._origin[1] += dy
 
-        self._update()
-
     def _startpan(self,event):
         # Called at the start of a pan to hold variables to track the pan.
         self._panvar = {'x':event.x,'y':event.y,'dx':0,'dy':0}
@@ -1306,18 +1869,19 @@ class Graph(Canvas): # TODO
 
     def _update_title(self):
         # Handles placement of the Graph's title as well as unit labels on the axes.
-        self.delete('title')
-        self.delete('unit')
+        title  = [(self.w/2.0,self.sq/2.0,self.gooey_kw['title'])] if self.gooey_kw['title'] else []
+        units  = [(self.sq,self.sq/2.0,self.gooey_kw['labely'])] if self.gooey_kw['labely'] else []
+        units += [(self.w-self.sq/2.0,self.h-self.sq,self.gooey_kw['labelx'])] if self.gooey_kw['labelx'] else []
 
-        font  = Font(family='Segoe UI', size=14)
-        font2 = Font(family='Segoe UI', size=10)
+        items  = self._pool('title',len(title),lambda: CanvasText(self,0,0,font=self._title_font,tag='title'))
+        for item,(x,y,text) in zip(items,title):
+            item.coords = x,y
+            self._itemshow(item,text=text)
 
-        if self.gooey_kw['title']:
-            CanvasText(self,self.w/2.0,self.sq/2.0,text=self.gooey_kw['title'],font=font,tag='title')
-        if self.gooey_kw['labely']:
-            CanvasText(self,self.sq,self.sq/2.0,text=self.gooey_kw['labely'],font=font2,fill='grey40',tag='unit')
-        if self.gooey_kw['labelx']:
-            CanvasText(self,self.w-self.sq/2.0,self.h-self.sq,text=self.gooey_kw['labelx'],font=font2,fill='grey40',tag='unit')
+        items  = self._pool('unit',len(units),lambda: CanvasText(self,0,0,font=self._unit_font,fill='grey40',tag='unit'))
+        for item,(x,y,text) in zip(items,units):
+            item.coords = x,y
+            self._itemshow(item,text=text)
 
     def _zoom(self,event):
         # Zooms in or out, bound to the mousewheel. Also moves the origin by a certain amount to improve the feel of zooming.
@@ -1356,7 +1920,17 @@ class Graph(Canvas): # TODO
 
         self._update()
 
-    def _update(self):
+    def _update(self,moved=True):
+        # Asks for the Graph to be redrawn when Tk is next idle, so that a burst of pans, zooms or new data is drawn once - see
+        # gooey.Scheduler. MOVED is False when only the series have changed, so only they need redrawing on a dragable Graph.
+        self._moved = self._moved or moved
+        scheduler.request(self,self._redraw,self.gooey_kw['fps'])
+
+    def destroy(self):
+        scheduler.cancel(self)
+        Canvas.destroy(self)
+
+    def _redraw(self):
 
         try:
             h = self.h
@@ -1364,8 +1938,15 @@ class Graph(Canvas): # TODO
             return self.after(5,self._update)
             
         # Umbrella function to update Graph elements when changes are made to it.
+        moved,self._moved = self._moved,False
+
         if not self.gooey_kw['dragable']:
-            self.center()
+            self._fit()
+        elif not moved:
+            for series in self._series.values():
+                self._drawseries(series)
+            return
+
         self._squaresize()
         self._drawlines()
         self._update_title()
@@ -1385,32 +1966,50 @@ class Graph(Canvas): # TODO
             self._ypx /= 10
             self._yst /= 10
 
-    def _controlpoints(self,x0,y0,x1,y1,x2,y2,t=0.25):
-            # Calculates the position of control points for the spline curve around the point x1,y1
-            d01  = ((x1-x0)**2+(y1-y0)**2)**0.5
-            d12  = ((x1-x0)**2+(y1-y0)**2)**0.5
-    
-            fa   = t*d01/(d01+d12)
+    def _controlpoints(self,p0,p1,p2,t=0.25):
+            # Calculates the position of control points for the spline curve around each of the points P1, (n,2) arrays with P0 and P2
+            # the points either side of them. Returns arrays of the control points before and after each point.
+            d01  = numpy.hypot(*(p1-p0).T)
+            d12  = numpy.hypot(*(p2-p1).T)
+
+            # The control points are further out on the side of the longer segment - coincident points get them halfway.
+            total = d01+d12
+            fa   = t*numpy.divide(d01,total,out=numpy.full_like(total,0.5),where=total>0)
             fb   = t-fa
-    
-            p1   = [x1+fa*(x0-x2)]
-            p1  += [y1+fa*(y0-y2)]
-    
-            p2   = [x1-fb*(x0-x2)]
-            p2  += [y1-fb*(y0-y2)]
 
-            return [p1,p2]
+            before = p1+fa[:,None]*(p0-p2)
+            after  = p1-fb[:,None]*(p0-p2)
+
+            return before,after
+
+    def _pool(self,tag,count,create):
+        # Returns a list of COUNT canvas items tagged TAG for a redraw to move into place, reusing the items of the last
+        # redraw. New items are made by calling CREATE, and items which are no longer needed are deleted.
+        pool = self._pools.setdefault(tag,[])
+
+        while len(pool) < count:
+            pool.append(create())
+
+        for item in pool[count:]:
+            self._shown.pop(item,None)
+            item.delete()
+
+        del pool[count:]
+        return pool
+
+    def _itemshow(self,item,**kw):
+        # Configures a pooled ITEM with the options in KW which have changed since they were last given to it.
+        shown   = self._shown.setdefault(item,{})
+        changed = {key:value for key,value in kw.items() if shown.get(key) != value}
+
+        if changed:
+            shown.update(changed)
+            item.itemconfigure(changed)
 
     def _drawlines(self):
-        # Main drawing function for the Graph.
+        # Main drawing function for the Graph. Items are taken from the pools and moved into place - see self._pool.
         o,sq = self._origin,self.sq
-        w,h  = self.w,self.h = self.winfo_width(),self.winfo_height()
-
-        # Clears old objects from the Graph.
-        self.delete('background_line')
-        self.delete('label')
-        self.delete('point')
-        self.delete('trendline')
+        self.w,self.h = self.winfo_width(),self.winfo_height()
 
         # Moves the moving x and y axes to cross at the origin.
         self._moving_x_axis.coords = (o[0],sq,o[0],self.h-sq)
@@ -1427,49 +2026,109 @@ class Graph(Canvas): # TODO
         x_labels = x_lines//10+1
         y_labels = y_lines//10+1
 
-        # For each x-direction gridline, draws the gridline and places a label next to the fixed axis at regular intervals.
+        # Lists of the coords of the gridlines, and the coords, text and anchor of the labels.
+        lines,labels = [],[]
+
+        # For each x-direction gridline, places the gridline and a label next to the fixed axis at regular intervals.
         for step in range(-x_lines_pre,x_lines_post+1):
             m = self._origin[0]+self._xpx*step
             if step != 0:
-                CanvasLine(self, m,sq,m,self.h-sq, fill='grey90',tag='background_line')
+                lines  += [(m,sq,m,self.h-sq)]
             if step%x_labels == 0:
                 text = step*self._xst
                 text = int(text) if text%1 == 0 else text
-                CanvasText(self,m,self.h-sq/1.3,text=str(text),fill='grey80',tag='label')
+                labels += [(m,self.h-sq/1.3,str(text),'center')]
 
-        # For each y-direction gridline, draws the gridline and places a label next to the fixed axis at regular intervals.
+        # For each y-direction gridline, places the gridline and a label next to the fixed axis at regular intervals.
         for step in range(-y_lines_pre,y_lines_post+1):
             m = self._origin[1]+self._ypx*step
             if step != 0:
-                CanvasLine(self, sq,m,self.w-sq,m, fill='grey90',tag='background_line')
+                lines  += [(sq,m,self.w-sq,m)]
             if step%y_labels == 0:
                 text = -step*self._yst
                 text = int(text) if text%1 == 0 else text
-                CanvasText(self,self.sq/1.3,m,text=str(text)[:6],anchor='e',fill='grey80',tag='label')
-
-        # Caluclates the position of each point in self['data'] and draws it if it is within the Grpah area.
-        points = []
-        for px,py in self.gooey_kw['data']:
-            x,y     = self.graph_coords(px,py)
-            points += [[x,y]]
-            if (x >= sq-3 and x <= w-sq+3) and (y >= sq-3 and y <= h-sq+3):
-                CanvasRectangle(self, x-3,y-3,x+3,y+3, outline='turquoise3',width=3,fill='white',tag='point')
-
-        # Generates the path of the spline curve based on the points.
-        path = []
-        for x,p in enumerate(points):
-            if x == 0 or x == len(points)-1:
-                path += [p,p]
-            else:
-                a,b   = points[x-1],points[x+1]
-                p1,p2 = self._controlpoints(*a+p+b)
-                path += [p1,p,p2]
+                labels += [(self.sq/1.3,m,str(text)[:6],'e')]
+
+        items = self._pool('background_line',len(lines),lambda: CanvasLine(self,0,0,0,0,fill='grey90',tag='background_line'))
+        for item,co in zip(items,lines):
+            item.coords = co
+
+        items = self._pool('label',len(labels),lambda: CanvasText(self,0,0,fill='grey80',tag='label'))
+        for item,(x,y,text,anchor) in zip(items,labels):
+            item.coords = x,y
+            self._itemshow(item,text=text,anchor=anchor)
+
+        # Draws each series which has changed or been moved since it was last drawn.
+        view = self._view()
+        for series in self._series.values():
+            self._drawseries(series,view)
+
+    def _drawseries(self,series,view=None):
+        # Draws the points of SERIES and the line through them, unless they are already drawn for VIEW, the current view.
+        view = view or self._view()
+        if not series.dirty and series.view == view:
+            return
 
-        # Draws the spline curve.
-        for x,_ in enumerate(points[:-1]):
-            n = x*3
-            m = n+4
-            CanvasLine(self,*path[n:m], fill='#bbffff',width=2, smooth=True, tag='trendline')
+        series.dirty,series.view = False,view
+        o,sq,w,h = self._origin,self.sq,self.w,self.h
+
+        # Finds the points in view by binary search on x.
+        data_x,data_y = series.x,series.y
+        left  = (sq-3-o[0])*self._xst/self._xpx
+        right = (w-sq+3-o[0])*self._xst/self._xpx
+        lo    = numpy.searchsorted(data_x,left,'left')
+        hi    = numpy.searchsorted(data_x,right,'right')
+
+        # Picks the level of the pyramid to draw from so there are at most 2 points per pixel, and the rows of it in view
+        # along with the row either side so the curve runs off the edges.
+        k     = series.level(hi-lo,w-2*sq)
+        rows  = (series.length+(1 << k)-1) >> k
+        first = max((lo >> k)-1,0)
+        last  = min(((hi-1) >> k)+2,rows)
+
+        # The points drawn, along with the points either side of them for the spline - the ends of the data are their own neighbours.
+        index = series.samples(k,max(first-1,0),min(last+1,rows))
+        index = numpy.concatenate([index[:int(first == 0)],index,index[len(index)-int(last == rows):]])
+
+        # Caluclates the position of each point on the Canvas.
+        around = numpy.empty([len(index),2])
+        around[:,0] = o[0]+data_x[index]/self._xst*self._xpx
+        around[:,1] = o[1]-data_y[index]/self._yst*self._ypx
+        points = around[1:-1]
+
+        # Draws a box on each point which is within the Graph area, unless the points are downsampled and would be drawn on top of each other.
+        inside = (points[:,0] >= sq-3) & (points[:,0] <= w-sq+3) & (points[:,1] >= sq-3) & (points[:,1] <= h-sq+3)
+        inside = inside if k == 0 else inside[:0]
+        boxes  = numpy.hstack([points[inside]-3,points[inside]+3]).tolist()
+
+        items = self._pool((series.name,'point'),len(boxes),lambda: CanvasRectangle(self,0,0,0,0,outline=series.outline,width=3,fill='white',tag='point'))
+        for item,co in zip(items,boxes):
+            item.coords = co
+
+        if series.spline:
+
+            # Generates the control points of the spline curve around each point - the first and last points of the data are their own.
+            before,after = self._controlpoints(around[:-2],points,around[2:])
+            if first == 0 and len(points):
+                before[0] = after[0] = points[0]
+            if last == rows and len(points):
+                before[-1] = after[-1] = points[-1]
+
+            # Draws the spline curve, a segment between each pair of points.
+            path = numpy.hstack([points[:-1],after[:-1],before[1:],points[1:]]).tolist()
+            tag  = 'spline'
+            make = lambda: CanvasLine(self,0,0,0,0,0,0,0,0,fill=series.colour,width=2,smooth=True,tag='trendline')
+
+        else:
+            # Draws a straight line between each pair of points.
+            path = numpy.hstack([points[:-1],points[1:]]).tolist()
+            tag  = 'line'
+            make = lambda: CanvasLine(self,0,0,0,0,fill=series.colour,width=2,tag='trendline')
+
+        self._pool((series.name,'line' if series.spline else 'spline'),0,None)
+        items = self._pool((series.name,tag),len(path),make)
+        for item,co in zip(items,path):
+            item.coords = co
 
         # Configures elevation of various objects so they display correctly.
         self.tag_lower('trendline','bounding_box')
@@ -1482,6 +2141,7 @@ class Graph(Canvas): # TODO
 
         # Update the graph when certain kewords are changed to apply the changes.
         if 'data' in cnf:
+            self._series[None].set(cnf['data'])
             self._update()
         if 'title' in cnf or 'labelx' in cnf or 'labely' in cnf:
             self._update_title()
@@ -1640,7 +2300,9 @@ if __name__ == '__main__':
                     data += newdata
                     self.datas[key] = data
 
-                self.graph['data'] = self.datas[self.selector.get()]
+                    if key == self.selector.get():
+                        self.graph.extend(newdata)
+
                 self.update_stats()
                 if self.centering:
                     self.graph.center()
@@ -0,0 +1,548 @@
+# Oscar Saharoy 2019
+
+import numpy
+
+
+def spread(v):
+
+    # Spreads the bits of 16 bit integers V out so there is a zero between each of them.
+
+    v = (v | (v << 8)) & 0x00ff00ff
+    v = (v | (v << 4)) & 0x0f0f0f0f
+    v = (v | (v << 2)) & 0x33333333
+    v = (v | (v << 1)) & 0x55555555
+
+    return v
+
+
+def morton(x, y):
+
+    # Interleaves the bits of 16 bit integer coordinates into Morton (Z-order) codes, so that sorting by code
+    # puts points which are close together in space close together in order.
+
+    return spread(x) | (spread(y) << 1)
+
+
+def nearest(d, length, work):
+
+    # Replaces the offsets D along an axis which wraps round every LENGTH with the offsets to the nearest
+    # image, so they are all between -LENGTH/2 and LENGTH/2. WORK is a buffer the same shape as D.
+
+    numpy.divide(d, length, out=work)
+    numpy.rint(work, out=work)
+    numpy.multiply(work, length, out=work)
+    numpy.subtract(d, work, out=d)
+
+
+class Grid(object):
+
+    # Uniform grid broad-phase for finding pairs of balls closer than some reach.
+    #
+    # The world is divided into square cells at least as wide as the reach, with an empty border of cells
+    # around it so neighbouring cells can always be looked up without bounds checks. Each step the balls are
+    # sorted by cell and written into a table with a fixed number of slots per cell. The candidates for a ball
+    # are then the balls in its own cell and the 4 cells ahead of it (right, below left, below and below right),
+    # which sees every nearby pair exactly once. Points which aren't in the grid can be looked up in it too, by
+    # searching all 9 cells around them. If a cell ever overflows its slots the number of slots doubles,
+    # up to max_slots - beyond that the extra balls in a crowded cell are left out of the table for that step.
+    #
+    # A periodic grid wraps round, for worlds where balls leaving one side come back in the other. The world is
+    # split into a whole number of cells each way, so they can be a little wider than the reach, and the border
+    # cells are ghosts of the cells on the opposite side - after each build the slots of the edge cells are
+    # copied into them, so the search sees neighbours across the edges without copying any balls. Distances to
+    # balls found through the ghosts are then measured to their nearest image. There are always at least 3 cells
+    # each way, as with fewer the search would see some cells through both sides. With exactly 3 the search
+    # pairs every cell with every other, so a world less than 3 reaches across is split into 3 cells narrower
+    # than the reach and every pair of balls is a candidate.
+    #
+    # All the work is done with numpy ufuncs writing into buffers the grid keeps between steps, so once the
+    # buffers are big enough building the grid and finding pairs does not allocate.
+
+    def __init__(self, slots=4, max_slots=64):
+
+        self.slots     = slots     # number of balls which fit in a cell
+        self.max_slots = max_slots # limit on slots, so balls piled onto one point can't blow up the table
+        self.size  = 0     # reach the cells were sized for
+        self.cell_size = numpy.zeros(2) # width and height of a cell
+        self.periodic  = False          # True if the grid wraps round
+        self.width     = 0              # size of the world the grid covers
+        self.height    = 0
+        self.w     = 0     # width of the grid in cells, including the border
+        self.h     = 0     # height of the grid in cells, including the border
+        self.cap   = 0     # number of balls the per-ball buffers can hold
+        self.n     = 0     # number of balls in the grid
+        self.rows_cap = 0  # number of rows the candidate buffers can hold
+        self.query_cap = 0 # number of points the query buffers can hold
+
+        self.npairs   = 0
+        self.pair_cap = 0
+        self._reserve_pairs(64)
+
+        self.stencil  = []
+        self.buffer   = None # storage for the table
+        self._table()
+
+
+    def reserve(self, capacity):
+
+        # Makes sure the per-ball buffers can hold CAPACITY balls.
+
+        if capacity <= self.cap:
+            return
+
+        self.cap    = cap = max(capacity, self.cap*2)
+
+        self.index  = numpy.arange(cap)            # 0, 1, 2, ... for building keys and ranks
+        self.fcell  = numpy.zeros([cap, 2])        # cell coordinates of each ball as floats
+        self.cell   = numpy.zeros(cap, numpy.intp) # flattened cell index of each ball
+        self.base   = numpy.zeros(cap, numpy.intp) # position of each ball's cell in the table
+        self.key    = numpy.zeros(cap, numpy.intp) # cell * cap + ball, sorted to group balls by cell
+        self.order  = numpy.zeros(cap, numpy.intp) # balls in order of cell
+        self.rank   = numpy.zeros(cap, numpy.intp) # position of each sorted ball within its cell
+        self.placed = numpy.zeros(cap, numpy.intp) # table positions filled by the last build
+        self.flag   = numpy.zeros(cap, bool)
+        self.x      = numpy.zeros(cap)             # contiguous copies of the ball positions the grid was built
+        self.y      = numpy.zeros(cap)             # with, as numpy.take copies non-contiguous sources
+
+        self._lanes(cap)
+
+
+    def _reserve_query(self, count):
+
+        # Makes sure the buffers for the points of a query can hold COUNT points.
+
+        if count <= self.query_cap:
+            return
+
+        self.query_cap = cap = max(count, self.query_cap*2)
+
+        self.qfcell = numpy.zeros([cap, 2])
+        self.qcell  = numpy.zeros(cap, numpy.intp)
+        self.qbase  = numpy.zeros(cap, numpy.intp)
+        self.qx     = numpy.zeros(cap)
+        self.qy     = numpy.zeros(cap)
+
+        self._lanes(cap)
+
+
+    def _lanes(self, count=0):
+
+        # Buffers holding one entry per candidate - a row for each ball or query point and a column for each
+        # slot of a cell.
+
+        self.rows_cap = cap = max(count, self.rows_cap)
+        slots         = self.slots
+
+        self.lanes  = numpy.arange(slots)
+        self.rows   = numpy.arange(cap)[:,None].repeat(slots, axis=1) # rows[i, :] == i
+        self.idx    = numpy.zeros([cap, slots], numpy.intp)
+        self.cand   = numpy.zeros([cap, slots], numpy.intp)
+        self.d2     = numpy.zeros([cap, slots])
+        self.tmp    = numpy.zeros([cap, slots])
+        self.hit    = numpy.zeros([cap, slots], bool)
+        self.near   = numpy.zeros([cap, slots], bool)
+        self.dest   = numpy.zeros([cap, slots], numpy.intp)
+        self.work   = numpy.zeros([cap, slots])
+
+
+    def shape(self, size, width, height, periodic=False):
+
+        # Sets the cell size and the size of the world covered by the grid, reallocating the table if these change.
+
+        if periodic:
+
+            # a whole number of cells across, at least 3, with ghosts round the edge
+            w = max(int(width  // size), 3) + 2
+            h = max(int(height // size), 3) + 2
+
+        else:
+            w = int(width  // size) + 3
+            h = int(height // size) + 3
+
+        if (size, w, h, periodic, width, height) == (self.size, self.w, self.h, self.periodic, self.width, self.height):
+            return
+
+        self.size, self.w, self.h = size, w, h
+        self.periodic, self.width, self.height = periodic, width, height
+
+        if periodic:
+            self.cell_size[:] = width / (w-2), height / (h-2)
+        else:
+            self.cell_size[:] = size
+
+        # flattened offsets of the cell itself and the 4 cells ahead of it, and of all 9 cells around a cell
+        self.stencil = [0, 1, w-1, w, w+1]
+        self.around  = [-w-1, -w, -w+1, -1, 0, 1, w-1, w, w+1]
+
+        self._table()
+
+
+    def _table(self):
+
+        # Clears an empty table with a row of slots for each cell, and a spare last entry for balls which
+        # don't fit in their cell. The table is kept in a buffer which only grows, by doubling, so reshaping the
+        # grid eg. for another container doesn't allocate unless it needs more cells than before.
+
+        size   = self.w*self.h*self.slots + 1
+        buffer = self.buffer
+
+        if buffer is None or len(buffer) < size:
+            self.buffer = buffer = numpy.empty(max(size, 0 if buffer is None else 2*len(buffer)), numpy.intp)
+
+        self.table   = buffer[:size]
+        self.table.fill(-1)
+        self.nplaced = 0
+
+
+    def build(self, pos, n):
+
+        # Bins the first N balls of POS into the grid.
+
+        self.reserve(n)
+        self.n = n
+
+        if n == 0:
+            return
+
+        slots = self.slots
+
+        cell, key, order, rank, flag = self.cell[:n], self.key[:n], self.order[:n], self.rank[:n], self.flag[:n]
+        index = self.index[:n]
+
+        self._cells(pos[:n], self.fcell[:n], cell, self.base[:n])
+
+        numpy.copyto(self.x[:n], pos[:n,0])
+        numpy.copyto(self.y[:n], pos[:n,1])
+
+        # sort the balls by cell - the ball index goes in the low part of the key so this is an in place sort
+        numpy.multiply(cell, self.cap, out=key)
+        numpy.add(key, index, out=key)
+        key.sort()
+
+        numpy.remainder(key, self.cap, out=order)
+        numpy.floor_divide(key, self.cap, out=key) # key now holds the sorted cells
+
+        # each ball's rank in its cell is its distance from the start of its run of equal cells
+        flag[0] = True
+        numpy.not_equal(key[1:], key[:-1], out=flag[1:])
+        numpy.multiply(index, flag, out=rank)
+        numpy.maximum.accumulate(rank, out=rank)
+        numpy.subtract(index, rank, out=rank)
+
+        # if any cell has more balls than slots, double the slots and start again
+        numpy.greater_equal(rank, slots, out=flag)
+        overflow = flag.any()
+
+        if overflow and slots < self.max_slots:
+
+            self.slots *= 2
+            self._table()
+            self._lanes()
+
+            return self.build(pos, n)
+
+        # clear the slots used by the last build and place the balls in the table
+        self.table[self.placed[:self.nplaced]] = -1
+
+        placed = self.placed[:n]
+        numpy.multiply(key, slots, out=placed)
+        numpy.add(placed, rank, out=placed)
+
+        if overflow:
+            numpy.copyto(placed, len(self.table)-1, where=flag)
+
+        self.table[placed] = order
+        self.table[-1]     = -1
+        self.nplaced       = n
+
+        if self.periodic:
+            self._ghosts()
+
+
+    def _ghosts(self):
+
+        # Copies the slots of the edge cells of a periodic grid into the ghost cells across the opposite edges -
+        # the columns first, then the rows including their ghost columns, which fills the corners.
+
+        table = self.table[:-1].reshape(self.h, self.w, self.slots)
+
+        table[:,0]  = table[:,-2]
+        table[:,-1] = table[:,1]
+        table[0]    = table[-2]
+        table[-1]   = table[1]
+
+
+    def _cells(self, pos, fcell, cell, base):
+
+        # Fills CELL with the flattened index of the cell each of POS falls in, and BASE with the position of
+        # that cell in the table. FCELL is a float buffer for working.
+
+        w, h = self.w, self.h
+
+        # cell coordinates, clipped inside the border
+        numpy.floor_divide(pos, self.cell_size, out=fcell)
+        numpy.clip(fcell[:,0], 0, w-3, out=fcell[:,0])
+        numpy.clip(fcell[:,1], 0, h-3, out=fcell[:,1])
+
+        # flattened cell index, offset by one row and column for the border
+        numpy.multiply(fcell[:,1], w, out=fcell[:,1])
+        numpy.add(fcell[:,1], fcell[:,0], out=fcell[:,1])
+        numpy.add(fcell[:,1], w+1, out=fcell[:,1])
+        numpy.copyto(cell, fcell[:,1], casting='unsafe')
+        numpy.multiply(cell, self.slots, out=base)
+
+
+    def pairs(self, reach):
+
+        # Returns arrays (i1, i2) of the pairs of balls in the grid whose centres were closer than REACH when the
+        # grid was built. REACH must be no more than the size the grid was shaped for. The arrays are views of
+        # buffers owned by the grid so they are only valid until the next call.
+
+        return self._search(self.base, self.x, self.y, self.n, self.stencil, reach, True)
+
+
+    def query(self, pos, m, reach):
+
+        # Returns arrays (i1, i2) pairing each of the first M points of POS with the balls in the grid within
+        # REACH of it - i1 indexes the points and i2 the balls. REACH must be no more than the size the grid was
+        # shaped for. The arrays are only valid until the next call, as for pairs.
+
+        self._reserve_query(m)
+
+        if self.n == 0:
+            m = 0
+
+        numpy.copyto(self.qx[:m], pos[:m,0])
+        numpy.copyto(self.qy[:m], pos[:m,1])
+
+        self._cells(pos[:m], self.qfcell[:m], self.qcell[:m], self.qbase[:m])
+
+        return self._search(self.qbase, self.qx, self.qy, m, self.around, reach, False)
+
+
+    def _search(self, base, x, y, n, offsets, reach, own):
+
+        # Finds the balls in the cells at OFFSETS from the cells at BASE within REACH of the N points (X, Y).
+        # If OWN the points are the balls of the grid, so within a cell each ball is only paired with later ones.
+
+        npairs = 0
+
+        if n == 0:
+            self.npairs = 0
+            return self.i1[:0], self.i2[:0]
+
+        idx, cand, d2, tmp, hit, near, rows = self.idx[:n], self.cand[:n], self.d2[:n], self.tmp[:n], self.hit[:n], self.near[:n], self.rows[:n]
+
+        x, y   = x[:n], y[:n]
+        dest   = self.dest[:n].ravel()
+        work   = self.work[:n]
+
+        for offset in offsets:
+
+            # gather the slots of the neighbouring cell for every point
+            numpy.add(base[:n,None], self.lanes[None,:], out=idx)
+            numpy.add(idx, offset*self.slots, out=idx)
+            numpy.take(self.table, idx, out=cand, mode='clip') # mode='clip' stops take buffering its output
+
+            # within a ball's own cell only pair it with later balls, elsewhere any filled slot is a candidate
+            if own and offset == 0:
+                numpy.greater(cand, rows, out=hit)
+            else:
+                numpy.greater_equal(cand, 0, out=hit)
+
+            # squared distance to each candidate - empty slots (-1) read ball 0 but are masked by hit
+            numpy.take(self.x, cand, out=d2, mode='clip')
+            numpy.subtract(d2, x[:,None], out=d2)
+            numpy.take(self.y, cand, out=tmp, mode='clip')
+            numpy.subtract(tmp, y[:,None], out=tmp)
+
+            if self.periodic:
+                nearest(d2,  self.width,  work)
+                nearest(tmp, self.height, work)
+
+            numpy.multiply(d2, d2, out=d2)
+            numpy.multiply(tmp, tmp, out=tmp)
+            numpy.add(d2, tmp, out=d2)
+
+            numpy.less(d2, reach*reach, out=near)
+            numpy.logical_and(hit, near, out=hit)
+
+            # compact the hits onto the end of the pair buffers - a running count of the hits gives each one
+            # its place, and misses are all sent to the spare last entry of the buffers
+            numpy.copyto(dest, hit.ravel())
+            numpy.cumsum(dest, out=dest)
+
+            count = int(dest[-1])
+
+            self._reserve_pairs(npairs + count + 1)
+
+            numpy.add(dest, npairs-1, out=dest)
+            numpy.logical_not(hit, out=near)
+            numpy.copyto(dest, self.pair_cap-1, where=near.ravel())
+
+            self.i1[dest] = rows.ravel()
+            self.i2[dest] = cand.ravel()
+
+            npairs += count
+
+        self.npairs = npairs
+
+        return self.i1[:npairs], self.i2[:npairs]
+
+
+    def _reserve_pairs(self, count):
+
+        # Grows the pair buffers by doubling if they can't hold COUNT pairs.
+
+        if count <= self.pair_cap:
+            return
+
+        cap = max(count, self.pair_cap*2, 64)
+
+        i1, i2  = numpy.zeros(cap, numpy.intp), numpy.zeros(cap, numpy.intp)
+
+        if self.pair_cap:
+            i1[:self.pair_cap] = self.i1
+            i2[:self.pair_cap] = self.i2
+
+        self.i1, self.i2, self.pair_cap = i1, i2, cap
+
+
+class Levels(object):
+
+    # Broad-phase for balls of different sizes, built on Grid.
+    #
+    # One grid sized for the biggest balls would put many small balls in each cell, so instead the balls are
+    # split into levels by radius, each level holding radii up to twice those of the level below, and each level
+    # gets a grid with cells sized for its own biggest ball. Pairs within a level come from its grid, and each
+    # ball is paired with balls of the bigger levels by looking it up in their grids. With a single size of ball
+    # this is just one grid.
+    #
+    # Pairs are found out to SCALE times the sum of the biggest radii of the two levels, so they include every
+    # pair of balls closer than SCALE times the sum of their radii, along with some further apart. In a PERIODIC
+    # world the grids wrap round and pairs are found across the edges.
+
+    def __init__(self):
+
+        self.grids  = [] # grid for each level
+        self.levels = [] # (start, count, biggest radius) of each level in self.member
+        self.scale  = 1
+        self.cap    = 0
+
+        self.npairs   = 0
+        self.pair_cap = 0
+        self._reserve_pairs(64)
+
+
+    def reserve(self, capacity):
+
+        # Makes sure the per-ball buffers can hold CAPACITY balls.
+
+        if capacity <= self.cap:
+            return
+
+        self.cap    = cap = max(capacity, self.cap*2)
+
+        self.index  = numpy.arange(cap)
+        self.level  = numpy.zeros(cap)             # level of each ball, as a float while it is worked out
+        self.key    = numpy.zeros(cap, numpy.intp) # level * cap + ball, sorted to group balls by level
+        self.member = numpy.zeros(cap, numpy.intp) # balls in order of level
+        self.radius = numpy.zeros(cap)             # radii of the balls in order of level
+        self.pos    = numpy.zeros([cap, 2])        # positions of the balls in order of level
+
+
+    def build(self, pos, radius, n, width, height, scale=1, periodic=False):
+
+        # Bins the first N balls of POS, with radii RADIUS, into the grids of their levels. The grids cover a
+        # world WIDTH by HEIGHT.
+
+        self.reserve(n)
+        self.levels = []
+        self.scale  = scale
+
+        if n == 0:
+            return
+
+        level, key, member = self.level[:n], self.key[:n], self.member[:n]
+
+        # level is the whole number of doublings of radius above the smallest
+        numpy.divide(radius[:n], radius[:n].min(), out=level)
+        numpy.log2(level, out=level)
+        numpy.floor(level, out=level)
+
+        count = int(level.max()) + 1
+
+        # sort the balls by level in place, as Grid.build sorts them by cell
+        numpy.copyto(key, level, casting='unsafe')
+        numpy.multiply(key, self.cap, out=key)
+        numpy.add(key, self.index[:n], out=key)
+        key.sort()
+
+        numpy.remainder(key, self.cap, out=member)
+        numpy.floor_divide(key, self.cap, out=key)
+
+        numpy.take(pos,    member, axis=0, out=self.pos[:n], mode='clip')
+        numpy.take(radius, member, out=self.radius[:n], mode='clip')
+
+        while len(self.grids) < count:
+            self.grids.append(Grid())
+
+        start = 0
+
+        for l in range(count):
+
+            end = int(numpy.searchsorted(key, l, 'right'))
+
+            if end > start:
+
+                biggest = float(self.radius[start:end].max())
+
+                self.grids[l].shape(2*biggest*scale, width, height, periodic)
+                self.grids[l].build(self.pos[start:end], end-start)
+
+            self.levels.append((start, end-start, biggest if end > start else 0))
+
+            start = end
+
+
+    def pairs(self):
+
+        # Returns arrays (i1, i2) of the candidate pairs of balls. The arrays are views of buffers owned by the
+        # levels so they are only valid until the next call.
+
+        npairs = 0
+
+        for a, (start_a, count_a, radius_a) in enumerate(self.levels):
+
+            if count_a == 0:
+                continue
+
+            for b in range(a, len(self.levels)):
+
+                start_b, count_b, radius_b = self.levels[b]
+
+                if count_b == 0:
+                    continue
+
+                # pairs within a level come from its own grid, smaller balls are looked up in bigger balls' grids
+                if a == b:
+                    i1, i2 = self.grids[a].pairs(2*radius_a*self.scale)
+                else:
+                    i1, i2 = self.grids[b].query(self.pos[start_a:], count_a, (radius_a + radius_b)*self.scale)
+
+                # convert the positions within the levels to balls
+                k = len(i1)
+                self._reserve_pairs(npairs + k)
+
+                numpy.take(self.member[start_a:start_a+count_a], i1, out=self.i1[npairs:npairs+k], mode='clip')
+                numpy.take(self.member[start_b:start_b+count_b], i2, out=self.i2[npairs:npairs+k], mode='clip')
+
+                npairs += k
+
+        self.npairs = npairs
+
+        return self.i1[:npairs], self.i2[:npairs]
+
+
+    # the pair buffers grow in the same way as a grid's
+    _reserve_pairs = Grid._reserve_pairs
@@ -0,0 +1,191 @@
+# Oscar Saharoy 2019
+
+import numpy, time, csv
+
+
+# Resolutions metrics are kept at, as (period in seconds, number of rows kept). The first keeps every sample and
+# the others keep the mean, min and max of each period - with these sizes the last quarter of an hour of samples
+# at 60 fps, the last day of seconds and the last month of minutes, in about 6 MB per metric.
+TIERS = [(0, 1 << 16), (1, 24*60*60), (60, 30*24*60)]
+
+
+class Ring(object):
+
+    # Fixed size ring buffer of rows (time, mean, min, max) in order of time. Once it is full each new row
+    # replaces the oldest, so it holds the latest CAPACITY rows however many are added.
+
+    def __init__(self, capacity):
+
+        self.rows     = numpy.zeros([capacity, 4])
+        self.capacity = capacity
+        self.start    = 0 # position of the oldest row
+        self.count    = 0 # number of rows held
+
+
+    def append(self, t, mean, low, high):
+
+        self.rows[(self.start + self.count) % self.capacity] = t, mean, low, high
+
+        if self.count < self.capacity:
+            self.count += 1
+        else:
+            self.start  = (self.start + 1) % self.capacity
+
+
+    def time(self, i):
+
+        # time of the I'th oldest row
+        return self.rows[(self.start + i) % self.capacity, 0]
+
+
+    def oldest(self):
+
+        return self.time(0) if self.count else numpy.inf
+
+
+    def search(self, t):
+
+        # Returns the number of rows older than T, by binary search.
+
+        lo, hi = 0, self.count
+
+        while lo < hi:
+
+            mid = (lo + hi) // 2
+
+            if self.time(mid) < t:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        return lo
+
+
+    def between(self, t0, t1):
+
+        # Returns the rows from time T0 up to T1 as a (k, 4) array, oldest first.
+
+        return self.slice(self.search(t0), self.search(t1))
+
+
+    def slice(self, first, last):
+
+        # Returns the FIRST to LAST oldest rows as a (k, 4) array.
+
+        return self.rows[(self.start + numpy.arange(first, last)) % self.capacity]
+
+
+class Series(object):
+
+    # One metric, kept at each of the resolutions in TIERS. Each sample goes into the first ring as it is, and
+    # into the running mean, min and max of the current period of each of the others, which are added to their
+    # rings as rows when a sample arrives after the period is over. The cost of adding a sample is the same
+    # however long the run has been going.
+
+    def __init__(self, tiers=TIERS):
+
+        self.periods = [period for period, capacity in tiers]
+        self.rings   = [Ring(capacity) for period, capacity in tiers]
+
+        # start, sum, count, min and max of the current period of each tier
+        self.buckets = [[None, 0.0, 0, numpy.inf, -numpy.inf] for period in self.periods]
+
+
+    def add(self, t, value):
+
+        for period, ring, bucket in zip(self.periods, self.rings, self.buckets):
+
+            if period == 0:
+                ring.append(t, value, value, value)
+                continue
+
+            start = t - t % period
+
+            if bucket[0] != start:
+
+                # the period is over - roll it up into a row
+                if bucket[2]:
+                    ring.append(bucket[0], bucket[1] / bucket[2], bucket[3], bucket[4])
+
+                bucket[:] = [start, 0.0, 0, numpy.inf, -numpy.inf]
+
+            bucket[1] += value
+            bucket[2] += 1
+            bucket[3]  = min(bucket[3], value)
+            bucket[4]  = max(bucket[4], value)
+
+
+    def query(self, t0, t1, points=None):
+
+        # Returns the rows (time, mean, min, max) from T0 to T1 as a (k, 4) array from the finest tier which still
+        # holds samples from T0 - and, if POINTS is given, has no more than POINTS rows in that time. The cost is
+        # in proportion to the number of rows returned. Periods which aren't over yet aren't included.
+
+        for period, ring in zip(self.periods, self.rings):
+
+            if points and period and (t1 - t0) / period > points:
+                continue
+
+            # a ring which hasn't filled up yet holds everything since the start - the rows are only counted
+            # by binary search until a ring with few enough of them is found
+            if ring.count < ring.capacity or ring.oldest() <= t0:
+
+                first, last = ring.search(t0), ring.search(t1)
+
+                if not points or last - first <= points:
+                    return ring.slice(first, last)
+
+        return self.rings[-1].between(t0, t1)
+
+
+class Metrics(object):
+
+    # Time series of named metrics for long runs - frame rate, energy, collision rate and so on - kept in
+    # Series with a fixed amount of memory each, so they can be looked back over and plotted for any window of
+    # a run however long it goes on. Times are seconds since the epoch, as from time.time.
+
+    def __init__(self, tiers=TIERS):
+
+        self.tiers  = tiers
+        self.series = {} # name -> Series
+
+
+    def record(self, name, value, t=None):
+
+        # Adds a sample of the metric called NAME, at time T or now.
+
+        series = self.series.get(name)
+
+        if series is None:
+            series = self.series[name] = Series(self.tiers)
+
+        series.add(time.time() if t is None else float(t), float(value))
+
+
+    def query(self, name, t0=None, t1=None, points=None):
+
+        # Returns the rows (time, mean, min, max) of the metric called NAME from time T0 to T1 as a (k, 4) array
+        # - see Series.query. T0 and T1 default to the start of the run and now.
+
+        if name not in self.series:
+            return numpy.zeros([0, 4])
+
+        t0 = -numpy.inf if t0 is None else t0
+        t1 = time.time() if t1 is None else t1
+
+        return self.series[name].query(t0, t1, points)
+
+
+    def export(self, path, names=None, t0=None, t1=None, points=None):
+
+        # Writes the metrics called NAMES, or all of them, from T0 to T1 to a csv file at PATH, with a row for each
+        # sample or period.
+
+        with open(path, 'w', newline='') as file:
+
+            writer = csv.writer(file)
+            writer.writerow(['metric', 'time', 'mean', 'min', 'max'])
+
+            for name in names or self.series:
+                for row in self.query(name, t0, t1, points):
+                    writer.writerow([name] + list(row))
@@ -0,0 +1,203 @@
+# Oscar Saharoy 2019
+
+import numpy
+
+from barneshut import runs
+
+
+# Starting positions and velocities for new balls.
+#
+# Balls placed uniformly at random overlap each other as soon as there are more than a few of them, and the
+# position fix in Balls.compute then throws them apart, so at high densities a run starts by exploding. The
+# layouts here place balls without overlaps instead. Each takes the number of balls wanted, the SPACING between
+# their centres - the diameter of the biggest of them - the size of the window and optionally a function
+# free(points) returning True for the points where a ball is clear of the walls and of any balls already
+# there. They keep balls inside the window and return up to COUNT positions, fewer if not that many fit.
+
+
+def poisson_disk(count, spacing, width, height, free=None, attempts=10):
+
+    # Random positions at least SPACING apart, by dart throwing on a background grid (Bridson's Poisson-disk
+    # sampling, done for many points at once).
+    #
+    # The cells of the grid are SPACING / sqrt 2 wide so each holds at most one point, and any point closer than
+    # SPACING to a point in a cell is in the 5 x 5 block of cells around it. Darts are thrown into every empty
+    # cell at once, in 9 phases of cells 3 apart - darts in the same phase are too far apart to clash with each
+    # other, so each only has to be checked against the points already placed. Every empty cell gets ATTEMPTS
+    # darts, stopping after the first full pass which places enough points, and COUNT of the points are picked
+    # at random.
+
+    cell   = spacing / 2**0.5
+    nx, ny = int(width // cell) + 1, int(height // cell) + 1
+    row    = nx + 4
+
+    # points in each cell row by row, nan when empty, with an empty border 2 cells wide so neighbours need no
+    # bounds checks
+    px     = numpy.full((ny+4) * row, numpy.nan)
+    py     = numpy.full((ny+4) * row, numpy.nan)
+
+    phases = [numpy.add.outer((numpy.arange(oy, ny, 3) + 2) * row, numpy.arange(ox, nx, 3) + 2).ravel()
+              for oy in range(3) for ox in range(3)]
+
+    # the neighbouring cells which can hold points closer than SPACING - not the cell itself, which is empty,
+    # or the corners of the block, which are SPACING away
+    around = [dy*row + dx for dy in range(-2, 3) for dx in range(-2, 3) if (dx or dy) and abs(dx*dy) != 4]
+
+    placed = 0
+
+    for attempt in range(attempts):
+
+        for cells in phases:
+
+            cells = cells[numpy.isnan(px[cells])]
+
+            x     = (cells %  row - 2 + numpy.random.rand(len(cells))) * cell
+            y     = (cells // row - 2 + numpy.random.rand(len(cells))) * cell
+
+            ok    = inside(x, y, spacing/2, width, height)
+
+            for offset in around:
+
+                ox  = numpy.take(px, cells + offset) - x
+                oy  = numpy.take(py, cells + offset) - y
+
+                ok &= ~(ox*ox + oy*oy < spacing*spacing) # nan for empty cells compares False
+
+            if free is not None and ok.any():
+                ok[ok] = free(numpy.stack([x[ok], y[ok]], axis=1))
+
+            px[cells[ok]] = x[ok]
+            py[cells[ok]] = y[ok]
+            placed       += ok.sum()
+
+        if placed >= count:
+            break
+
+    filled = ~numpy.isnan(px)
+    points = numpy.stack([px[filled], py[filled]], axis=1)
+
+    return points[numpy.random.permutation(len(points))[:count]]
+
+
+def hex_lattice(count, spacing, width, height, free=None):
+
+    # Positions on a hexagonal lattice - the closest packing of equal discs - filled row by row from the bottom.
+
+    return lattice(count, spacing, spacing * 3**0.5 / 2, spacing/2, width, height, free)
+
+
+def square_lattice(count, spacing, width, height, free=None):
+
+    # Positions on a square lattice, filled row by row from the bottom.
+
+    return lattice(count, spacing, spacing, 0, width, height, free)
+
+
+def lattice(count, spacing, pitch, shift, width, height, free):
+
+    # Positions in rows PITCH apart with points SPACING apart along them, every other row shifted along by SHIFT.
+
+    r      = spacing / 2
+
+    rows   = height - r - numpy.arange(int((height - spacing) // pitch) + 1) * pitch
+    cols   = r + numpy.arange(int((width - spacing) // spacing) + 1) * spacing
+
+    y, x   = numpy.meshgrid(rows, cols, indexing='ij')
+    x      = x + shift * (numpy.arange(len(rows)) % 2)[:,None]
+
+    points = numpy.stack([x.ravel(), y.ravel()], axis=1)
+    points = points[inside(points[:,0], points[:,1], r, width, height)]
+
+    if free is not None:
+        points = points[free(points)]
+
+    return points[:count]
+
+
+def inside(x, y, r, width, height):
+
+    # True for the points where a disc of radius R fits inside the window.
+
+    return (x >= r) & (x <= width - r) & (y >= r) & (y <= height - r)
+
+
+class Clear(object):
+
+    # Tests whether discs of radius MARGIN at some points are clear of the balls at POS with radii RADIUS.
+    #
+    # The balls are binned into square cells as wide as the biggest ball plus MARGIN and sorted by cell, so the
+    # balls which can touch a disc are in the 3 x 3 block of cells around its centre. Points far outside the
+    # balls are moved onto the empty border of cells around them, which doesn't change the answer as the
+    # distances are measured to the real points.
+
+    def __init__(self, pos, radius, margin):
+
+        self.margin = margin
+
+        if len(pos) == 0:
+            return
+
+        self.cell   = cell = radius.max() + margin
+
+        cells       = numpy.floor(pos / cell).astype(int)
+        self.lo     = cells.min(axis=0) - 1
+        self.shape  = cells.max(axis=0) - self.lo + 2 # cells across and down, including the border
+
+        keys        = self.key(cells - self.lo)
+        order       = numpy.argsort(keys, kind='stable')
+
+        self.keys   = keys[order]
+        self.pos    = pos[order]
+        self.radius = radius[order]
+
+
+    def key(self, cells):
+
+        return cells[:,1] * self.shape[0] + cells[:,0]
+
+
+    def __call__(self, points):
+
+        ok = numpy.ones(len(points), bool)
+
+        if len(ok) == 0 or not hasattr(self, 'keys'):
+            return ok
+
+        cells = numpy.clip(numpy.floor(points / self.cell).astype(int) - self.lo, 0, self.shape - 1)
+
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+
+                keys   = self.key(numpy.clip(cells + [dx, dy], 0, self.shape - 1))
+                start  = numpy.searchsorted(self.keys, keys, 'left')
+                counts = numpy.searchsorted(self.keys, keys, 'right') - start
+
+                # every point paired with every ball in the cell
+                which  = numpy.repeat(numpy.arange(len(points)), counts)
+                balls  = numpy.repeat(start, counts) + runs(counts)
+
+                offset = self.pos[balls] - points[which]
+                reach  = self.radius[balls] + self.margin
+
+                ok[which[(offset*offset).sum(axis=1) < reach*reach]] = False
+
+        return ok
+
+
+def maxwell_boltzmann(mass, temperature):
+
+    # Random velocities for balls with masses MASS, drawn from the Maxwell-Boltzmann distribution at TEMPERATURE
+    # (in units where Boltzmann's constant is 1), so each component is normal with variance temperature / mass
+    # and the mean kinetic energy of a ball is TEMPERATURE.
+
+    return numpy.random.normal(size=(len(mass), 2)) * numpy.sqrt(temperature / mass)[:,None]
+
+
+# layouts which can be picked from the settings panel
+
+LAYOUTS = {
+
+    'Poisson Disk': poisson_disk,
+    'Hexagonal':    hex_lattice,
+    'Square':       square_lattice,
+}
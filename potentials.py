@@ -0,0 +1,101 @@
+# Oscar Saharoy 2019
+
+import numpy
+
+
+# Soft interactions between balls, used in place of the hard sphere collisions of Balls.compute.
+#
+# A potential is an object with a SCALE, the distance beyond which it has no effect as a multiple of the distance
+# at which two balls touch, and a kernel potential(world, i1, i2, norm, dist, contact, out) which fills OUT with
+# the size of the repulsive force between each pair of balls (I1, I2) - negative for attraction. NORM holds the
+# unit vectors from the first ball of each pair to the second, DIST their distances and CONTACT the distances at
+# which they touch, the sums of their radii. Pairs can be further apart than the reach of the potential, and
+# should get no force. Like the force kernels they work in place on the world's scratch buffers, so evaluating
+# them doesn't allocate.
+#
+# The simulation steps a whole frame at a time, which is coarse for stiff potentials, so each potential also has
+# a LIMIT on the size of the force between a pair. This stops balls which are spawned on top of each other or
+# driven hard together from being flung apart at huge speeds, and has no effect on gentle contacts.
+
+
+class LennardJones(object):
+
+    # Lennard-Jones 12-6 potential V = 4 eps ((s/d)^12 - (s/d)^6), with s set for each pair so that the bottom of
+    # the well is where the balls touch. Gives a gas at high energies and liquid or solid clumps at low ones.
+    #
+    # EPSILON is the depth of the well and CUTOFF is where it is cut off, in units of s.
+
+    def __init__(self, epsilon=0.1, cutoff=2.5, limit=0.5):
+
+        self.epsilon = epsilon
+        self.cutoff  = cutoff
+        self.limit   = limit
+        self.scale   = cutoff / 2**(1/6) # the well is at 2^(1/6) s
+
+
+    def __call__(self, world, i1, i2, norm, dist, contact, out):
+
+        k   = len(out)
+        r6  = world.scratch('r6',  k)
+        cut = world.scratch('cut', k)
+
+        # (s/d)^6 = (contact/d)^6 / 2
+        numpy.divide(contact, dist, out=r6)
+        numpy.power(r6, 6, out=r6)
+        numpy.multiply(r6, 0.5, out=r6)
+
+        # F = 24 eps / d * (2 (s/d)^12 - (s/d)^6)
+        numpy.divide(24*self.epsilon, dist, out=out)
+        numpy.multiply(out, r6, out=out)
+        numpy.multiply(r6, 2, out=r6)
+        numpy.subtract(r6, 1, out=r6)
+        numpy.multiply(out, r6, out=out)
+
+        # no force beyond the cutoff
+        numpy.multiply(contact, self.scale, out=cut)
+        numpy.less(dist, cut, out=cut, casting='unsafe')
+        numpy.multiply(out, cut, out=out)
+
+
+class SpringDashpot(object):
+
+    # Hertzian contact for granular materials - overlapping balls push apart with a spring force k o^(3/2) for
+    # an overlap o, plus a dashpot force proportional to the speed they are approaching at, which takes energy
+    # out of each contact. The dashpot can slow balls moving apart but never pulls them together.
+
+    def __init__(self, stiffness=0.5, damping=0.1, limit=1.0):
+
+        self.stiffness = stiffness
+        self.damping   = damping
+        self.limit     = limit
+        self.scale     = 1
+
+
+    def __call__(self, world, i1, i2, norm, dist, contact, out):
+
+        data = world.data
+        k    = len(out)
+
+        root = world.scratch('root', k)
+        vn   = world.scratch('vn',   k)
+        rel  = world.scratch('rel',  k, (2,))
+        v2   = world.scratch('v2',   k, (2,))
+
+        # overlap o and its square root
+        numpy.subtract(contact, dist, out=out)
+        numpy.maximum(out, 0, out=out)
+        numpy.sqrt(out, out=root)
+
+        # speed the balls are approaching at along the line of centres
+        numpy.take(data.vel, i1, axis=0, out=rel, mode='clip')
+        numpy.take(data.vel, i2, axis=0, out=v2, mode='clip')
+        numpy.subtract(rel, v2, out=rel)
+        numpy.multiply(rel, norm, out=rel)
+        numpy.add(rel[:,0], rel[:,1], out=vn)
+
+        # spring k o sqrt(o) plus dashpot damping * vn * sqrt(o), which grows with the area of contact
+        numpy.multiply(out, self.stiffness, out=out)
+        numpy.multiply(vn, self.damping, out=vn)
+        numpy.add(out, vn, out=out)
+        numpy.multiply(out, root, out=out)
+        numpy.maximum(out, 0, out=out)
@@ -0,0 +1,196 @@
+# Oscar Saharoy 2019
+
+import numpy
+
+from grid import nearest
+
+
+class Query(object):
+
+    # Lookups of the live balls near points - within a distance, inside rectangles or the nearest few - for
+    # things outside the step loop such as picking balls with the mouse, probes and analysis scripts.
+    #
+    # Rather than scanning every ball, the lookups use the grids the step built to find collisions (see
+    # grid.Levels), searching only the cells around each point. Balls have been moved a little since the grids
+    # were built, by the position fix of the collisions, so each search reaches a ball's radius further than it
+    # needs to and the candidates it finds are measured at their current positions. If balls have been added,
+    # removed or moved between slots since the last step the grids are built again first.
+    #
+    # Every lookup takes a batch of points, an (m, 2) array, and returns slots of data, so data.pos[balls] are
+    # their positions and data.ids[balls] their ids. In a periodic world distances are to the nearest image.
+
+    def __init__(self, world):
+
+        self.world = world
+
+
+    def within(self, points, reach, touching=False):
+
+        # Returns arrays (which, balls, dist) with an entry for each ball whose centre is within REACH of one of
+        # POINTS - or, if TOUCHING, each ball which comes within REACH of it. WHICH indexes the points and DIST
+        # is the distance to the ball's centre. Entries are in order of point, then of distance.
+
+        which, balls, offset, dist = self.search(points, reach, touching)
+
+        return which, balls, dist
+
+
+    def box(self, boxes):
+
+        # Returns arrays (which, balls) with an entry for each ball whose centre is inside one of BOXES, an
+        # (m, 4) array of rectangles (x0, y0, x1, y1). WHICH indexes the boxes.
+
+        boxes   = numpy.asarray(boxes, float).reshape(-1, 4)
+
+        centres = (boxes[:,:2] + boxes[:,2:]) / 2
+        half    = numpy.abs(boxes[:,2:] - boxes[:,:2]) / 2
+
+        # the balls in a box are those within its corners of its centre which are within its sides too
+        which, balls, offset, dist = self.search(centres, numpy.hypot(half[:,0], half[:,1]))
+
+        inside = (numpy.abs(offset) <= half[which]).all(axis=1)
+
+        return which[inside], balls[inside]
+
+
+    def nearest(self, points, k=1):
+
+        # Returns (m, K) arrays (balls, dist) of the K balls nearest each of the M POINTS, nearest first. If there
+        # are fewer than K balls the missing entries are -1 with an infinite distance.
+
+        data    = self.world.data
+        points  = numpy.asarray(points, float).reshape(-1, 2)
+        m       = len(points)
+
+        balls   = numpy.full([m, k], -1)
+        dist    = numpy.full([m, k], numpy.inf)
+
+        if data.n == 0 or m == 0:
+            return balls, dist
+
+        # start from the distance which would hold k balls on average, doubling it for the points which haven't
+        # found enough - a search reaching past the corners of the world finds every ball
+        reach   = (k * data.x_res * data.y_res / (numpy.pi * data.n)) ** 0.5
+        longest = numpy.hypot(data.x_res, data.y_res)
+        todo    = numpy.arange(m)
+
+        while len(todo):
+
+            which, found, offset, d = self.search(points[todo], reach)
+
+            counts  = numpy.bincount(which, minlength=len(todo))
+            done    = (counts >= k) | (reach > longest)
+
+            # entries are in order of distance within each point, so the first k of each point are the nearest
+            rank    = numpy.arange(len(which)) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+            keep    = done[which] & (rank < k)
+
+            balls[todo[which[keep]], rank[keep]] = found[keep]
+            dist[todo[which[keep]],  rank[keep]] = d[keep]
+
+            todo    = todo[~done]
+            reach  *= 2
+
+        return balls, dist
+
+
+    def search(self, points, reach, touching=False):
+
+        # Returns arrays (which, balls, offset, dist) of the balls within REACH of POINTS, as for within, with
+        # the offsets from the points to the balls. REACH can be a number or one for each point.
+
+        world   = self.world
+        data    = world.data
+        levels  = world.levels
+
+        points  = numpy.asarray(points, float).reshape(-1, 2)
+        reach   = numpy.broadcast_to(numpy.asarray(reach, float), len(points))
+
+        if world.indexed != world.store.version:
+            levels.build(data.pos, data.radius, data.n, data.x_res, data.y_res, 1, world.walls.periodic)
+            world.indexed = world.store.version
+
+        which   = []
+        balls   = []
+
+        for (start, count, biggest), grid in zip(levels.levels, levels.grids):
+
+            if count == 0:
+                continue
+
+            # balls can have moved up to about a radius since the grid was built
+            extent  = reach + biggest * (2 if touching else 1)
+
+            w, i    = self.cells(grid, points, extent)
+
+            which.append(w)
+            balls.append(levels.member[start + i])
+
+        which   = numpy.concatenate(which) if which else numpy.zeros(0, int)
+        balls   = numpy.concatenate(balls) if balls else numpy.zeros(0, int)
+
+        # measure the candidates at their current positions
+        offset  = data.pos[balls] - points[which]
+
+        if world.walls.periodic:
+            work = numpy.empty(len(offset))
+            nearest(offset[:,0], data.x_res, work)
+            nearest(offset[:,1], data.y_res, work)
+
+        dist    = numpy.hypot(offset[:,0], offset[:,1])
+        limit   = reach[which] + (data.radius[balls] if touching else 0)
+        close   = dist <= limit
+
+        which, balls, offset, dist = which[close], balls[close], offset[close], dist[close]
+
+        order   = numpy.lexsort([dist, which])
+
+        return which[order], balls[order], offset[order], dist[order]
+
+
+    def cells(self, grid, points, extent):
+
+        # Returns arrays (which, balls) pairing each of POINTS with the balls of GRID in the cells within EXTENT
+        # of it, as indices into the grid's balls. Unlike Grid.query the extent can be any size - the cells are
+        # searched ring by ring out to the furthest any point needs.
+
+        nx, ny  = grid.w - 2, grid.h - 2 # cells inside the border
+        slots   = grid.slots
+        table   = grid.table[:-1].reshape(-1, slots)
+
+        cells   = numpy.floor(points / grid.cell_size).astype(int)
+
+        if not grid.periodic:
+            numpy.clip(cells, 0, [nx-1, ny-1], out=cells)
+
+        # rings of cells needed by each point, and by the furthest reaching point
+        rings   = numpy.ceil(extent[:,None] / grid.cell_size).astype(int)
+        kx, ky  = rings.max(axis=0) if len(rings) else (0, 0)
+
+        # a periodic grid narrower than the search is searched once right round
+        dxs     = range(-kx, -kx + min(2*kx+1, nx)) if grid.periodic else range(-kx, kx+1)
+        dys     = range(-ky, -ky + min(2*ky+1, ny)) if grid.periodic else range(-ky, ky+1)
+
+        which   = []
+        balls   = []
+
+        for dy in dys:
+            for dx in dxs:
+
+                # points whose search reaches this cell
+                near    = (abs(dx) <= rings[:,0]) & (abs(dy) <= rings[:,1])
+                cx, cy  = cells[:,0] + dx, cells[:,1] + dy
+
+                if grid.periodic:
+                    cx, cy = cx % nx, cy % ny
+                else:
+                    near  &= (cx >= 0) & (cx < nx) & (cy >= 0) & (cy < ny)
+
+                index   = numpy.flatnonzero(near)
+                found   = table[(cy[index] + 1) * grid.w + cx[index] + 1]
+
+                filled  = found >= 0
+                which.append(numpy.repeat(index, filled.sum(axis=1)))
+                balls.append(found[filled])
+
+        return numpy.concatenate(which), numpy.concatenate(balls)
@@ -0,0 +1,93 @@
+# Oscar Saharoy 2019
+
+import numpy
+
+
+def hex_colour(hex):
+
+    # '#rrggbb' -> (r, g, b)
+    return (int('0x'+hex[1:3], 0), int('0x'+hex[3:5], 0), int('0x'+hex[5:7], 0))
+
+
+class Species(object):
+
+    # Kinds of ball which behave differently when they hit each other, eg. steel and rubber. The kind of each
+    # ball is its entry in data.species.
+    #
+    # For each pair of species there is a restitution, which multiplies data.rest, and a coefficient of friction.
+    # These are kept in S x S tables which are gathered for every contact in Balls.compute. New balls are given a
+    # species at random in proportion to the species' fractions, and each species can have its own base colour
+    # which takes the place of data.hex in the colours of its balls.
+
+    def __init__(self):
+
+        self.names     = []                 # name of each species, in order of id
+        self.colours   = []                 # hex base colour of each species, or None to use data.hex
+        self.fractions = numpy.zeros(0)     # share of new balls given each species
+        self.rest      = numpy.zeros([0, 0]) # restitution for each pair of species
+        self.friction  = numpy.zeros([0, 0]) # friction for each pair of species
+
+
+    def add(self, name, colour=None, fraction=1.0, rest=1.0, friction=0.0):
+
+        # Adds a species and returns its id. REST and FRICTION are for collisions between two balls of this
+        # species - with balls of other species they start as the geometric means of the two species' own
+        # values, and can be changed with pair.
+
+        s             = len(self.names)
+
+        self.rest     = self.grow(self.rest,     rest)
+        self.friction = self.grow(self.friction, friction)
+
+        self.names.append(name)
+        self.colours.append(colour)
+        self.fractions = numpy.append(self.fractions, fraction)
+
+        return s
+
+
+    def pair(self, a, b, rest=None, friction=None):
+
+        # Sets the restitution and friction for collisions between species A and B, given by name or id.
+
+        a = self.id(a)
+        b = self.id(b)
+
+        if rest is not None:
+            self.rest[a,b] = self.rest[b,a] = rest
+
+        if friction is not None:
+            self.friction[a,b] = self.friction[b,a] = friction
+
+
+    def grow(self, table, own):
+
+        # Returns TABLE with a row and column added for a new species whose value with its own kind is OWN.
+
+        s          = len(table)
+        new        = numpy.empty([s+1, s+1])
+        new[:s,:s] = table
+
+        new[s,:]   = new[:,s] = numpy.sqrt(numpy.append(table.diagonal(), own) * own)
+
+        return new
+
+
+    def id(self, species):
+
+        return self.names.index(species) if isinstance(species, str) else species
+
+
+    def pick(self, count):
+
+        # Returns random species for COUNT new balls, in proportion to the fractions.
+
+        return numpy.random.choice(len(self.names), count, p=self.fractions / self.fractions.sum())
+
+
+    def base_colours(self, default):
+
+        # Returns an (S, 3) array of the base colour of each species - species without their own colour use
+        # the hex colour DEFAULT.
+
+        return numpy.array([hex_colour(colour or default) for colour in self.colours], float)
@@ -0,0 +1,156 @@
+# Oscar Saharoy 2019
+
+import numpy
+
+
+SERIES        = ['Temperature', 'Energy', 'Momentum', 'Pressure'] # the scalar estimates recorded in the world's metrics
+DISTRIBUTIONS = ['Speeds', 'g(r)']                                # the distributions returned by Stats.plot
+
+
+class Stats(object):
+
+    # Running estimates of the thermodynamic state of the balls, for plotting while the simulation runs.
+    #
+    # Working the statistics out over every ball every step would cost as much as the step itself at large n, so
+    # each step only looks at a fixed number of balls - the next CHUNK of them, going round all the balls in turn
+    # - and folds what it sees into exponential moving averages which forget old steps at the rate SMOOTHING.
+    # The cost per step stays the same however many balls there are, and with the balls in a different order
+    # each pass (see Balls.tidy) the chunks are a fair sample.
+    #
+    # The estimates, in units where Boltzmann's constant and the mass of an average ball are 1, are
+    #
+    #     temperature  mean kinetic energy of a ball, which is kT in 2d
+    #     energy       total kinetic energy
+    #     momentum     total momentum (x, y)
+    #     pressure     force on the walls per unit length of them, from the impulses of wall hits
+    #     speeds       distribution of the speeds of the balls, over SPEED_BINS bins from 0 to SPEED_RANGE
+    #     rdf          radial distribution function g(r) around the first PROBES balls of each chunk, over RDF_BINS
+    #                  bins out to RDF_RANGE average diameters
+    #
+    # Each step the scalar estimates are recorded in the world's metrics (see metrics.Metrics) under the names
+    # in SERIES.
+
+    def __init__(self, world, chunk=256, probes=16, smoothing=0.05,
+                 speed_bins=32, speed_range=4.0, rdf_bins=32, rdf_range=4.0):
+
+        self.world       = world
+        self.enabled     = False
+
+        self.chunk       = chunk
+        self.probes      = probes
+        self.smoothing   = smoothing
+
+        self.speed_edges = numpy.linspace(0, speed_range, speed_bins+1)
+        self.rdf_edges   = numpy.linspace(0, rdf_range,   rdf_bins+1)
+
+        self.temperature = 0.0
+        self.energy      = 0.0
+        self.momentum    = numpy.zeros(2)
+        self.pressure    = 0.0
+        self.speeds      = numpy.zeros(speed_bins)
+        self.rdf         = numpy.zeros(rdf_bins)
+
+        self.steps       = 0 # steps seen
+        self.cursor      = 0 # slot of the next ball to look at
+        self.impulse     = 0 # impulse on the walls in the last step
+
+
+    def enable(self, enabled=True):
+
+        # Turns the statistics on or off - while they are on the step records wall hits for the pressure.
+
+        events = self.world.events
+
+        if enabled and not self.enabled:
+            events.subscribe(self.hits)
+
+        if self.enabled and not enabled:
+            events.unsubscribe(self.hits)
+
+        self.enabled = enabled
+
+
+    def hits(self, events):
+
+        self.impulse = events.hits.impulse.sum()
+
+
+    def update(self):
+
+        # Folds the next chunk of balls into the estimates - called after each step while enabled.
+
+        world = self.world
+        data  = world.data
+        n     = data.n
+        a     = self.smoothing
+
+        self.steps += 1
+
+        if n == 0:
+            return
+
+        # the next chunk of balls, wrapping round to the start
+        balls       = (self.cursor + numpy.arange(min(self.chunk, n))) % n
+        self.cursor = (self.cursor + len(balls)) % n
+
+        mass        = data.mass[balls]
+        vel         = data.vel[balls]
+        speed       = numpy.hypot(vel[:,0], vel[:,1])
+
+        kinetic     = 0.5 * (mass * speed * speed).mean()
+        momentum    = (mass[:,None] * vel).mean(axis=0)
+
+        self.temperature += a * (kinetic - self.temperature)
+        self.energy       = self.temperature * n
+        self.momentum    += a * (momentum * n - self.momentum)
+
+        # pressure is the average force on the walls over their length
+        length = world.walls.perimeter
+
+        if length:
+            self.pressure += a * (self.impulse / length - self.pressure)
+
+        # fraction of the balls in each speed bin, over the width of the bins
+        counts       = numpy.histogram(numpy.minimum(speed, self.speed_edges[-1]), self.speed_edges)[0]
+        self.speeds += a * (counts / len(balls) / numpy.diff(self.speed_edges) - self.speeds)
+
+        self.update_rdf(balls[:self.probes])
+
+        values = [self.temperature, self.energy, numpy.hypot(*self.momentum), self.pressure]
+
+        for name, value in zip(SERIES, values):
+            world.metrics.record(name, value)
+
+
+    def update_rdf(self, probes):
+
+        # g(r) is the number of balls at each distance from a ball, over the number there would be at that
+        # distance if the balls were spread evenly - found from the neighbours of a few probe balls.
+
+        world   = self.world
+        data    = world.data
+
+        d       = 2 * data.r
+        edges   = self.rdf_edges * d
+
+        which, balls, dist = world.query.within(data.pos[probes], edges[-1])
+
+        # leave out each probe itself
+        dist    = dist[balls != probes[which]]
+
+        counts  = numpy.histogram(dist, edges)[0]
+        shells  = numpy.pi * (edges[1:]**2 - edges[:-1]**2)
+        density = data.n / (data.x_res * data.y_res)
+
+        self.rdf += self.smoothing * (counts / len(probes) / (shells * density) - self.rdf)
+
+
+    def plot(self, name):
+
+        # Returns the points of the distribution called NAME for a gooey.Graph - the current speed distribution or
+        # rdf against the middles of their bins. The history of the scalar estimates is in the world's metrics.
+
+        if name == 'Speeds':
+            return numpy.column_stack([(self.speed_edges[1:] + self.speed_edges[:-1]) / 2, self.speeds])
+
+        return numpy.column_stack([(self.rdf_edges[1:] + self.rdf_edges[:-1]) / 2, self.rdf])
@@ -0,0 +1,192 @@
+# Oscar Saharoy 2019
+
+import numpy
+
+
+class Store(object):
+
+    # Growable storage for the per-ball arrays kept on a Data object (data.pos, data.vel, ...).
+    #
+    # Each array is allocated with spare capacity (data.max_n rows) of which the first data.n are live balls.
+    # When the capacity runs out every array doubles in size, so adding balls is amortised O(1), and balls are
+    # removed by moving the last live balls into the freed slots, so removal is O(1) per ball and the live
+    # balls always stay packed at the front of the arrays.
+    #
+    # Because balls move between slots, each ball is also given a stable id when it is added:
+    #
+    #     data.ids[slot] is the id of the ball in a slot
+    #     data.slot[id]  is the slot of the ball with an id, or -1 if it has been removed
+    #
+    # Ids of removed balls are recycled by later additions. Anything which needs to follow a ball for longer than
+    # a step, eg. a recording, should hold on to its id rather than its slot. Anything which keeps slots, eg. an
+    # index of the balls, can tell whether they are still valid from the version, which changes whenever
+    # balls are added, removed or moved between slots.
+
+    def __init__(self, data, capacity=16):
+
+        self.data   = data
+        self.fields = {} # name -> (trailing shape, dtype, init) for each per-ball array
+
+        data.max_n  = capacity # number of balls which fit in the arrays
+        data.n      = 0        # number of live balls
+
+        data.ids    = numpy.zeros(capacity, int)    # slot -> id
+        data.slot   = numpy.full(capacity, -1, int) # id -> slot
+
+        # stack of ids freed by removals, and the lowest id which has never been used
+        self.free   = numpy.zeros(capacity, int)
+        self.nfree  = 0
+        self.new_id = 0
+
+        self.version = 0
+
+
+    def register(self, name, shape=(), dtype=float, init=0):
+
+        # Adds a per-ball array called NAME to data, with SHAPE the shape of each ball's entry.
+        # INIT is either a value to fill the entries of new balls with or a function taking the number of new
+        # balls and returning their initial entries.
+
+        data = self.data
+
+        self.fields[name] = (tuple(shape), dtype, init)
+        setattr(data, name, numpy.zeros((data.max_n,) + tuple(shape), dtype))
+
+
+    def reserve(self, capacity):
+
+        # Makes sure the arrays can hold CAPACITY balls, at least doubling their size if they need to grow.
+
+        data = self.data
+
+        if capacity <= data.max_n:
+            return
+
+        new_max = max(capacity, data.max_n*2)
+
+        # copy the live part of each array into a larger one
+        for name, (shape, dtype, _) in self.fields.items():
+
+            array          = numpy.zeros((new_max,) + shape, dtype)
+            array[:data.n] = getattr(data, name)[:data.n]
+            setattr(data, name, array)
+
+        data.ids   = numpy.concatenate([data.ids, numpy.zeros(new_max-data.max_n, int)])
+        data.max_n = new_max
+
+
+    def add(self, count, **values):
+
+        # Adds COUNT balls and returns their ids. Keyword arguments give the initial entries of the new balls
+        # for any of the registered arrays, eg. store.add(10, pos=spawn_points, vel=[0, 1]) - other arrays are
+        # initialised as given to register.
+
+        data  = self.data
+
+        self.reserve(data.n + count)
+
+        slots = numpy.arange(data.n, data.n + count)
+
+        for name, (shape, dtype, init) in self.fields.items():
+
+            array = getattr(data, name)
+
+            if name in values:
+                array[slots] = values.pop(name)
+
+            elif callable(init):
+                array[slots] = init(count)
+
+            else:
+                array[slots] = init
+
+        if values:
+            raise KeyError('no per-ball arrays called ' + ', '.join(values))
+
+        # take ids from the free stack first, then new ones
+        reuse = min(count, self.nfree)
+        ids   = numpy.concatenate([self.free[self.nfree-reuse:self.nfree], numpy.arange(self.new_id, self.new_id+count-reuse)])
+
+        self.nfree  -= reuse
+        self.new_id += count - reuse
+
+        # grow the id -> slot table if new ids have run past the end of it
+        if self.new_id > len(data.slot):
+            extra     = max(self.new_id, len(data.slot)*2) - len(data.slot)
+            data.slot = numpy.concatenate([data.slot, numpy.full(extra, -1, int)])
+
+        data.ids[slots] = ids
+        data.slot[ids]  = slots
+        data.n         += count
+        self.version   += 1
+
+        return ids
+
+
+    def remove(self, ids):
+
+        # Removes the balls with the given ids. Ids of balls which have already been removed are ignored.
+        # To remove balls by slot, eg. from a mask over the live balls, use store.remove(data.ids[slots]).
+
+        data  = self.data
+
+        ids   = numpy.unique(numpy.asarray(ids, int))
+        slots = data.slot[ids]
+        ids   = ids[slots >= 0]
+        slots = slots[slots >= 0]
+
+        n     = data.n - len(slots)
+
+        # slots freed inside the new live range are filled by the live balls beyond it
+        holes  = slots[slots < n]
+        tail   = numpy.ones(data.n - n, bool)
+        tail[slots[slots >= n] - n] = False
+        movers = n + numpy.nonzero(tail)[0]
+
+        for name in self.fields:
+            array        = getattr(data, name)
+            array[holes] = array[movers]
+
+        data.ids[holes]            = data.ids[movers]
+        data.slot[data.ids[holes]] = holes
+        data.slot[ids]             = -1
+        data.n                     = n
+
+        # push the removed ids onto the free stack
+        if self.nfree + len(ids) > len(self.free):
+            self.free = numpy.concatenate([self.free, numpy.zeros(max(len(ids), len(self.free)), int)])
+
+        self.free[self.nfree:self.nfree+len(ids)] = ids
+        self.nfree   += len(ids)
+        self.version += 1
+
+
+    def resize(self, count):
+
+        # Adds or removes balls so that there are COUNT of them - removing the balls in the last slots, which after a
+        # removal or a permute needn't be the ones placed most recently.
+
+        data = self.data
+
+        if count > data.n:
+            self.add(count - data.n)
+
+        elif count < data.n:
+            self.remove(data.ids[count:data.n])
+
+
+    def permute(self, order):
+
+        # Rearranges the live balls so that the ball in slot order[i] moves to slot i, eg. to sort them in memory.
+        # Each ball keeps its id, and data.slot is updated to match.
+
+        data = self.data
+        n    = data.n
+
+        for name in self.fields:
+            array     = getattr(data, name)
+            array[:n] = array[order]
+
+        data.ids[:n]            = data.ids[order]
+        data.slot[data.ids[:n]] = numpy.arange(n)
+        self.version           += 1
@@ -0,0 +1,39 @@
+# Oscar Saharoy 2019
+
+import os, sys, tkinter, functools, pytest
+
+# the modules live at the top of the repository rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gooey
+
+
+@pytest.fixture
+def tcl(monkeypatch):
+
+    # a Tcl interpreter without Tk standing in for a root window, so gooey widgets can be made without a display.
+    # Each widget is a command recording the arguments of each call, which root.calls returns, and create returns
+    # a new id
+    root = tkinter.Tcl()
+    root.tk.eval('''
+        set calls {}
+        set made  0
+        proc record {path what args} {lappend ::calls [list $path $what {*}$args]; if {$what eq "create"} {incr ::made}}
+        foreach kind {canvas toplevel} {proc $kind {path args} {interp alias {} $path {} record $path; return $path}}
+        foreach command {bind wm pack} {proc $command args {}}
+        proc winfo {what args} {switch $what {width {return 400} height {return 300} default {return 1}}}''')
+
+    monkeypatch.setattr(gooey, 'Font', lambda **kw: kw['family'])
+
+    root.calls = functools.partial(calls, root)
+
+    return root
+
+
+def calls(root, what=None):
+
+    # the calls made to widgets since the last time, of the subcommand WHAT or all of them
+    tk    = root.tk
+    made  = [tk.splitlist(call) for call in tk.splitlist(tk.eval('lindex [list $::calls [set ::calls {}]] 0'))]
+
+    return [call for call in made if what in (None, call[1])]
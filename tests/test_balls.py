@@ -0,0 +1,197 @@
+# Oscar Saharoy 2019
+
+import random, numpy, pytest, balls
+
+
+def world(radius, number, seed=2):
+
+    # Returns a headless world of NUMBER balls of RADIUS in a 400 x 400 box, the same on every machine.
+
+    numpy.random.seed(seed)
+    random.seed(seed)
+
+    world = balls.Balls(headless=True, resolution=(400, 400))
+    world.set_sizes(radius, 1)
+    world.store.resize(number)
+
+    return world
+
+
+def energy(world):
+
+    # Kinetic plus gravitational potential energy of the balls, measured up from the bottom of the window.
+
+    data = world.data
+    n    = data.n
+
+    kinetic   = 0.5 * (data.mass[:n] * (data.vel[:n]**2).sum(axis=1)).sum()
+    potential = (data.mass[:n] * data.g * (data.y_res - data.pos[:n,1])).sum()
+
+    return kinetic + potential
+
+
+@pytest.mark.parametrize('radius, number', [(12, 200), (14, 150)])
+def test_packed_collisions_keep_energy(radius, number):
+
+    # balls packed into over half of the box used to gain energy without limit from their contacts being
+    # resolved all at once
+
+    w     = world(radius, number)
+    start = energy(w)
+
+    for _ in range(800):
+        w.step()
+
+    assert energy(w) < 1.1 * start
+    assert numpy.abs(w.data.vel[:w.data.n]).max() < 5
+
+
+def test_packed_step_does_not_allocate():
+
+    w = world(12, 200)
+    w.data.check_alloc = True
+
+    for _ in range(50):
+        w.step()
+
+    assert w.data.step_alloc <= w.data.alloc_limit
+
+
+def panel(world):
+
+    # a Panel with just what pushing changes into the world needs, so it can be used without a display
+    panel         = balls.Panel.__new__(balls.Panel)
+    panel.parent  = world
+    panel.data    = world.data
+    panel.changes = {}
+    panel.labels  = {name: {} for name in ('g', 'rest', 'r', 'spread', 'n', 'hue_v', 'val_v')}
+
+    return panel
+
+
+def test_panel_pushes_a_burst_of_changes_once_tk_is_idle(tcl):
+
+    world   = balls.Balls(headless=True, resolution=(400, 400))
+    data    = world.data
+    n, g    = data.n, data.g
+
+    control = panel(world)
+    control.tk, control._w, control.master, control._tclCommands = tcl.tk, '.', None, None
+
+    control.changed('g', 0.02)
+    control.changed('g', 0.03)
+    control.changed('rest', 0.5)
+
+    assert data.g == g
+
+    tcl.tk.eval('update')
+
+    assert (data.g, data.rest, data.n) == (0.03, 0.5, n) and not control.changes
+    assert control.labels['g']['text'] == '0.03' and control.labels['rest']['text'] == '0.5'
+    assert not control.labels['r'] and not control.labels['n']
+
+
+def test_panel_grows_a_mixture_of_sizes_past_the_starting_capacity():
+
+    numpy.random.seed(8)
+    random.seed(8)
+
+    world = balls.Balls(headless=True, resolution=(400, 400))
+    data  = world.data
+    start = data.max_n
+
+    control = panel(world)
+    control.changes = {'n': data.n_limit, 'r': 3, 'spread': 4}
+    control.push()
+
+    radius = data.radius[:data.n]
+
+    assert data.n == data.n_limit > 10 * start
+    assert radius.max() / radius.min() > 3 and numpy.isclose(data.spread, 4)
+    assert control.labels['n']['text'] == str(data.n_limit)
+
+    world.step()
+
+
+def test_ball_count_scale_reaches_the_ui_limit():
+
+    tkinter = pytest.importorskip('tkinter')
+
+    world = balls.Balls(headless=True, resolution=(400, 400))
+
+    try:
+        control = balls.Panel(world, world.data)
+    except tkinter.TclError:
+        pytest.skip('no display')
+
+    assert control.number_scale.gooey_kw['to'] == world.data.n_limit > world.data.max_n
+
+    control.destroy()
+
+
+def jumbled(number=2500, seed=9):
+
+    # a world of small balls stored in a random order, checked for jumbling every step
+
+    w = world(2, number, seed)
+    w.store.permute(numpy.random.permutation(number))
+    w.data.sort_every = 1
+
+    return w
+
+
+def gap(world):
+
+    # how far apart in memory the two balls of the last step's pairs are on average
+    levels = world.levels
+
+    return numpy.abs(levels.i1[:levels.npairs] - levels.i2[:levels.npairs]).mean()
+
+
+def test_sorting_balls_keeps_their_ids_and_brings_neighbours_together():
+
+    w     = jumbled()
+    data  = w.data
+    n     = data.n
+
+    w.step()
+
+    before = gap(w)
+    where  = data.pos[data.slot[:n]].copy() # position of each id
+
+    w.reorder()
+
+    assert numpy.array_equal(data.pos[data.slot[:n]], where)
+
+    w.step()
+
+    assert gap(w) < before / 10
+
+
+def test_balls_are_sorted_again_only_once_they_are_jumbled():
+
+    # with only a few hundred pairs the gap wanders by a few times from step to step, and being shuffled makes
+    # it worse by a factor of about 50
+    w     = jumbled()
+    sorts = []
+    sort  = w.reorder
+
+    w.data.sort_factor = 10
+
+    def reorder():
+        sorts.append(w.steps)
+        sort()
+
+    w.reorder = reorder
+
+    for _ in range(5):
+        w.step()
+
+    assert len(sorts) == 1
+
+    w.store.permute(numpy.random.permutation(w.data.n))
+
+    for _ in range(3):
+        w.step()
+
+    assert len(sorts) == 2
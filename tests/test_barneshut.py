@@ -0,0 +1,119 @@
+# Oscar Saharoy 2019
+
+import random, time, numpy, pytest, balls
+from barneshut import BarnesHut
+
+
+def world(n, seed=0):
+
+    # a world of N balls scattered over a square about 8 balls across per 100 balls
+    side = 60 * n**0.5
+
+    w    = balls.Balls(headless=True, resolution=(int(side), int(side)))
+    w.store.resize(n)
+
+    rng  = numpy.random.RandomState(seed)
+    w.data.pos[:n]  = rng.rand(n, 2) * side
+    w.data.mass[:n] = rng.rand(n) + 0.5
+
+    return w
+
+
+def direct(data, soft):
+
+    pos, mass = data.pos[:data.n], data.mass[:data.n]
+
+    d = pos[None,:,:] - pos[:,None,:]
+    q = 1 / ((d**2).sum(axis=2) + soft**2)
+
+    return ((mass[None,:] * q**1.5)[:,:,None] * d).sum(axis=1)
+
+
+def test_zero_theta_is_direct_summation():
+
+    w   = world(400)
+    acc = numpy.zeros([400, 2])
+
+    BarnesHut(theta=0, soft=4)(w, acc)
+
+    assert numpy.allclose(acc, direct(w.data, 4))
+
+
+def test_default_theta_is_close_to_direct_summation():
+
+    w   = world(2000)
+    acc = numpy.zeros([2000, 2])
+
+    BarnesHut(soft=4)(w, acc)
+
+    # where the pulls on a ball nearly cancel its own error can be as big as what's left, so the errors are
+    # compared with the typical pull
+    exact = direct(w.data, 4)
+    error = numpy.hypot(*(acc - exact).T)
+    pull  = numpy.hypot(*exact.T)
+
+    assert numpy.median(error / pull) < 0.03
+    assert error.max() < 0.1 * numpy.sqrt((pull**2).mean())
+
+
+def test_cost_grows_as_n_log_n():
+
+    # going from 2,000 to 16,000 balls would cost 64 times as much summing every pair, and about 10 times as
+    # much for n log n - the best of a few steps leaves some slack for a busy machine
+
+    def cost(n):
+
+        w     = world(n)
+        acc   = numpy.zeros([n, 2])
+        force = BarnesHut()
+        force(w, acc)
+
+        times = []
+
+        for _ in range(3):
+            t = time.perf_counter()
+            force(w, acc)
+            times.append(time.perf_counter() - t)
+
+        return min(times)
+
+    assert cost(16000) < 24 * cost(2000)
+
+
+class Recording(BarnesHut):
+
+    # records the (leaf, node) pairs treated as point masses
+
+    def pull(self, world, far, sinks, nodes, dx, dy, soft):
+
+        self.pulled.append((self.ls[sinks[far]], self.start[nodes[far]], self.count[nodes[far]]))
+
+        return BarnesHut.pull(self, world, far, sinks, nodes, dx, dy, soft)
+
+
+@pytest.mark.parametrize('theta', [0.7, 1.2, 2.0])
+def test_nodes_holding_a_leaf_are_never_far(theta):
+
+    w     = world(3000)
+    force = Recording(theta=theta)
+    force.pulled = []
+
+    force(w, numpy.zeros([3000, 2]))
+
+    for first, start, count in force.pulled:
+        assert not ((start <= first) & (first < start + count)).any()
+
+
+def test_mutual_gravity_passes_the_allocation_check():
+
+    numpy.random.seed(1)
+    random.seed(1)
+
+    w = balls.Balls(headless=True, resolution=(400, 400))
+    w.forces.toggle('Mutual')
+    w.data.check_alloc = True
+
+    for _ in range(20):
+        w.step()
+
+    assert w.data.step_alloc <= w.data.alloc_limit
@@ -0,0 +1,98 @@
+# Oscar Saharoy 2019
+
+import random, numpy, balls
+
+
+def empty_world():
+
+    # a world without gravity and with its starting balls taken out
+    numpy.random.seed(6)
+    random.seed(6)
+
+    world = balls.Balls(headless=True, resolution=(400, 400))
+    world.forces.toggle('Gravity')
+    world.store.remove(world.data.ids[:world.data.n])
+
+    return world
+
+
+class Log(object):
+
+    # subscriber which copies the events of each step
+    def __init__(self):
+        self.collisions, self.hits = [], []
+
+    def __call__(self, events):
+        self.collisions += zip(events.collisions.id1, events.collisions.id2, events.collisions.impulse,
+                               events.collisions.x, events.collisions.y)
+        self.hits       += zip(events.hits.id, events.hits.impulse, events.hits.x, events.hits.y)
+
+
+def test_head_on_collision():
+
+    world = empty_world()
+    data  = world.data
+    log   = Log()
+
+    ids   = world.store.add(2, radius=[10, 10], pos=[[150, 200], [250, 200]], vel=[[3, 0], [-3, 0]])
+    world.events.subscribe(log)
+
+    for _ in range(30):
+        world.step()
+
+    assert len(log.collisions) == 1 and not log.hits
+
+    id1, id2, impulse, x, y = log.collisions[0]
+    mass                    = data.mass[data.slot[ids[0]]]
+
+    assert {id1, id2} == set(ids)
+    assert numpy.isclose(impulse, 6 * mass)
+    assert numpy.isclose(y, 200) and abs(x - 200) < 3
+    assert numpy.allclose(data.vel[data.slot[ids]], [[-3, 0], [3, 0]])
+
+
+def test_wall_hit():
+
+    world = empty_world()
+    data  = world.data
+    log   = Log()
+
+    ids   = world.store.add(1, radius=[10], pos=[[200, 370]], vel=[[0, 4]])
+    world.events.subscribe(log)
+
+    for _ in range(30):
+        world.step()
+
+    assert len(log.hits) == 1 and not log.collisions
+
+    id, impulse, x, y = log.hits[0]
+
+    assert id == ids[0]
+    assert numpy.isclose(impulse, 8 * data.mass[data.slot[id]])
+    assert abs(x - 200) < 1e-9 and abs(y - 400) < 5
+
+
+def test_nothing_is_recorded_without_subscribers():
+
+    world = empty_world()
+    world.store.add(2, radius=[10, 10], pos=[[150, 200], [250, 200]], vel=[[3, 0], [-3, 0]])
+
+    for _ in range(30):
+        world.step()
+
+    assert len(world.events.collisions) == 0 and len(world.events.hits) == 0
+
+
+def test_recording_does_not_allocate():
+
+    numpy.random.seed(7)
+    random.seed(7)
+
+    world = balls.Balls(headless=True, resolution=(400, 400))
+    world.store.resize(300)
+    world.events.subscribe(Log())
+    world.data.check_alloc = True
+
+    for _ in range(20):
+        world.step()
+        assert world.data.step_alloc <= world.data.alloc_limit
@@ -0,0 +1,168 @@
+# Oscar Saharoy 2019
+
+import struct, zlib, threading, numpy, pytest
+
+pytest.importorskip('pygame')
+
+import export, balls
+
+
+def lzw_decode(data, min_size=8):
+
+    # reads the codes least significant bit first, as gif lays them out, growing the code width when the table fills
+    clear, end = 1 << min_size, (1 << min_size) + 1
+
+    out, acc, bits, pos = bytearray(), 0, 0, 0
+    size, table, prev   = min_size + 1, None, None
+
+    while True:
+
+        while bits < size:
+            acc  |= data[pos] << bits
+            bits += 8
+            pos  += 1
+
+        code  = acc & ((1 << size) - 1)
+        acc >>= size
+        bits -= size
+
+        if code == clear:
+            size, prev = min_size + 1, None
+            table      = [bytes([i]) for i in range(clear)] + [b'', b'']
+            continue
+
+        if code == end:
+            return bytes(out)
+
+        entry = table[code] if code < len(table) else prev + prev[:1]
+        out  += entry
+
+        if prev is not None:
+            table.append(prev + entry[:1])
+
+        if len(table) == 1 << size and size < 12:
+            size += 1
+
+        prev = entry
+
+
+def gif_frame(frame):
+
+    # returns the width, height and pixel indices of a frame made by export.encode_gif
+    assert frame[:3] == b'\x21\xf9\x04' and frame[8] == 0x2c and frame[-1] == 0
+
+    w, h = struct.unpack('<HH', frame[13:17])
+    data = frame[19:]
+    pos  = 0
+
+    assert frame[18] == 8
+
+    blocks = b''
+    while data[pos]:
+        blocks += data[pos+1:pos+1+data[pos]]
+        pos    += 1 + data[pos]
+
+    assert pos == len(data) - 1
+
+    return w, h, lzw_decode(blocks)
+
+
+@pytest.mark.parametrize('indices', [bytes([7]),
+                                     bytes(range(256)),
+                                     bytes(20000),
+                                     numpy.random.default_rng(3).integers(0, 5, 60000).astype(numpy.uint8).tobytes(),
+                                     numpy.random.default_rng(4).integers(0, 256, 30000).astype(numpy.uint8).tobytes()])
+def test_lzw_round_trip(indices):
+
+    assert lzw_decode(export.lzw_encode(indices)) == indices
+
+
+def test_gif_frame_decodes_to_nearest_palette_colours():
+
+    w, h   = 37, 23
+    pixels = numpy.random.default_rng(5).integers(0, 256, (h, w, 3)).astype(numpy.uint8)
+
+    fw, fh, indices = gif_frame(export.encode_gif(pixels.tobytes(), w, h, 4))
+
+    palette = numpy.frombuffer(export.GIF_PALETTE, numpy.uint8).reshape(-1, 3)
+    colours = palette[numpy.frombuffer(indices, numpy.uint8)].reshape(h, w, 3)
+    steps   = 255 / (export.GIF_LEVELS - 1)
+
+    assert (fw, fh) == (w, h)
+    assert (numpy.abs(colours.astype(int) - pixels) <= steps/2 + 1).all()
+
+
+def test_png_round_trip():
+
+    w, h   = 19, 11
+    pixels = numpy.random.default_rng(6).integers(0, 256, (h, w, 3)).astype(numpy.uint8)
+    png    = export.encode_png(pixels.tobytes(), w, h)
+
+    assert png[:8] == b'\x89PNG\r\n\x1a\n'
+
+    chunks, pos = {}, 8
+    while pos < len(png):
+        length, = struct.unpack('>I', png[pos:pos+4])
+        tag     = png[pos+4:pos+8]
+        body    = png[pos+8:pos+8+length]
+        crc,    = struct.unpack('>I', png[pos+8+length:pos+12+length])
+
+        assert crc == zlib.crc32(tag + body) & 0xffffffff
+
+        chunks[tag] = body
+        pos        += 12 + length
+
+    assert list(chunks) == [b'IHDR', b'IDAT', b'IEND']
+    assert struct.unpack('>IIBBBBB', chunks[b'IHDR']) == (w, h, 8, 2, 0, 0, 0)
+
+    rows = numpy.frombuffer(zlib.decompress(chunks[b'IDAT']), numpy.uint8).reshape(h, w*3+1)
+
+    assert (rows[:,0] == 0).all()
+    assert (rows[:,1:].reshape(h, w, 3) == pixels).all()
+
+
+def broken(*args):
+
+    raise ValueError('cannot encode')
+
+
+def finishes(exporter):
+
+    # runs EXPORTER in a thread and returns the error it raised, failing if it doesn't finish
+    result = []
+
+    def run():
+        try:
+            exporter.run()
+        except Exception as error:
+            result.append(error)
+        else:
+            result.append(None)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(60)
+
+    assert not thread.is_alive(), 'export hung'
+
+    return result[0]
+
+
+def test_export_fails_when_the_path_cannot_be_written(tmp_path):
+
+    world    = balls.Balls(headless=True, resolution=(64, 48))
+    exporter = export.Exporter(world, 'raw', str(tmp_path / 'missing' / 'out.raw'), frames=20, backlog=2)
+
+    assert isinstance(finishes(exporter), FileNotFoundError)
+
+
+def test_export_fails_when_a_frame_cannot_be_encoded(tmp_path, monkeypatch):
+
+    monkeypatch.setattr(export, 'encode_png', broken)
+
+    world    = balls.Balls(headless=True, resolution=(64, 48))
+    exporter = export.Exporter(world, 'png', str(tmp_path), frames=20, workers=2, backlog=2)
+
+    error    = finishes(exporter)
+
+    assert isinstance(error, ValueError) and str(error) == 'cannot encode'
@@ -0,0 +1,84 @@
+# Oscar Saharoy 2019
+
+import random, numpy, balls
+
+
+def world(number=100, seed=3):
+
+    numpy.random.seed(seed)
+    random.seed(seed)
+
+    world = balls.Balls(headless=True, resolution=(400, 400))
+    world.store.resize(number)
+
+    return world
+
+
+def only(world, *names):
+
+    # switches on just the forces NAMES and returns the acceleration they give each ball, leaving the
+    # velocities as they were
+
+    for name, force in world.forces.fields.items():
+        force.enabled = name in names
+
+    data   = world.data
+    before = data.vel[:data.n].copy()
+
+    world.forces.apply()
+
+    acc = data.vel[:data.n] - before
+    data.vel[:data.n] = before
+
+    return acc
+
+
+def test_forces_which_are_off_do_nothing():
+
+    assert not only(world()).any()
+
+
+def test_toggle_switches_a_force_on_and_off():
+
+    w = world()
+
+    assert w.forces.toggle('Drag') is True
+    assert w.forces.fields['Drag'].enabled
+    assert w.forces.toggle('Drag') is False
+
+
+def test_forces_add_up():
+
+    w       = world()
+    gravity = only(w, 'Gravity')
+    drag    = only(w, 'Drag')
+
+    assert numpy.allclose(gravity[:,1], w.data.g) and not gravity[:,0].any()
+    assert numpy.allclose(only(w, 'Gravity', 'Drag'), gravity + drag)
+
+
+def test_attractor_pulls_towards_its_point_and_vortex_turns_around_it():
+
+    w      = world()
+    data   = w.data
+    offset = (0.5 * data.x_res, 0.5 * data.y_res) - data.pos[:data.n]
+
+    pull   = only(w, 'Attractor')
+    swirl  = only(w, 'Vortex')
+
+    assert ((pull * offset).sum(axis=1) > 0).all()
+    assert numpy.allclose((swirl * offset).sum(axis=1), 0)
+
+
+def test_every_force_together_does_not_allocate():
+
+    w = world()
+    w.data.check_alloc = True
+
+    for force in w.forces.fields.values():
+        force.enabled = True
+
+    for _ in range(10):
+        w.step()
+
+    assert w.data.step_alloc <= w.data.alloc_limit
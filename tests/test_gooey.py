@@ -0,0 +1,291 @@
+# Oscar Saharoy 2019
+
+import time, tkinter, numpy, pytest, gooey
+
+
+@pytest.fixture
+def root():
+
+    try:
+        root = tkinter.Tk()
+    except tkinter.TclError:
+        pytest.skip('no display')
+
+    yield root
+    root.destroy()
+
+
+def test_boxes_made_together_keep_their_corners_in_order(root):
+
+    canvas = gooey.Canvas(root)
+    items  = canvas.create_items('rectangle', [[30, 40, 10, 20], [5, 5, 15, 15]])
+    lines  = canvas.create_items('line', [[30, 40, 10, 20]])
+
+    for item in items.ids:
+        canvas.coords(item, 30, 40, 10, 20)
+        assert canvas.coords(item) == tkinter.Canvas.coords(canvas, item) == [10, 20, 30, 40]
+
+    canvas.coords(lines.ids[0], 30, 40, 10, 20)
+    assert canvas.coords(lines.ids[0]) == [30, 40, 10, 20]
+
+
+def pyramid_ok(series):
+
+    # row i of level k holds the lowest and highest of points i*2**(k+1) to (i+1)*2**(k+1)
+    y = series.y
+
+    for k, level in enumerate(series.levels):
+
+        width = 2 ** (k+1)
+        rows  = (series.length + width - 1) // width
+
+        for i in range(rows):
+            block = y[i*width:(i+1)*width]
+            low, high = level[i]
+
+            assert i*width <= low < (i+1)*width and i*width <= high < (i+1)*width
+            assert y[low] == block.min() and y[high] == block.max()
+
+    assert len(series.levels) == max(int(numpy.ceil(numpy.log2(series.length))), 0)
+
+
+@pytest.mark.parametrize('length', [1, 2, 3, 7, 64, 1000])
+def test_series_pyramid_keeps_the_lowest_and_highest_points(length):
+
+    rng  = numpy.random.RandomState(length)
+    data = numpy.column_stack([numpy.arange(length), rng.randn(length)])
+
+    whole = gooey.Series('whole', data)
+    pyramid_ok(whole)
+
+    # added a few at a time the pyramid comes out the same
+    parts, start = gooey.Series('parts'), 0
+
+    while start < length:
+        count = rng.randint(1, 40)
+        parts.extend(data[start:start+count])
+        start += count
+
+    pyramid_ok(parts)
+
+    for k, (a, b) in enumerate(zip(whole.levels, parts.levels)):
+        rows = (length + 2**(k+1) - 1) // 2**(k+1)
+        assert (a[:rows] == b[:rows]).all()
+
+
+def test_series_samples_keep_the_extremes_in_view():
+
+    rng    = numpy.random.RandomState(12)
+    series = gooey.Series('noise', numpy.column_stack([numpy.arange(5000), rng.randn(5000)]))
+
+    first, last = 1200, 4100
+    k           = series.level(last - first, 100)
+    width       = 2 ** k
+
+    # the rows of level k which cover the points in view
+    drawn = series.samples(k, first // width, (last + width - 1) // width)
+    block = series.y[first // width * width : (last + width - 1) // width * width]
+
+    assert k > 0 and len(drawn) <= 2 * 2 * 100
+    assert (numpy.diff(drawn) > 0).all()
+    assert series.y[drawn].min() == block.min() and series.y[drawn].max() == block.max()
+
+
+def test_series_extended_out_of_order_is_sorted():
+
+    series = gooey.Series('late', [[0, 1], [2, 5], [4, 2]])
+    series.extend([[1, 7], [3, -1]])
+
+    assert (series.x == [0, 1, 2, 3, 4]).all() and (series.y == [1, 7, 5, -1, 2]).all()
+    pyramid_ok(series)
+
+
+def recorder():
+
+    # a gooey.Canvas whose Tcl command is a proc recording the arguments of each call, so the Tcl side of the
+    # batched calls can be checked without a display
+    canvas     = gooey.Canvas.__new__(gooey.Canvas)
+    canvas.tk  = tkinter.Tcl().tk
+    canvas._w  = 'recorder'
+    canvas._coords, canvas._boxes = {}, set()
+
+    canvas.tk.eval('set calls {}; proc recorder {args} {lappend ::calls $args; llength $::calls}')
+
+    return canvas
+
+
+def test_list_options_for_each_item_stay_whole():
+
+    canvas = recorder()
+    items  = canvas.create_items('line', [[0, 0, 10, 10], [5, 5, 20, 5]], dash=[(4, 2), (2, 2, 6, 2)], width=2,
+                                 tags=[('a', 'b'), 'c'], fill=['red', 'blue'])
+
+    calls  = [canvas.tk.splitlist(call) for call in canvas.tk.splitlist(canvas.tk.eval('set calls'))]
+
+    assert items.ids == [1, 2]
+    assert [dict(zip(call[6::2], call[7::2])) for call in calls] == [
+        {'-width': '2', '-dash': '4 2', '-tags': 'a b', '-fill': 'red'},
+        {'-width': '2', '-dash': '2 2 6 2', '-tags': 'c', '-fill': 'blue'}]
+    assert [call[:6] for call in calls] == [('create', 'line', '0', '0', '10', '10'), ('create', 'line', '5', '5', '20', '5')]
+
+
+def test_options_are_read_from_tk_once_until_the_widget_is_configured(tcl):
+
+    canvas = gooey.Canvas(tcl)
+    tcl.calls()
+
+    assert canvas['width'] == canvas.cget('width')
+    assert len(tcl.calls('cget')) == 1
+
+    canvas.configure(width=300)
+    canvas['width']
+
+    assert len(tcl.calls('cget')) == 1
+
+
+def test_item_coords_are_cached_as_items_are_moved(tcl):
+
+    canvas = gooey.Canvas(tcl)
+    box    = gooey.CanvasRectangle(canvas, 30, 40, 10, 20, tag='box')
+    line   = gooey.CanvasLine(canvas, 0, 0, 10, 10)
+
+    canvas.coords(box, 30, 40, 10, 20)
+    canvas.coords(line, 0, 0, 10, 10)
+    canvas.move(line, 5, 1)
+    tcl.calls()
+
+    assert box.coords == [10, 20, 30, 40] and line.coords == [5, 1, 15, 11]
+    assert not tcl.calls()
+
+    # a change by tag could apply to any item, so the coords are read from Tk again
+    canvas.move('box', 1, 1)
+    canvas.coords(line)
+
+    assert [call[1:] for call in tcl.calls()] == [('move', 'box', '1', '1'), ('coords', str(line))]
+
+
+def graph(tcl, **kw):
+
+    # a Graph on the stand-in root, drawn once
+    graph = gooey.Graph(tcl, **kw)
+    graph._build()
+    tcl.tk.eval('update')
+
+    return graph
+
+
+def wave(length, phase=0):
+
+    return numpy.column_stack([numpy.arange(length), numpy.sin(numpy.arange(length) + phase)])
+
+
+def test_redrawing_the_graph_reuses_its_items(tcl):
+
+    g     = graph(tcl, data=wave(20))
+    pools = {tag: list(pool) for tag, pool in g._pools.items()}
+    tcl.calls()
+
+    # new data with as many points only moves the items
+    g.configure(data=wave(20, 1))
+    tcl.tk.eval('update')
+
+    assert not tcl.calls('create') and not tcl.calls('delete')
+    assert g._pools == pools
+
+    # panning keeps the items it can and only makes or deletes the difference
+    g.shift(3.5, 1.25)
+    tcl.tk.eval('update')
+
+    made = deleted = 0
+
+    for tag, pool in g._pools.items():
+        kept     = min(len(pool), len(pools[tag]))
+        made    += len(pool) - kept
+        deleted += len(pools[tag]) - kept
+
+        assert pool[:kept] == pools[tag][:kept]
+
+    done = tcl.calls()
+
+    assert made == len([call for call in done if call[1] == 'create'])
+    assert deleted == len([call for call in done if call[1] == 'delete'])
+
+
+def items(graph, name):
+
+    # ids of the items drawn for the series NAME
+    return {str(item) for tag in ('point', 'spline', 'line') for item in graph._pools.get((name, tag), [])}
+
+
+def test_each_series_is_drawn_in_its_colour_and_redrawn_alone(tcl):
+
+    g = graph(tcl, data=wave(20), span=10, dragable=False)
+    g.add_series('other', wave(20, 2), colour='red', spline=False)
+    tcl.tk.eval('update')
+
+    assert items(g, None) and items(g, 'other') and not items(g, None) & items(g, 'other')
+
+    red = [call for call in tcl.calls('create') if call[call.index('-fill') + 1] == 'red']
+
+    assert len(red) == len(g._pools[('other', 'line')]) > 0 and not g._pools.get(('other', 'spline'))
+
+    # on a dragable Graph new points for one series only redraw that series
+    g.configure(dragable=True)
+    g.extend([[20, 0.5]], series='other')
+    tcl.tk.eval('update')
+
+    moved = {call[2] for call in tcl.calls('coords')}
+
+    assert moved and moved <= items(g, 'other')
+
+    gone = items(g, 'other')
+    g.remove_series('other')
+    tcl.tk.eval('update')
+
+    assert {call[2] for call in tcl.calls('delete')} == gone and 'other' not in g._series
+
+
+def test_a_burst_of_requests_is_drawn_once_when_tk_is_idle(tcl):
+
+    scheduler = gooey.Scheduler()
+    canvas    = gooey.Canvas(tcl)
+    drawn     = []
+
+    for i in range(5):
+        scheduler.request(canvas, lambda i=i: drawn.append(i))
+
+    assert not drawn
+
+    tcl.tk.eval('update')
+
+    assert drawn == [4]
+
+
+def test_capped_widgets_are_drawn_no_more_than_fps_times_a_second(tcl):
+
+    scheduler = gooey.Scheduler()
+    canvas    = gooey.Canvas(tcl)
+    drawn     = []
+
+    scheduler.request(canvas, lambda: drawn.append(time.time()), fps=10)
+    tcl.tk.eval('update')
+
+    # asked again straight away, it waits for its next frame
+    scheduler.request(canvas, lambda: drawn.append(time.time()), fps=10)
+    scheduler.request(canvas, lambda: drawn.append(time.time()), fps=10)
+    tcl.tk.eval('update')
+
+    assert len(drawn) == 1
+
+    time.sleep(0.12)
+    tcl.tk.eval('update')
+
+    assert len(drawn) == 2 and drawn[1] - drawn[0] >= 0.1
+
+    # cancelled requests are never drawn
+    scheduler.request(canvas, lambda: drawn.append(time.time()), fps=10)
+    scheduler.cancel(canvas)
+    time.sleep(0.12)
+    tcl.tk.eval('update')
+
+    assert len(drawn) == 2
@@ -0,0 +1,92 @@
+# Oscar Saharoy 2019
+
+import random, numpy, pytest, balls
+from grid import Grid, Levels
+
+
+def brute(pos, reach, width=None, height=None):
+
+    # Every pair of POS closer than REACH, measured to the nearest image if WIDTH and HEIGHT are given.
+
+    d = pos[None,:,:] - pos[:,None,:]
+
+    if width:
+        d -= numpy.rint(d / [width, height]) * [width, height]
+
+    close = numpy.hypot(d[...,0], d[...,1]) < reach
+
+    return {(a, b) for a, b in zip(*numpy.nonzero(numpy.triu(close, 1)))}
+
+
+def found(i1, i2):
+
+    pairs = [tuple(sorted(pair)) for pair in zip(i1.tolist(), i2.tolist())]
+
+    assert len(pairs) == len(set(pairs)) # no pair is found twice
+
+    return set(pairs)
+
+
+@pytest.mark.parametrize('periodic', [False, True])
+def test_grid_pairs_match_brute_force(periodic):
+
+    rng = numpy.random.RandomState(0)
+    pos = rng.rand(500, 2) * [300, 200]
+
+    grid = Grid()
+    grid.shape(20, 300, 200, periodic)
+    grid.build(pos, len(pos))
+
+    expect = brute(pos, 20, *((300, 200) if periodic else ()))
+
+    assert found(*grid.pairs(20)) == expect
+
+
+@pytest.mark.parametrize('size', [90, 150, 400])
+def test_periodic_grid_wider_than_a_third_of_the_world(size):
+
+    # worlds less than 3 reaches across used to be refused - now every pair of balls is a candidate
+
+    rng = numpy.random.RandomState(1)
+    pos = rng.rand(40, 2) * 200
+
+    grid = Grid()
+    grid.shape(size, 200, 200, True)
+    grid.build(pos, len(pos))
+
+    assert found(*grid.pairs(size)) == brute(pos, size, 200, 200)
+
+
+@pytest.mark.parametrize('periodic', [False, True])
+def test_levels_find_every_touching_pair(periodic):
+
+    rng    = numpy.random.RandomState(2)
+    pos    = rng.rand(300, 2) * 250
+    radius = 2 * 4 ** rng.rand(300)
+
+    levels = Levels()
+    levels.build(pos, radius, len(pos), 250, 250, 1, periodic)
+
+    d = pos[None,:,:] - pos[:,None,:]
+
+    if periodic:
+        d -= numpy.rint(d / 250) * 250
+
+    touching = numpy.triu(numpy.hypot(d[...,0], d[...,1]) < radius[:,None] + radius[None,:], 1)
+
+    assert {(a, b) for a, b in zip(*numpy.nonzero(touching))} <= found(*levels.pairs())
+
+
+@pytest.mark.parametrize('potential', [None, 'Lennard-Jones'])
+def test_periodic_world_with_big_balls_steps(potential):
+
+    numpy.random.seed(3)
+    random.seed(3)
+
+    world = balls.Balls(headless=True, resolution=(200, 200))
+    world.set_container('Periodic')
+    world.set_potential(potential)
+    world.set_sizes(45, 10)
+
+    for _ in range(5):
+        world.step()
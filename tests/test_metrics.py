@@ -0,0 +1,112 @@
+# Oscar Saharoy 2019
+
+import csv, numpy
+from metrics import Ring, Series, Metrics
+
+
+TIERS = [(0, 16), (1, 40), (10, 100)]
+
+
+def samples():
+
+    # a sample every quarter of a second for a minute
+    t     = numpy.arange(0, 60, 0.25)
+    value = numpy.sin(t) * 10 + numpy.random.RandomState(11).rand(len(t))
+
+    return t, value
+
+
+def rollup(t, value, period, t1):
+
+    # rows (time, mean, min, max) of each period which is over by T1, worked out in one go
+    rows = []
+
+    for start in numpy.arange(0, t1 - period + 1e-9, period):
+        inside = (t >= start) & (t < start + period)
+        rows.append([start, value[inside].mean(), value[inside].min(), value[inside].max()])
+
+    return numpy.array(rows)
+
+
+def test_ring_keeps_the_latest_rows_in_order():
+
+    ring = Ring(5)
+
+    for t in range(12):
+        ring.append(t, t, t, t)
+
+    assert ring.count == 5
+    assert (ring.between(-1, 100)[:,0] == [7, 8, 9, 10, 11]).all()
+    assert (ring.between(8, 10.5)[:,0] == [8, 9, 10]).all()
+    assert len(ring.between(20, 30)) == 0
+
+
+def test_tiers_hold_the_mean_min_and_max_of_each_period():
+
+    series   = Series(TIERS)
+    t, value = samples()
+
+    for s, v in zip(t, value):
+        series.add(s, v)
+
+    # the finest tier only holds the last 16 samples
+    assert numpy.allclose(series.rings[0].between(0, 60), numpy.column_stack([t, value, value, value])[-16:])
+
+    # the last period of each of the others isn't over until a later sample arrives
+    assert numpy.allclose(series.rings[1].between(0, 60), rollup(t, value, 1, 59)[-40:])
+    assert numpy.allclose(series.rings[2].between(0, 60), rollup(t, value, 10, 50))
+
+
+def test_query_picks_the_finest_tier_which_covers_the_window():
+
+    series   = Series(TIERS)
+    t, value = samples()
+
+    for s, v in zip(t, value):
+        series.add(s, v)
+
+    # the last few seconds are still held sample by sample
+    assert len(series.query(57, 60)) == 12
+
+    # further back the samples have been dropped, so the rows are seconds
+    assert numpy.allclose(series.query(30, 40), rollup(t, value, 1, 59)[30:40])
+
+    # asking for fewer points than there are seconds gives periods of 10 seconds
+    assert numpy.allclose(series.query(0, 60, points=10), rollup(t, value, 10, 50))
+
+
+def test_metrics_export(tmp_path):
+
+    metrics = Metrics(TIERS)
+
+    for s in range(10):
+        metrics.record('Energy', s * 2, t=100 + s)
+        metrics.record('Collisions', s, t=100 + s)
+
+    path = tmp_path / 'metrics.csv'
+    metrics.export(path, ['Energy'], t0=100, t1=105)
+
+    with open(path, newline='') as file:
+        rows = list(csv.reader(file))
+
+    assert rows[0] == ['metric', 'time', 'mean', 'min', 'max']
+    assert [float(row[2]) for row in rows[1:]] == [0, 2, 4, 6, 8]
+    assert {row[0] for row in rows[1:]} == {'Energy'}
+    assert len(metrics.query('Missing')) == 0
+
+
+def test_query_only_copies_the_tier_it_returns():
+
+    series = Series(TIERS)
+
+    for s in range(200):
+        series.add(s * 0.25, s)
+
+    copied = []
+
+    for ring in series.rings:
+        ring.slice = lambda first, last, ring=ring, slice=ring.slice: copied.append(last - first) or slice(first, last)
+
+    rows = series.query(0, 50, points=8)
+
+    assert len(rows) <= 8 and copied == [len(rows)]
@@ -0,0 +1,86 @@
+# Oscar Saharoy 2019
+
+import random, numpy, pytest, balls, potentials
+
+
+def world(number=150, seed=4):
+
+    numpy.random.seed(seed)
+    random.seed(seed)
+
+    world = balls.Balls(headless=True, resolution=(400, 400))
+    world.store.resize(number)
+
+    return world
+
+
+def force(potential, dist, contact=10.0, approach=0.0):
+
+    # size of the force POTENTIAL gives pairs of balls DIST apart which touch at CONTACT, the first ball moving
+    # at APPROACH towards the second
+
+    w    = world(2)
+    k    = len(dist)
+    i1   = numpy.zeros(k, numpy.intp)
+    i2   = numpy.ones(k, numpy.intp)
+    norm = numpy.tile([1.0, 0.0], (k, 1))
+    out  = numpy.zeros(k)
+
+    w.data.vel[:2] = [[approach, 0], [0, 0]]
+
+    potential(w, i1, i2, norm, numpy.asarray(dist, float), numpy.full(k, contact), out)
+
+    return out
+
+
+def test_lennard_jones_well_is_where_balls_touch():
+
+    lj = potentials.LennardJones()
+
+    pushed, touching, pulled, beyond = force(lj, [8, 10, 15, 10*lj.scale + 1])
+
+    assert pushed > 0 and pulled < 0
+    assert touching == pytest.approx(0, abs=1e-12) and beyond == 0
+
+
+def test_spring_dashpot_pushes_only_overlapping_balls_and_damps_approach():
+
+    sd = potentials.SpringDashpot()
+
+    apart, touching, overlapping = force(sd, [12, 10, 8])
+
+    assert apart == touching == 0 and overlapping > 0
+    assert force(sd, [8], approach=1)[0] > overlapping > force(sd, [8], approach=-1)[0] >= 0
+
+
+@pytest.mark.parametrize('name', ['Lennard-Jones', 'Spring-Dashpot'])
+def test_pair_forces_conserve_momentum(name):
+
+    w    = world()
+    data = w.data
+    n    = data.n
+
+    # balls are placed clear of each other, so two are pushed together to give the contact forces something to do
+    data.pos[1] = data.pos[0] + [data.radius[0], 0]
+
+    w.set_potential(name)
+    w.interact()
+
+    momentum = (data.mass[:n,None] * data.pair_acc[:n]).sum(axis=0)
+
+    assert numpy.abs(data.pair_acc[:n]).max() > 0
+    assert numpy.allclose(momentum, 0, atol=1e-9)
+
+
+@pytest.mark.parametrize('name', ['Lennard-Jones', 'Spring-Dashpot'])
+def test_soft_steps_stay_calm_and_do_not_allocate(name):
+
+    w = world()
+    w.set_potential(name)
+    w.data.check_alloc = True
+
+    for _ in range(100):
+        w.step()
+
+    assert w.data.step_alloc <= w.data.alloc_limit
+    assert numpy.abs(w.data.vel[:w.data.n]).max() < 10
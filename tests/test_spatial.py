@@ -0,0 +1,110 @@
+# Oscar Saharoy 2019
+
+import random, numpy, pytest, balls
+
+
+def make_world(periodic):
+
+    numpy.random.seed(5)
+    random.seed(5)
+
+    world = balls.Balls(headless=True, resolution=(300, 200))
+
+    if periodic:
+        world.set_container('Periodic')
+
+    # a wide spread of sizes puts the balls on several levels of grids
+    world.set_sizes(8, 6)
+
+    for _ in range(10):
+        world.step()
+
+    return world
+
+
+def offsets(world, points):
+
+    # (m, n, 2) offsets from each of POINTS to each live ball, to the nearest image in a periodic world
+    data = world.data
+    d    = data.pos[None,:data.n] - points[:,None]
+
+    if world.walls.periodic:
+        d -= numpy.rint(d / [data.x_res, data.y_res]) * [data.x_res, data.y_res]
+
+    return d
+
+
+points = numpy.random.RandomState(2).rand(40, 2) * [300, 200]
+
+
+@pytest.mark.parametrize('periodic', [False, True])
+@pytest.mark.parametrize('touching', [False, True])
+def test_within_matches_brute_force(periodic, touching):
+
+    world = make_world(periodic)
+    data  = world.data
+    reach = numpy.linspace(0, 60, len(points))
+
+    which, found, dist = world.query.within(points, reach, touching)
+
+    d      = numpy.hypot(*offsets(world, points).transpose(2, 0, 1))
+    limit  = reach[:,None] + (data.radius[:data.n] if touching else 0)
+    expect = set(zip(*numpy.nonzero(d <= limit)))
+
+    assert len(which) == len(set(zip(which, found))) == len(expect)
+    assert set(zip(which, found)) == expect
+    assert numpy.allclose(dist, d[which, found])
+
+    # in order of point, then of distance
+    assert (numpy.diff(which) >= 0).all()
+    assert (numpy.diff(dist)[numpy.diff(which) == 0] >= 0).all()
+
+
+@pytest.mark.parametrize('periodic', [False, True])
+def test_box_matches_brute_force(periodic):
+
+    world = make_world(periodic)
+    boxes = numpy.concatenate([points, points + numpy.random.RandomState(3).rand(len(points), 2) * [90, -40]], axis=1)
+
+    which, found = world.query.box(boxes)
+
+    d      = offsets(world, (boxes[:,:2] + boxes[:,2:]) / 2)
+    half   = numpy.abs(boxes[:,2:] - boxes[:,:2])[:,None] / 2
+    expect = set(zip(*numpy.nonzero((numpy.abs(d) <= half).all(axis=2))))
+
+    assert len(which) == len(expect)
+    assert set(zip(which, found)) == expect
+
+
+@pytest.mark.parametrize('periodic', [False, True])
+def test_nearest_matches_brute_force(periodic):
+
+    world = make_world(periodic)
+    data  = world.data
+
+    found, dist = world.query.nearest(points, 5)
+
+    d = numpy.hypot(*offsets(world, points).transpose(2, 0, 1))
+
+    assert numpy.allclose(dist, numpy.sort(d, axis=1)[:,:5])
+    assert numpy.allclose(numpy.take_along_axis(d, found, axis=1), dist)
+
+    # asking for more balls than there are fills the rest with -1
+    found, dist = world.query.nearest(points[:3], data.n + 2)
+
+    assert (found[:,-2:] == -1).all() and numpy.isinf(dist[:,-2:]).all()
+    assert (numpy.sort(found[:,:-2], axis=1) == numpy.arange(data.n)).all()
+
+
+def test_lookups_follow_removed_balls():
+
+    world = make_world(False)
+    data  = world.data
+
+    world.store.remove(data.ids[:data.n:3])
+
+    found, dist = world.query.nearest(points, 1)
+    d           = numpy.hypot(*offsets(world, points).transpose(2, 0, 1))
+
+    assert (found[:,0] < data.n).all()
+    assert numpy.allclose(dist[:,0], d.min(axis=1))
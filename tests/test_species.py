@@ -0,0 +1,80 @@
+# Oscar Saharoy 2019
+
+import random, numpy, pytest, balls, species
+
+
+def kinds():
+
+    kinds = species.Species()
+    kinds.add('steel',  rest=0.9, friction=0.1)
+    kinds.add('rubber', rest=0.4, friction=0.9, colour='#ff0000', fraction=0)
+
+    return kinds
+
+
+def test_mixed_pairs_start_at_the_geometric_mean_and_can_be_set():
+
+    k = kinds()
+
+    assert k.rest[0,1] == k.rest[1,0] == pytest.approx((0.9 * 0.4)**0.5)
+
+    k.pair('steel', 'rubber', rest=0.7)
+
+    assert k.rest[0,1] == k.rest[1,0] == 0.7
+    assert k.friction[0,1] == pytest.approx((0.1 * 0.9)**0.5)
+
+
+def test_new_balls_are_picked_in_proportion():
+
+    numpy.random.seed(5)
+
+    assert not kinds().pick(1000).any()
+
+
+def world(kinds):
+
+    numpy.random.seed(6)
+    random.seed(6)
+
+    world = balls.Balls(headless=True, resolution=(400, 400))
+    world.species = kinds
+    world.store.resize(2)
+
+    return world
+
+
+@pytest.mark.parametrize('a, b', [(0, 0), (0, 1), (1, 1)])
+def test_collisions_use_the_restitution_of_the_pair(a, b):
+
+    # two balls of equal mass meeting head on - the speed they part at is the restitution of their species
+    # times the speed they met at
+
+    w    = world(kinds())
+    data = w.data
+
+    data.species[:2] = a, b
+    data.mass[:2]    = 1
+    data.radius[:2]  = 10
+    data.pos[:2]     = [[100, 100], [119, 100]]
+    data.vel[:2]     = [[1, 0], [-1, 0]]
+
+    w.resolve(numpy.array([0]), numpy.array([1]))
+
+    parting = data.vel[1,0] - data.vel[0,0]
+
+    assert parting == pytest.approx(2 * w.species.rest[a,b] * data.rest)
+
+
+def test_species_with_their_own_colour_use_it_as_the_base_colour():
+
+    w    = world(kinds())
+    data = w.data
+
+    data.species[:2] = 0, 1
+    data.val_v       = 0
+    data.fade        = False
+
+    tone = w.colours()
+
+    assert numpy.allclose(tone[0], species.hex_colour(data.hex))
+    assert numpy.allclose(tone[1], (255, 0, 0))
@@ -0,0 +1,88 @@
+# Oscar Saharoy 2019
+
+import random, numpy, balls, stats
+
+
+def gas(count, radius, periodic=False):
+
+    # a world of COUNT balls of one RADIUS and no gravity
+    numpy.random.seed(9)
+    random.seed(9)
+
+    world = balls.Balls(headless=True, resolution=(400, 400))
+    world.forces.toggle('Gravity')
+    world.set_sizes(radius, 1)
+    world.store.resize(count)
+
+    if periodic:
+        world.set_container('Periodic')
+
+    return world
+
+
+def kinetic(world, slots):
+
+    data = world.data
+    return 0.5 * data.mass[slots] * (data.vel[slots]**2).sum(axis=1)
+
+
+def test_estimates_of_one_chunk():
+
+    world = gas(50, 8)
+    data  = world.data
+    every = numpy.arange(data.n)
+    est   = stats.Stats(world, chunk=20, smoothing=1)
+
+    # each update looks at the next chunk of balls, going round to the start
+    for slots in [every[:20], every[20:40], numpy.r_[every[40:], every[:10]]]:
+
+        est.update()
+
+        assert numpy.isclose(est.temperature, kinetic(world, slots).mean())
+        assert numpy.isclose(est.energy, est.temperature * data.n)
+        assert numpy.allclose(est.momentum, (data.mass[slots,None] * data.vel[slots]).mean(axis=0) * data.n)
+
+    # the speed distribution is a density over the bins, which adds up to 1
+    speeds = est.plot('Speeds')
+
+    assert numpy.isclose((speeds[:,1] * numpy.diff(est.speed_edges)).sum(), 1)
+    assert numpy.allclose(speeds[:,0], (est.speed_edges[1:] + est.speed_edges[:-1]) / 2)
+
+    assert world.metrics.query('Temperature')[-1,1] == est.temperature
+
+
+def test_pressure_of_a_dilute_gas_is_ideal():
+
+    world = gas(60, 4)
+    data  = world.data
+
+    world.stats.enable()
+
+    pressure = []
+
+    for step in range(1200):
+        world.step()
+        if step >= 200:
+            pressure.append(world.stats.pressure)
+
+    # P = N kT / A in 2d, where the centres of the balls keep a radius from the walls
+    ideal = data.n * kinetic(world, numpy.arange(data.n)).mean() / (400 - 2*4)**2
+
+    assert abs(numpy.mean(pressure) / ideal - 1) < 0.15
+
+
+def test_rdf_of_scattered_balls_is_flat():
+
+    world = gas(400, 8, periodic=True)
+    data  = world.data
+
+    # balls scattered anywhere, overlapping or not, have g(r) = 1 at every distance
+    data.pos[:data.n] = numpy.random.RandomState(10).rand(data.n, 2) * 400
+
+    est = stats.Stats(world, chunk=400, probes=400, smoothing=1)
+    est.update()
+
+    rdf = est.plot('g(r)')
+
+    assert abs(rdf[:,1].mean() - 1) < 0.1
+    assert (numpy.abs(rdf[8:,1] - 1) < 0.3).all()
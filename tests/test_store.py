@@ -0,0 +1,74 @@
+# Oscar Saharoy 2019
+
+import numpy, pytest
+from store import Store
+
+
+class Data(object):
+    pass
+
+
+def follow(store):
+
+    # maps the id of each live ball to its value of data.tag, which is set to the id when the ball is added
+    data = store.data
+    return {int(i): int(t) for i, t in zip(data.ids[:data.n], data.tag[:data.n])}
+
+
+@pytest.fixture
+def store():
+
+    store = Store(Data(), capacity=4)
+    store.register('tag', dtype=int, init=-1)
+    return store
+
+
+def test_ids_stay_with_their_balls(store):
+
+    data = store.data
+    rng  = numpy.random.default_rng(1)
+
+    for step in range(200):
+
+        if data.n < 5 or rng.random() < 0.5:
+            count = int(rng.integers(1, 20))
+            made  = store.add(count, tag=-1)
+            data.tag[data.slot[made]] = made
+
+        elif rng.random() < 0.5:
+            gone = rng.choice(data.ids[:data.n], int(rng.integers(1, data.n)), replace=False)
+            store.remove(gone)
+            assert (data.slot[gone] == -1).all()
+
+        else:
+            store.permute(rng.permutation(data.n))
+
+        live = data.ids[:data.n]
+
+        assert len(numpy.unique(live)) == data.n
+        assert (data.slot[live] == numpy.arange(data.n)).all()
+        assert all(i == t for i, t in follow(store).items())
+
+
+def test_removed_ids_are_reused(store):
+
+    data = store.data
+    ids  = store.add(10)
+
+    store.remove(ids[[2, 5, 7]])
+    again = store.add(3)
+
+    assert sorted(again) == [2, 5, 7]
+    assert data.n == 10 and store.new_id == 10
+
+
+def test_resize_removes_the_last_slots(store):
+
+    data = store.data
+    ids  = store.add(8)
+
+    store.permute(numpy.arange(8)[::-1])
+    store.resize(5)
+
+    assert sorted(data.ids[:data.n]) == sorted(ids[3:])
+    assert (data.slot[ids[:3]] == -1).all()
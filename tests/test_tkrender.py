@@ -0,0 +1,56 @@
+# Oscar Saharoy 2019
+
+import random, numpy, balls, tkrender
+
+
+def renderer(tcl, number):
+
+    # a TkRenderer drawing a headless world of NUMBER balls on the stand-in root, with the walls already drawn as
+    # making their image needs Tk
+    numpy.random.seed(10)
+    random.seed(10)
+
+    world = balls.Balls(headless=True, resolution=(400, 400))
+    world.store.resize(number)
+    world.data.fade = False # so the balls keep their colours from frame to frame
+
+    tcl.close = lambda: None
+
+    view     = tkrender.TkRenderer(world, tcl)
+    view.key = (world.walls, world.data.x_res, world.data.y_res)
+
+    return view
+
+
+def test_frames_move_every_ball_and_fill_only_the_new_ones(tcl):
+
+    view = renderer(tcl, 50)
+    tcl.calls()
+
+    view.draw()
+
+    assert len(tcl.calls('create')) == 50 and len(view.balls) == 50
+
+    view.draw()
+    done = tcl.calls()
+
+    assert len([call for call in done if call[1] == 'coords']) == 50
+    assert not [call for call in done if call[1] in ('create', 'delete', 'itemconfigure')]
+
+
+def test_ovals_are_only_made_or_deleted_as_the_number_of_balls_changes(tcl):
+
+    view = renderer(tcl, 50)
+    view.draw()
+    kept = view.balls.ids[:30]
+
+    view.world.store.resize(30)
+    tcl.calls()
+    view.draw()
+
+    assert len(tcl.calls('delete')) == 1 and view.balls.ids == kept
+
+    view.world.store.resize(40)
+    view.draw()
+
+    assert len(tcl.calls('create')) == 10 and view.balls.ids[:30] == kept and len(set(view.balls.ids)) == 40
@@ -0,0 +1,37 @@
+# Oscar Saharoy 2019
+
+import random, numpy, pytest, balls, walls
+
+
+@pytest.mark.parametrize('name', list(walls.PRESETS))
+def test_changing_container_keeps_the_step_from_allocating(name):
+
+    numpy.random.seed(4)
+    random.seed(4)
+
+    world = balls.Balls(headless=True, resolution=(400, 400))
+    world.data.check_alloc = True
+
+    world.step()
+    world.set_container(name)
+    world.step()
+
+    world.resize(300, 200)
+    world.step()
+
+    assert world.data.step_alloc <= world.data.alloc_limit
+
+
+def test_box_distance_is_sampled():
+
+    box = walls.PRESETS['Box']()
+    box.compile(400, 200)
+
+    world = balls.Balls(headless=True, resolution=(400, 200))
+    field = numpy.zeros([3, 3])
+
+    box.sample(world, numpy.array([[200., 100.], [10., 100.], [200., 190.]]), field)
+
+    # distance to the nearest side, with the gradient pointing away from it
+    assert numpy.allclose(field[:,0], [100, 10, 10], atol=1)
+    assert field[1,1] > 0 and field[2,2] < 0
@@ -0,0 +1,158 @@
+# Oscar Saharoy 2019
+
+import numpy, tkinter, time, gooey
+
+
+class TkRenderer(object):
+
+    # Draws a Balls world in a tkinter window belonging to the settings panel, for machines which can't use pygame.
+    #
+    # Each ball is drawn as an oval item on a gooey.Canvas which is kept from frame to frame, with an oval for each
+    # slot of the store. A frame moves all the ovals in one batched Tcl evaluation (see gooey.CanvasItems) and only
+    # changes the fills of the balls whose colour is different from the last frame, so after their fade has run
+    # out most balls cost nothing but their coords. Ovals are only made or deleted when the number of balls changes.
+    #
+    # The simulation is stepped from tkinter's event loop by mainloop, about data.fps times a second.
+
+    def __init__(self, world, panel):
+
+        self.world  = world
+        self.panel  = panel
+        data        = world.data
+
+        self.window = tkinter.Toplevel(panel)
+        self.window.title(' Balls')
+        self.window.protocol('WM_DELETE_WINDOW', panel.close) # closing either window closes the simulation
+
+        self.canvas = gooey.Canvas(self.window, width=data.x_res, height=data.y_res, highlightthickness=0)
+        self.canvas.pack(fill='both', expand=True)
+        self.canvas.bind('<Configure>', self.resize)
+
+        self.wall_item = self.canvas.create_image(0, 0, anchor='nw') # image of the walls, made again when they change
+        self.photo     = None
+        self.key       = None
+
+        self.balls  = self.canvas.create_items('oval', []) # an oval for each slot of the store
+        self.images = self.canvas.create_items('oval', []) # ovals for images of balls across the edges of a periodic world
+        self.ids    = numpy.zeros(0, int)                  # canvas ids of self.balls, to pick out the ones to fill
+
+        # colour each oval was last filled with, or -1 for new ovals which haven't been filled yet
+        self.fills  = numpy.zeros([0, 3], int)
+
+        self.last   = None # time of the last frame
+
+
+    def resize(self, event):
+
+        self.world.resize(event.width, event.height)
+
+
+    def mainloop(self):
+
+        self.frame()
+        self.panel.mainloop()
+
+
+    def frame(self):
+
+        # Steps and draws the world, then waits until the next frame is due.
+
+        data = self.world.data
+
+        if data.closed:
+            return
+
+        start = time.perf_counter()
+
+        if self.last is not None:
+            self.world.metrics.record('FPS', 1 / max(start - self.last, 1e-9))
+
+        self.last = start
+
+        self.world.step()
+        self.draw()
+
+        wait = 1000 / data.fps - (time.perf_counter() - start) * 1000
+        self.window.after(max(int(wait), 1), self.frame)
+
+
+    def draw(self):
+
+        world = self.world
+        data  = world.data
+        n     = data.n
+
+        # the walls are drawn from an image of them, made again if the walls or window size change
+        key = (world.walls, data.x_res, data.y_res)
+
+        if key != self.key:
+
+            pixels     = world.wall_pixels().transpose(1, 0, 2) # rows of the image are y
+            header     = b'P6 %d %d 255\n' % (data.x_res, data.y_res)
+            self.photo = tkinter.PhotoImage(master=self.canvas, data=header + pixels.tobytes(), format='ppm')
+            self.key   = key
+
+            self.canvas.itemconfigure(self.wall_item, image=self.photo)
+
+        tone = world.colours()
+        rgb  = numpy.clip(tone, 0, 255).astype(int)
+
+        self.fit(n)
+
+        # move every oval into place in one go
+        pos    = data.pos[:n]
+        radius = data.radius[:n,None]
+
+        self.balls.coords = numpy.hstack([pos - radius, pos + radius])
+
+        # and fill only the ovals whose colour has changed
+        changed = numpy.flatnonzero((rgb != self.fills[:n]).any(axis=1))
+
+        if len(changed):
+            group = gooey.CanvasItems(self.canvas, 'oval', self.ids[changed].tolist())
+            group.itemconfigure(fill=[tk_colour(colour) for colour in rgb[changed]])
+            self.fills[changed] = rgb[changed]
+
+        # in a periodic world balls crossing an edge are drawn again across the opposite edge - there are few of them
+        images = world.images(tone) if world.walls.periodic else []
+
+        if len(images) != len(self.images):
+            self.images.delete()
+            self.images = self.canvas.create_items('oval', numpy.zeros([len(images), 4]), outline='black')
+
+        if images:
+            self.images.coords = [(x - r, y - r, x + r, y + r) for (x, y), r, _ in images]
+            self.images.itemconfigure(fill=[tk_colour(numpy.clip(colour, 0, 255).astype(int)) for _, _, colour in images])
+
+
+    def fit(self, n):
+
+        # Makes or deletes ovals so that there is one for each of the N balls.
+
+        count = len(self.balls)
+
+        if n > count:
+
+            extra = self.canvas.create_items('oval', numpy.zeros([n - count, 4]), outline='black')
+
+            self.balls.ids += extra.ids
+            self.fills      = numpy.concatenate([self.fills, numpy.full([n - count, 3], -1)])
+
+        elif n < count:
+
+            gooey.CanvasItems(self.canvas, 'oval', self.balls.ids[n:]).delete()
+
+            del self.balls.ids[n:]
+            self.fills = self.fills[:n]
+
+        else:
+            return
+
+        self.ids = numpy.array(self.balls.ids, int)
+
+
+def tk_colour(rgb):
+
+    # Returns the tkinter colour '#rrggbb' of an (r, g, b) colour from 0 to 255.
+
+    return '#%02x%02x%02x' % tuple(rgb)
@@ -0,0 +1,233 @@
+# Oscar Saharoy 2019
+
+import numpy
+
+
+class Walls(object):
+
+    # Container walls and obstacles for the balls to bounce off.
+    #
+    # The walls are made of shapes, each of which gives the signed distance from a point to its surface -
+    # positive on the side the balls live and negative inside the wall. The distance to the walls as a whole is
+    # the smallest of these. Rather than working this out for every ball every step, it is sampled once onto a
+    # grid covering the window, along with its gradient, which points away from the nearest wall. Finding how
+    # far each ball is from the walls is then a bilinear lookup into the grid, so the cost per ball is the same
+    # however many shapes make up the walls.
+    #
+    # Shapes are placed as fractions of the width and height of the window, and the grid is compiled again
+    # whenever the window changes size.
+    #
+    # A PERIODIC container has no edges - balls leaving one side of the window come back in the other, and
+    # collisions are found across the edges - so it can be used for bulk statistics without the walls.
+
+    def __init__(self, shapes, spacing=4, periodic=False):
+
+        self.shapes   = shapes
+        self.spacing  = spacing  # distance in pixels between samples
+        self.periodic = periodic # True if the window wraps round
+        self.size     = None     # (width, height) of the window the grid was compiled for
+        self.perimeter = 0       # length of the surface of the walls, eg. for the pressure on them
+
+
+    def compile(self, width, height):
+
+        s       = self.spacing
+
+        # samples cover the window with one sample to spare past the right and bottom edges
+        nx, ny  = int(width // s) + 2, int(height // s) + 2
+        x, y    = numpy.meshgrid(numpy.arange(nx) * s, numpy.arange(ny) * s)
+
+        field   = numpy.full([ny, nx], 1e9)
+
+        for shape in self.shapes:
+            numpy.minimum(field, shape.distance(x, y, width, height), out=field)
+
+        gy, gx  = numpy.gradient(field, s)
+
+        # distance and gradient of each sample, flattened row by row so 4 gathers do a bilinear lookup
+        self.table  = numpy.stack([field, gx, gy], axis=-1).reshape(-1, 3)
+        self.nx     = nx
+        self.ny     = ny
+        self.size   = (width, height)
+
+        # the samples within half a spacing of the surface cover a band a spacing wide along it
+        self.perimeter = numpy.count_nonzero(numpy.abs(field) < s/2) * s
+
+
+    def solid(self, width, height):
+
+        # Returns a (width, height) array which is True for the pixels inside the walls, for drawing them.
+
+        x, y  = numpy.meshgrid(numpy.arange(width) + 0.5, numpy.arange(height) + 0.5, indexing='ij')
+        field = numpy.full([width, height], 1e9)
+
+        for shape in self.shapes:
+            numpy.minimum(field, shape.distance(x, y, width, height), out=field)
+
+        return field < 0
+
+
+    def sample(self, world, pos, out):
+
+        # Fills OUT, an (n, 3) array, with the distance to the walls and its gradient at each position in POS,
+        # interpolated from the 4 samples around it. Positions off the grid read the samples at its edge.
+
+        n       = len(pos)
+        nx, ny  = self.nx, self.ny
+
+        frac    = world.scratch('wall_frac',   n, (2,))
+        floor   = world.scratch('wall_floor',  n, (2,))
+        index   = world.scratch('wall_index',  n, (), numpy.intp)
+        corner  = world.scratch('wall_corner', n, (), numpy.intp)
+        value   = world.scratch('wall_value',  n, (3,))
+        wx      = world.scratch('wall_wx',     n)
+        wy      = world.scratch('wall_wy',     n)
+
+        # position in units of samples, split into the sample above and left of it and the fraction past that
+        numpy.divide(pos, self.spacing, out=frac)
+        numpy.clip(frac[:,0], 0, nx-1.001, out=frac[:,0])
+        numpy.clip(frac[:,1], 0, ny-1.001, out=frac[:,1])
+        numpy.floor(frac, out=floor)
+        numpy.subtract(frac, floor, out=frac)
+
+        numpy.multiply(floor[:,1], nx, out=floor[:,1])
+        numpy.add(floor[:,1], floor[:,0], out=floor[:,1])
+        numpy.copyto(index, floor[:,1], casting='unsafe')
+
+        out.fill(0)
+
+        # add up the 4 samples around each position weighted by how close it is to them
+        for dx, dy in ((0, 0), (1, 0), (0, 1), (1, 1)):
+
+            if dx:
+                numpy.copyto(wx, frac[:,0])
+            else:
+                numpy.subtract(1, frac[:,0], out=wx)
+
+            if dy:
+                numpy.copyto(wy, frac[:,1])
+            else:
+                numpy.subtract(1, frac[:,1], out=wy)
+
+            numpy.multiply(wx, wy, out=wx)
+
+            numpy.add(index, dx + dy*nx, out=corner)
+            numpy.take(self.table, corner, axis=0, out=value, mode='clip')
+            numpy.multiply(value, wx[:,None], out=value)
+            numpy.add(out, value, out=out)
+
+
+class Box(object):
+
+    # Rectangular container from (x0, y0) to (x1, y1) - the whole window by default.
+
+    def __init__(self, x0=0, y0=0, x1=1, y1=1):
+
+        self.x0, self.y0 = x0, y0
+        self.x1, self.y1 = x1, y1
+
+
+    def distance(self, x, y, width, height):
+
+        # distance to the nearest side - only exact inside the box, but outside it only needs the right sign
+        return numpy.minimum.reduce([x - self.x0*width, self.x1*width - x, y - self.y0*height, self.y1*height - y])
+
+
+class Drum(object):
+
+    # Circular container centred on (x, y), with its radius a fraction of the shorter side of the window.
+
+    def __init__(self, x=0.5, y=0.5, radius=0.48):
+
+        self.x, self.y = x, y
+        self.radius    = radius
+
+
+    def distance(self, x, y, width, height):
+
+        return self.radius*min(width, height) - numpy.hypot(x - self.x*width, y - self.y*height)
+
+
+class Disc(object):
+
+    # Round obstacle centred on (x, y), with its radius a fraction of the shorter side of the window.
+
+    def __init__(self, x=0.5, y=0.5, radius=0.05):
+
+        self.x, self.y = x, y
+        self.radius    = radius
+
+
+    def distance(self, x, y, width, height):
+
+        return numpy.hypot(x - self.x*width, y - self.y*height) - self.radius*min(width, height)
+
+
+class Segment(object):
+
+    # Straight wall from (x0, y0) to (x1, y1), THICKNESS pixels thick with rounded ends. Walls of any shape can
+    # be built up out of segments.
+
+    def __init__(self, x0, y0, x1, y1, thickness=4):
+
+        self.x0, self.y0 = x0, y0
+        self.x1, self.y1 = x1, y1
+        self.thickness   = thickness
+
+
+    def distance(self, x, y, width, height):
+
+        ax, ay = self.x0*width, self.y0*height
+        bx, by = self.x1*width, self.y1*height
+
+        # project onto the segment and clamp to its ends to find the nearest point on it
+        ex, ey = bx - ax, by - ay
+        t      = ((x - ax)*ex + (y - ay)*ey) / max(ex*ex + ey*ey, 1e-9)
+        t      = numpy.clip(t, 0, 1)
+
+        return numpy.hypot(x - ax - t*ex, y - ay - t*ey) - self.thickness/2
+
+
+def polyline(points, thickness=4):
+
+    # Returns segments joining each of POINTS to the next.
+
+    return [Segment(x0, y0, x1, y1, thickness) for (x0, y0), (x1, y1) in zip(points[:-1], points[1:])]
+
+
+def pegs(rows=6, columns=7, radius=0.015):
+
+    # Returns discs in staggered rows across the middle of the window, like a bean machine.
+
+    discs = []
+
+    for row in range(rows):
+
+        y      = 0.3 + 0.45 * row / (rows-1)
+        offset = 0.5 / columns if row % 2 else 0
+
+        discs += [Disc((column + 0.25) / columns + offset, y, radius) for column in range(columns)]
+
+    return discs
+
+
+# containers which can be picked from the settings panel
+
+PRESETS = {
+
+    'Box':    lambda: Walls([Box()]),
+
+    'Drum':   lambda: Walls([Drum()]),
+
+    # sloping sides down to a gap in the middle
+    'Hopper': lambda: Walls([Box()] + polyline([(0, 0.35), (0.45, 0.7)]) + polyline([(1, 0.35), (0.55, 0.7)])),
+
+    # sloping sides down to a spout
+    'Funnel': lambda: Walls([Box()] + polyline([(0, 0.2), (0.45, 0.55), (0.45, 0.75)])
+                                    + polyline([(1, 0.2), (0.55, 0.55), (0.55, 0.75)])),
+
+    'Pegs':   lambda: Walls([Box()] + pegs()),
+
+    # no walls, with the edges of the window wrapping round
+    'Periodic': lambda: Walls([], periodic=True),
+}